@@ -0,0 +1,4 @@
+"""性能基准测试：合成 YOLO 数据集生成与各环节计时
+
+用法（在仓库根目录运行）: python -m benchmarks [-n 图像数] [--size 1280x720] [-o 结果.jsonl]
+"""
@@ -0,0 +1,348 @@
+"""基准测试：启动、目录加载、标签覆盖检查、标注解析、解码与缓存、单帧渲染、批量导出和超大图像瓦片显示
+
+渲染使用 FigureCanvasAgg，无需显示器。各环节耗时记录到 main.PROFILER（与界面中的
+性能浮层使用同一套阶段名），每次运行追加一行 JSON 到结果文件，便于长期跟踪。
+"""
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from pathlib import Path
+
+import matplotlib
+matplotlib.use('Agg')
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import main as app
+from benchmarks.synthetic import dataset_params, generate_dataset, dataset_dirs, generate_large_image
+
+PROFILER = app.PROFILER
+
+BENCHMARKS = ('startup', 'list', 'coverage', 'parse', 'decode', 'cache', 'render', 'export', 'tiles')
+
+def git_commit():
+    """当前代码的提交号（不在 git 仓库中时返回 None）"""
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=Path(__file__).resolve().parent, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def timed(name, func, repeat=1):
+    """重复执行 func，每次记录为阶段 name，返回最后一次的结果"""
+    result = None
+    for _ in range(repeat):
+        with PROFILER.stage(name):
+            result = func()
+    return result
+
+# 新进程中导入 main、再预加载界面模块（与界面启动时后台线程做的事相同）
+STARTUP_SCRIPT = ("import time, json; t0 = time.perf_counter(); import main; t1 = time.perf_counter(); "
+                  "main.preload_gui_modules(); t2 = time.perf_counter(); print(json.dumps([t1 - t0, t2 - t1]))")
+
+def bench_startup(ctx):
+    """启动耗时：进程总耗时、导入 main（窗口显示前）和后台预加载界面模块与字体"""
+    repo = Path(__file__).resolve().parent.parent
+    for _ in range(ctx['repeat']):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], cwd=repo, capture_output=True,
+                             text=True, check=True)
+        PROFILER.record('startup_process', start, time.perf_counter() - start)
+        import_s, preload_s = json.loads(out.stdout.strip().splitlines()[-1])
+        PROFILER.record('startup_import', start, import_s)
+        PROFILER.record('startup_preload', start, preload_s)
+    return {'items': ctx['repeat']}
+
+def first_batch(folder):
+    """流式列出时第一批图像的延迟（界面开始显示的时间）"""
+    entries = app.iter_image_entries(folder)
+    try:
+        return next(entries, [])
+    finally:
+        entries.close()
+
+def bench_list(ctx):
+    folder, repeat = ctx['image_dir'], ctx['repeat']
+    timed('list_first_batch', lambda: first_batch(folder), repeat)
+    image_list = timed('list_images', lambda: app.list_images(folder), repeat)
+    ctx['image_list'] = image_list
+    return {'items': len(image_list)}
+
+def bench_coverage(ctx):
+    report = timed('label_coverage', lambda: app.compute_label_coverage(ctx['image_list'], ctx['label_dir']),
+                   ctx['repeat'])
+    return {'items': report['total'], 'labeled': report['labeled'], 'missing': len(report['missing'])}
+
+def remove_index(label_dir):
+    for index_dir in app.AnnotationIndex.index_dirs(label_dir):
+        shutil.rmtree(index_dir, ignore_errors=True)
+
+def bench_parse(ctx):
+    label_dir = ctx['label_dir']
+    label_paths = [app.label_path_for(label_dir, app.label_key(p)) for p in ctx['image_list']]
+    for label_path in label_paths:
+        with PROFILER.stage('parse_file'):
+            app.parse_yolo_annotations(label_path)
+    texts = [app.read_dataset_text(p) for p in label_paths]
+    annotations = timed('parse_batch', lambda: app.parse_yolo_texts(texts), ctx['repeat'])
+    # 冷启动构建（删除已有索引）、无变化时的增量构建和 mmap 打开
+    remove_index(label_dir)
+    timed('index_build', lambda: app.AnnotationIndex.build(label_dir, workers=ctx['workers']))
+    timed('index_build_warm', lambda: app.AnnotationIndex.build(label_dir, workers=ctx['workers']),
+          ctx['repeat'])
+    timed('index_load', lambda: app.AnnotationIndex.load(label_dir), ctx['repeat'])
+    remove_index(label_dir)
+    return {'items': len(label_paths), 'objects': int(sum(len(a) for a in annotations))}
+
+def bench_decode(ctx):
+    frames = ctx['image_list'][:ctx['frames']]
+    for path in frames:
+        with PROFILER.stage('decode_full'):
+            app.decode_for_cache(path, ctx['display_max_side'], rgb=True)
+        with PROFILER.stage('decode_preview'):
+            app.decode_preview(path, 4, rgb=True)
+    return {'items': len(frames)}
+
+def bench_cache(ctx):
+    """按浏览顺序前进再后退，统计缓存命中率（预算小于总量时体现淘汰策略）"""
+    frames = [str(p) for p in ctx['image_list'][:ctx['frames']]]
+    cache = app.ImageCache(max_bytes=ctx['cache_mb'] * 2**20, display_max_side=ctx['display_max_side'])
+    for key in frames + frames[::-1]:
+        with PROFILER.stage('cache_get'):
+            entry = cache.get_display(key)
+            if entry is None:
+                image, display = app.decode_for_cache(key, ctx['display_max_side'], rgb=True)
+                cache.put(key, image, display)
+    total = cache.hits + cache.misses
+    return {'items': total, 'hits': cache.hits, 'misses': cache.misses, 'evictions': cache.evictions,
+            'hit_rate': cache.hits / total if total else 0.0, 'cache_mb': cache.nbytes / 2**20}
+
+def bench_render(ctx):
+    """与界面相同的保留模式渲染：整帧绘制、仅修改显示选项时的 blit、
+    修改标签映射时的标注重建，另测 OpenCV 合成（缓存图像为 RGB，与界面一致）"""
+    fig = Figure(figsize=(ctx['canvas_size'][0] / 100, ctx['canvas_size'][1] / 100), dpi=100)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    ax.axis('off')
+    renderer = app.RetainedRenderer(ax, canvas)
+    label_map, colors = ctx['label_map'], app.DEFAULT_COLORS
+    swapped = [(b, g, r) for r, g, b in colors]
+    renamed = {k: f"{v}_renamed" for k, v in label_map.items()}
+    frames = ctx['image_list'][:ctx['frames']]
+    for path in frames:
+        image, display = app.decode_for_cache(path, ctx['display_max_side'], rgb=True)
+        if image is None:
+            continue
+        h, w = image.shape[:2]
+        with PROFILER.stage('frame'):
+            with PROFILER.stage('labels'):
+                annotations = app.parse_yolo_annotations(app.label_path_for(ctx['label_dir'], app.label_key(path)))
+            with PROFILER.stage('artists'):
+                renderer.set_image(display, (h, w))
+                ax.set_title(path.name)
+                renderer.set_annotations(annotations, w, h, label_map, colors)
+                renderer.apply_options(True, True, True, 0.3)
+            with PROFILER.stage('draw'):
+                canvas.draw()
+        with PROFILER.stage('blit'):
+            renderer.apply_options(True, False, True, 0.3)
+            renderer.blit()
+        with PROFILER.stage('relabel'):
+            renderer.set_annotations(annotations, w, h, renamed, colors)
+            renderer.apply_options(True, True, True, 0.3)
+            renderer.blit()
+        with PROFILER.stage('compose'):
+            app.draw_annotations_cv2(display, annotations, label_map, swapped, thin_labels=True)
+    return {'items': len(frames), 'canvas': list(ctx['canvas_size'])}
+
+def bench_export(ctx):
+    output_dir = Path(ctx['work_dir']) / 'export'
+    shutil.rmtree(output_dir, ignore_errors=True)
+    frames = ctx['image_list'][:ctx['export_images']]
+    try:
+        ok, failed = timed('batch_export', lambda: app.run_batch_export(
+            frames, ctx['label_dir'], output_dir, ctx['label_map'], workers=ctx['workers']))
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    return {'items': len(frames), 'failed': failed, 'workers': ctx['workers']}
+
+def bench_tiles(ctx):
+    """超大图像：生成瓦片金字塔，按视野读取瓦片拼图并用网格索引裁剪标注（与界面平移、缩放相同），
+    另测一次整图解码作为对比"""
+    width, height = ctx['tile_image']
+    image_path, label_path = generate_large_image(ctx['work_dir'], width, height, boxes=ctx['tile_boxes'])
+    tile_root = Path(ctx['work_dir']) / 'tiles'
+    shutil.rmtree(tile_root, ignore_errors=True)
+    timed('decode_large', lambda: app.cv2_imread_unicode(image_path))
+    pyramid = app.TilePyramid.build(image_path, root=tile_root, workers=ctx['workers'])
+    timed('tile_open', lambda: app.TilePyramid.open(image_path, root=tile_root), ctx['repeat'])
+    timed('tile_overview', lambda: pyramid.overview(ctx['display_max_side']), ctx['repeat'])
+    annotations = app.parse_yolo_annotations(label_path)
+    h, w = pyramid.full_shape
+    grid = timed('cull_index', lambda: app.AnnotationGrid(annotations, w, h))
+    canvas_w, canvas_h = ctx['canvas_size']
+    top = pyramid.overview_level(ctx['display_max_side'])
+    cache = app.TileCache()
+    views = 0
+    for scale in (1, 2, 4):   # 每个屏幕像素对应的原图像素数
+        level = pyramid.level_for(scale, top)
+        vw, vh = canvas_w * scale, canvas_h * scale
+        # 沿对角线平移，每步半个视野
+        for step in range(ctx['frames']):
+            x0, y0 = step * vw // 2, step * vh // 2
+            if x0 + vw > w or y0 + vh > h:
+                break
+            with PROFILER.stage('tile_view'):
+                c0, r0, c1, r1 = pyramid.tile_range(level, x0, y0, x0 + vw, y0 + vh)
+                tiles = {}
+                for row in range(r0, r1):
+                    for col in range(c0, c1):
+                        tile = cache.get((level, row, col))
+                        if tile is None:
+                            tile = pyramid.read_tile(level, row, col)
+                            cache.put((level, row, col), tile)
+                        tiles[(row, col)] = tile
+                pyramid.assemble(level, c0, r0, c1, r1, tiles)
+            with PROFILER.stage('cull'):
+                annotations.take(*grid.query(x0, y0, x0 + vw, y0 + vh))
+            views += 1
+    return {'items': views, 'image': [w, h], 'boxes': len(annotations), 'levels': len(pyramid.levels),
+            'tiles_mb': (pyramid.folder / 'tiles.bin').stat().st_size / 2**20}
+
+def previous_result(path, dataset):
+    """结果文件中同一数据集参数的上一次运行，用于对比"""
+    previous = None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('dataset') == dataset:
+                    previous = record
+    except OSError:
+        pass
+    return previous
+
+def print_report(record, previous=None):
+    print(f"\n{'阶段':<20}{'次数':>8}{'平均ms':>10}{'p50ms':>10}{'p90ms':>10}{'对比p50':>10}")
+    old_stages = previous['stages'] if previous else {}
+    for name, s in sorted(record['stages'].items()):
+        delta = ''
+        old = old_stages.get(name)
+        if old and old['p50_ms'] > 0:
+            delta = f"{(s['p50_ms'] / old['p50_ms'] - 1) * 100:+.0f}%"
+        print(f"{name:<20}{s['count']:>8}{s['mean_ms']:>10.2f}{s['p50_ms']:>10.2f}{s['p90_ms']:>10.2f}{delta:>10}")
+    print()
+    for name, b in record['benchmarks'].items():
+        print(f"{name:<10} {b['seconds']:.3f}s  {b['items_per_s']:.1f} 项/秒")
+
+def parse_size(text):
+    w, _, h = text.lower().partition('x')
+    return int(w), int(h)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='合成数据集上的性能基准测试')
+    parser.add_argument('-n', '--images', type=int, default=200, help='图像数量')
+    parser.add_argument('--size', type=parse_size, default=(1280, 720), help='图像分辨率，如 1920x1080')
+    parser.add_argument('--boxes', type=int, default=10, help='每张图像的检测框数')
+    parser.add_argument('--polygons', type=int, default=5, help='每张图像的分割多边形数')
+    parser.add_argument('--vertices', type=int, default=24, help='每个多边形的顶点数')
+    parser.add_argument('--classes', type=int, default=20, help='类别数')
+    parser.add_argument('--ext', default='.jpg', help='图像格式（.jpg / .png）')
+    parser.add_argument('--unicode', action='store_true', help='使用中文等非 ASCII 的目录和文件名')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('-d', '--data-dir', help='数据集目录（参数相同时复用，默认使用临时目录并在结束后删除）')
+    parser.add_argument('-b', '--bench', default=','.join(BENCHMARKS),
+                        help=f"要运行的测试，逗号分隔（{','.join(BENCHMARKS)}）")
+    parser.add_argument('--repeat', type=int, default=3, help='整体操作（列目录、覆盖检查等）的重复次数')
+    parser.add_argument('--frames', type=int, default=50, help='解码 / 缓存 / 渲染测试的图像数')
+    parser.add_argument('--export-images', type=int, default=100, help='批量导出测试的图像数')
+    parser.add_argument('--canvas', type=parse_size, default=(1000, 800), help='渲染画布尺寸（像素）')
+    parser.add_argument('--cache-mb', type=int, default=256, help='缓存测试的字节预算（MB）')
+    parser.add_argument('--tile-image', type=parse_size, default=(12000, 9000), help='瓦片测试的大图尺寸')
+    parser.add_argument('--tile-boxes', type=int, default=20000, help='瓦片测试大图上的检测框数')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='进程数（默认 CPU 核数-1）')
+    parser.add_argument('-o', '--output', default=str(Path(__file__).resolve().parent / 'results.jsonl'),
+                        help='结果文件（每次运行追加一行 JSON）')
+    args = parser.parse_args(argv)
+
+    selected = [b.strip() for b in args.bench.split(',') if b.strip()]
+    unknown = [b for b in selected if b not in BENCHMARKS]
+    if unknown:
+        parser.error(f"未知的测试: {', '.join(unknown)}")
+
+    dataset = dataset_params(images=args.images, width=args.size[0], height=args.size[1], boxes=args.boxes,
+                             polygons=args.polygons, vertices=args.vertices, classes=args.classes,
+                             unicode=args.unicode, ext=args.ext, seed=args.seed)
+    work_dir = args.data_dir or tempfile.mkdtemp(prefix='yolo-vis-bench-')
+    try:
+        start = time.perf_counter()
+        last = [0.0]
+
+        def report(done, total):
+            now = time.perf_counter()
+            if done == total or now - last[0] > 0.2:
+                last[0] = now
+                print(f"\r生成数据集: {done}/{total}", end='', flush=True)
+
+        image_dir, label_dir = generate_dataset(work_dir, progress=report, **dataset)
+        print(f"\n数据集: {image_dir}（准备耗时 {time.perf_counter() - start:.1f}s）")
+
+        base = dataset_dirs(work_dir, dataset)[0]
+        ctx = {
+            'work_dir': work_dir, 'image_dir': image_dir, 'label_dir': label_dir,
+            'label_map': app.read_label_map_file(base / 'classes.txt'),
+            'repeat': max(1, args.repeat), 'frames': args.frames, 'export_images': args.export_images,
+            'canvas_size': args.canvas, 'cache_mb': args.cache_mb, 'display_max_side': 2048,
+            'tile_image': args.tile_image, 'tile_boxes': args.tile_boxes,
+            'workers': args.workers or max(1, (multiprocessing.cpu_count() or 2) - 1),
+            'image_list': app.list_images(image_dir),
+        }
+        app.setup_chinese_font()
+        PROFILER.window = 10**7   # 基准测试保留全部样本
+        PROFILER.reset()
+        PROFILER.enabled = True
+        benchmarks = {}
+        for name in BENCHMARKS:
+            if name not in selected:
+                continue
+            print(f"运行: {name}")
+            t0 = time.perf_counter()
+            info = globals()[f'bench_{name}'](ctx)
+            seconds = time.perf_counter() - t0
+            info['seconds'] = seconds
+            info['items_per_s'] = info['items'] / seconds if seconds > 0 else 0.0
+            benchmarks[name] = info
+    finally:
+        if not args.data_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    record = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': git_commit(),
+        'machine': app.machine_info(),
+        'dataset': dataset,
+        'options': {'repeat': ctx['repeat'], 'frames': args.frames, 'export_images': args.export_images,
+                    'canvas': list(args.canvas), 'cache_mb': args.cache_mb, 'workers': ctx['workers'],
+                    'tile_image': list(args.tile_image), 'tile_boxes': args.tile_boxes},
+        'benchmarks': benchmarks,
+        'stages': PROFILER.summary(),
+    }
+    previous = previous_result(args.output, dataset)
+    print_report(record, previous)
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    print(f"\n结果已追加到 {args.output}")
+    return 0
@@ -0,0 +1,146 @@
+"""合成 YOLO 数据集：固定随机种子生成图像与标签，参数相同时结果完全一致"""
+import json
+import shutil
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from main import cv2_imwrite_unicode
+
+MANIFEST = 'manifest.json'
+
+# 用于测试非 ASCII 路径（中文、重音字母、空格）
+UNICODE_DIR = '数据集 ü'
+UNICODE_STEMS = ('图像', 'caméra', 'снимок')
+
+def dataset_params(images=200, width=1280, height=720, boxes=10, polygons=5, vertices=24,
+                   classes=20, unicode=False, ext='.jpg', seed=0):
+    """生成参数（同时写入 manifest，用于判断已有数据集能否复用）"""
+    return {'images': images, 'width': width, 'height': height, 'boxes': boxes,
+            'polygons': polygons, 'vertices': vertices, 'classes': classes,
+            'unicode': unicode, 'ext': ext, 'seed': seed}
+
+def dataset_dirs(root, params):
+    """返回 (数据集目录, images 目录, labels 目录)"""
+    base = Path(root) / UNICODE_DIR if params['unicode'] else Path(root)
+    return base, base / 'images', base / 'labels'
+
+def remove_dataset(root, params):
+    """删除之前生成的图像、标签及其标注索引（root 中的其他文件不受影响）"""
+    base, image_dir, label_dir = dataset_dirs(root, params)
+    for path in (image_dir, label_dir, base / 'labels.yoloidx'):
+        shutil.rmtree(path, ignore_errors=True)
+    (base / 'classes.txt').unlink(missing_ok=True)
+    (Path(root) / MANIFEST).unlink(missing_ok=True)
+
+def image_name(i, params):
+    if params['unicode']:
+        return f"{UNICODE_STEMS[i % len(UNICODE_STEMS)]}_{i:06d}"
+    return f"img_{i:06d}"
+
+def make_background(rng, width, height):
+    """带渐变和噪声的背景，避免纯色图像被 JPEG 压缩得过小而失去代表性"""
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    image = np.empty((height, width, 3), dtype=np.float32)
+    image[..., 0] = x
+    image[..., 1] = y
+    image[..., 2] = (x + y) / 2
+    image += rng.normal(0, 12, image.shape).astype(np.float32)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+def make_polygon(rng, vertices):
+    """以随机中心生成不规则的星形多边形（归一化坐标，按角度排序保证不自交）"""
+    cx, cy = rng.uniform(0.15, 0.85, 2)
+    radius = rng.uniform(0.03, 0.12) * rng.uniform(0.6, 1.0, vertices)
+    angles = np.sort(rng.uniform(0, 2 * np.pi, vertices))
+    pts = np.stack([cx + radius * np.cos(angles), cy + radius * np.sin(angles)], axis=1)
+    return np.clip(pts, 0, 1)
+
+def make_sample(rng, params, background):
+    """生成一张图像及其标签文本"""
+    w, h = params['width'], params['height']
+    image = background.copy()
+    lines = []
+    for _ in range(params['boxes']):
+        cls = int(rng.integers(params['classes']))
+        bw, bh = rng.uniform(0.02, 0.3, 2)
+        cx, cy = rng.uniform(bw / 2, 1 - bw / 2), rng.uniform(bh / 2, 1 - bh / 2)
+        x1, y1 = int((cx - bw / 2) * w), int((cy - bh / 2) * h)
+        x2, y2 = int((cx + bw / 2) * w), int((cy + bh / 2) * h)
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cv2.rectangle(image, (x1, y1), (x2, y2), color, -1)
+        lines.append(f"{cls} {cx:.6f} {cy:.6f} {bw:.6f} {bh:.6f}")
+    for _ in range(params['polygons'] if params['vertices'] >= 3 else 0):
+        cls = int(rng.integers(params['classes']))
+        pts = make_polygon(rng, params['vertices'])
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cv2.fillPoly(image, [(pts * (w, h)).astype(np.int32)], color)
+        lines.append(f"{cls} " + ' '.join(f"{v:.6f}" for v in pts.ravel()))
+    return image, '\n'.join(lines) + '\n'
+
+def generate_dataset(root, progress=None, **kwargs):
+    """在 root 下生成合成数据集，返回 (images 目录, labels 目录)
+
+    root 中已有参数相同的数据集时直接复用；否则清空后重新生成。
+    progress(已生成, 总数) 汇报进度。
+    """
+    params = dataset_params(**kwargs)
+    base, image_dir, label_dir = dataset_dirs(root, params)
+    manifest_path = Path(root) / MANIFEST
+    if manifest_path.exists():
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                old = json.load(f)
+            if old == params:
+                return image_dir, label_dir
+            remove_dataset(root, old)
+        except (OSError, ValueError, KeyError):
+            pass
+    remove_dataset(root, params)
+    image_dir.mkdir(parents=True, exist_ok=True)
+    label_dir.mkdir(parents=True, exist_ok=True)
+
+    rng = np.random.default_rng(params['seed'])
+    background = make_background(rng, params['width'], params['height'])
+    for i in range(params['images']):
+        image, text = make_sample(rng, params, background)
+        stem = image_name(i, params)
+        if not cv2_imwrite_unicode(image_dir / f"{stem}{params['ext']}", image):
+            raise OSError(f"写入图像失败: {image_dir / stem}")
+        (label_dir / f"{stem}.txt").write_text(text, encoding='utf-8')
+        if progress:
+            progress(i + 1, params['images'])
+    (base / 'classes.txt').write_text(
+        ''.join(f"{c}:class_{c}\n" for c in range(params['classes'])), encoding='utf-8')
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(params, f, ensure_ascii=False, indent=2)
+    return image_dir, label_dir
+
+def generate_large_image(root, width=12000, height=9000, boxes=20000, classes=20, seed=0):
+    """生成一张超大图像及其标签（瓦片显示测试用），返回 (图像路径, 标签路径)
+
+    文件名包含参数，参数相同时直接复用。背景由小图放大得到，避免生成时占用过多内存。
+    """
+    folder = Path(root) / 'large'
+    stem = f"large_{width}x{height}_{boxes}_{classes}_{seed}"
+    image_path, label_path = folder / f"{stem}.jpg", folder / f"{stem}.txt"
+    if image_path.exists() and label_path.exists():
+        return image_path, label_path
+    folder.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    image = cv2.resize(make_background(rng, max(1, width // 16), max(1, height // 16)), (width, height),
+                       interpolation=cv2.INTER_LINEAR)
+    cls = rng.integers(classes, size=boxes)
+    bw, bh = rng.uniform(0.001, 0.01, boxes), rng.uniform(0.001, 0.01, boxes)
+    cx, cy = rng.uniform(bw / 2, 1 - bw / 2), rng.uniform(bh / 2, 1 - bh / 2)
+    colors = rng.integers(0, 256, (boxes, 3))
+    for x, y, w, h, color in zip(cx, cy, bw, bh, colors):
+        cv2.rectangle(image, (int((x - w / 2) * width), int((y - h / 2) * height)),
+                      (int((x + w / 2) * width), int((y + h / 2) * height)), tuple(int(c) for c in color), 2)
+    if not cv2_imwrite_unicode(image_path, image):
+        raise OSError(f"写入图像失败: {image_path}")
+    label_path.write_text(''.join(f"{c} {x:.6f} {y:.6f} {w:.6f} {h:.6f}\n"
+                                  for c, x, y, w, h in zip(cls, cx, cy, bw, bh)), encoding='utf-8')
+    return image_path, label_path
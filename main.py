@@ -1,64 +1,3854 @@
+import os
 import re
+import sys
 import time
 import json
+import shutil
+import hashlib
+import warnings
+import queue
+import bisect
+import functools
+import argparse
+import threading
+import multiprocessing
+import ast
+import io
+import mmap
+import zlib
+import struct
+import tarfile
+import zipfile
+import contextlib
+import importlib
+import tempfile
+import ctypes
 import tkinter as tk
 
-from collections import OrderedDict
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, filedialog, messagebox
 from pathlib import Path
 
-import cv2
+STARTUP_TIME = time.perf_counter()   # 启动计时起点（开始导入第三方模块）
+
 import numpy as np
-import matplotlib
-import matplotlib.pyplot as plt
 
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-from matplotlib.figure import Figure
+# ---------------- 延迟导入 ----------------
+
+class LazyModule:
+    """首次访问属性时才导入的模块，导入后替换模块全局变量为真实模块
+
+    OpenCV 和 matplotlib 导入较慢，界面窗口先显示，再在后台线程中导入（见 preload_gui_modules）。
+    """
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self._name)
+        globals()[self._name] = module
+        return getattr(module, attr)
+
+cv2 = LazyModule('cv2')
+
+# 设置matplotlib中文字体
+CHINESE_FONTS = ['SimHei', 'Microsoft YaHei', 'SimSun', 'KaiTi']
+FONT_CACHE_PATH = Path.home() / '.cache' / 'yolo-dataset-vis' / 'font.json'
+_font_ready = False
+
+def _font_list_stamp():
+    """matplotlib 版本及其字体列表缓存文件的修改时间（字体列表重建后解析结果失效）"""
+    import matplotlib
+    stamps = sorted([p.name, p.stat().st_mtime_ns]
+                    for p in Path(matplotlib.get_cachedir()).glob('fontlist-*.json'))
+    return [matplotlib.__version__, stamps]
+
+def resolve_chinese_font():
+    """按优先级查找可用的中文字体，未找到返回 None
+
+    结果缓存到磁盘，字体列表未变化时不再导入 font_manager、遍历全部字体。
+    """
+    stamp = _font_list_stamp()
+    try:
+        with open(FONT_CACHE_PATH, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get('stamp') == stamp and cached.get('candidates') == CHINESE_FONTS:
+            return cached.get('font')
+    except (OSError, ValueError):
+        pass
+    import matplotlib.font_manager as fm
+    font_names = {f.name for f in fm.fontManager.ttflist}
+    font = next((name for name in CHINESE_FONTS if name in font_names), None)
+    try:
+        FONT_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(FONT_CACHE_PATH, 'w', encoding='utf-8') as f:
+            # 首次导入 font_manager 时可能刚生成字体列表，重新取时间戳
+            json.dump({'stamp': _font_list_stamp(), 'candidates': CHINESE_FONTS, 'font': font}, f)
+    except OSError as e:
+        print(f"写入字体缓存失败: {FONT_CACHE_PATH}, 错误: {str(e)}")
+    return font
+
+def setup_chinese_font():
+    """设置matplotlib中文字体（每个进程只解析一次）"""
+    global _font_ready
+    if _font_ready:
+        return
+    import matplotlib
+    font = resolve_chinese_font()
+    if font:
+        matplotlib.rcParams['font.sans-serif'] = [font]
+    else:
+        # 如果没有找到中文字体，使用默认字体并警告
+        print("警告：未找到合适的中文字体，中文可能显示为方块")
+        matplotlib.rcParams['font.sans-serif'] = ['DejaVu Sans']
+    matplotlib.rcParams['axes.unicode_minus'] = False
+    _font_ready = True
+
+def preload_gui_modules():
+    """导入界面所需的重量级模块并设置字体（启动时在后台线程中调用）"""
+    global cv2
+    with PROFILER.stage('startup_modules'):
+        import cv2   # 普通 import 语句，打包工具（PyInstaller）静态分析时才能找到 OpenCV
+        import matplotlib.figure
+        import matplotlib.collections
+        import matplotlib.backends.backend_tkagg
+    with PROFILER.stage('startup_font'):
+        setup_chinese_font()
+
+# ---------------- 性能计时 ----------------
+
+def machine_info():
+    """运行环境信息（平台与主要依赖版本），随计时结果一起导出"""
+    import platform
+    import matplotlib
+    return {'platform': platform.platform(), 'python': platform.python_version(),
+            'processor': platform.processor() or platform.machine(), 'cpu_count': os.cpu_count(),
+            'numpy': np.__version__, 'opencv': cv2.__version__, 'matplotlib': matplotlib.__version__}
+
+class _Stage:
+    """StageProfiler.stage 返回的计时上下文"""
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.profiler.record(self.name, self.start, end - self.start)
+        return False
+
+class StageProfiler:
+    """分阶段计时：每个阶段保留最近 window 次耗时，另记录最近的事件，可导出 JSON / Chrome trace
+
+    用法: with PROFILER.stage('imdecode'): ...
+    线程安全（预取线程中的解码也会记录）；未启用时只有一次属性判断的开销。
+    """
+    HISTOGRAM_BINS_MS = (0.5, 1, 2, 4, 8, 16, 33, 50, 100, 200, 500, 1000, float('inf'))
+
+    def __init__(self, window=500, max_events=20000):
+        self.enabled = False
+        self.window = window
+        self.samples = {}                            # 阶段 -> deque[耗时(秒)]
+        self.events = deque(maxlen=max_events)       # (阶段, 开始时间, 耗时, 线程 id)
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+        self._null = contextlib.nullcontext()
+        self.frame_thread = None                     # 正在记录帧内耗时的线程（界面线程）
+        self.frame_ms = {}                           # 当前帧在该线程上各阶段的耗时（毫秒）
+
+    def stage(self, name):
+        if not self.enabled:
+            return self._null
+        return _Stage(self, name)
+
+    def record(self, name, start, duration):
+        with self.lock:
+            samples = self.samples.get(name)
+            if samples is None:
+                samples = self.samples[name] = deque(maxlen=self.window)
+            samples.append(duration)
+            tid = threading.get_ident()
+            self.events.append((name, start, duration, tid))
+            if tid == self.frame_thread:
+                self.frame_ms[name] = self.frame_ms.get(name, 0.0) + duration * 1000
+
+    def begin_frame(self):
+        """开始记录一帧：之后只有调用线程上的阶段计入 frame_ms（预取线程的解码不计入）"""
+        with self.lock:
+            self.frame_ms = {}
+            self.frame_thread = threading.get_ident()
+
+    def end_frame(self):
+        with self.lock:
+            self.frame_thread = None
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+            self.events.clear()
+
+    def last_ms(self, name):
+        samples = self.samples.get(name)
+        return samples[-1] * 1000 if samples else 0.0
+
+    def summary(self):
+        """每个阶段的统计：次数、平均、分位数（毫秒）和耗时直方图"""
+        with self.lock:
+            snapshot = {name: np.array(samples) * 1000 for name, samples in self.samples.items()}
+        result = {}
+        for name, ms in snapshot.items():
+            if not len(ms):
+                continue
+            counts = np.histogram(ms, bins=(0,) + self.HISTOGRAM_BINS_MS)[0]
+            result[name] = {
+                'count': int(len(ms)),
+                'mean_ms': float(ms.mean()),
+                'p50_ms': float(np.percentile(ms, 50)),
+                'p90_ms': float(np.percentile(ms, 90)),
+                'p99_ms': float(np.percentile(ms, 99)),
+                'max_ms': float(ms.max()),
+                'histogram_ms': {('inf' if b == float('inf') else f'{b:g}'): int(c)
+                                 for b, c in zip(self.HISTOGRAM_BINS_MS, counts)},
+            }
+        return result
+
+    def export_json(self, path, extra=None):
+        """导出统计摘要（附机器与数据集信息，便于跨机器比较）"""
+        data = {'machine': machine_info(), 'stages': self.summary()}
+        if extra:
+            data.update(extra)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+    def export_chrome_trace(self, path):
+        """导出最近的事件为 Chrome trace（chrome://tracing / Perfetto 可打开）"""
+        with self.lock:
+            events = list(self.events)
+        trace = [{'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': tid,
+                  'ts': (start - self.origin) * 1e6, 'dur': duration * 1e6}
+                 for name, start, duration, tid in events]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+
+PROFILER = StageProfiler()
+
+def _init_pool_worker():
+    """进程池子进程初始化：关闭计时
+
+    Linux 上子进程由 fork 创建，会继承已启用的 PROFILER 及其锁；若 fork 时预取线程正持有该锁，
+    子进程中的锁永远不会释放，计时时即死锁。子进程的计时也不会回到界面，直接关闭并换一把新锁。
+    """
+    PROFILER.enabled = False
+    PROFILER.lock = threading.Lock()
+
+# ---------------- 数据集压缩包 ----------------
+
+_ARCHIVE_RE = re.compile(r'\.(zip|tar)(?=$|[\\/])', re.IGNORECASE)
+
+class ArchiveEntry:
+    """压缩包内的目录项，接口与 os.DirEntry 相同（供 scandir_dataset 使用）"""
+    __slots__ = ('name', 'path', 'st_size', 'st_mtime_ns', '_is_dir')
+
+    def __init__(self, name, path, is_dir, size, mtime_ns):
+        self.name = name
+        self.path = path
+        self._is_dir = is_dir
+        self.st_size = size
+        self.st_mtime_ns = mtime_ns
+
+    def is_file(self):
+        return not self._is_dir
+
+    def is_dir(self, follow_symlinks=True):
+        return self._is_dir
+
+    def stat(self):
+        return self
+
+class DatasetArchive:
+    """zip / tar 数据集压缩包的随机访问读取（不解压）
+
+    压缩包本身视为一个文件夹：<压缩包路径>/<成员路径> 即成员的虚拟路径。
+    首次打开时建立成员偏移索引（zip 读中央目录与本地文件头，tar 顺序扫描文件头），
+    缓存到 ~/.cache/yolo-dataset-vis/archives，之后按偏移直接读取单个成员。
+    未压缩成员返回 mmap 的 memoryview 切片，不额外复制；deflate 成员用 zlib 解压。
+    成员的 mtime 统一取压缩包的 mtime。
+    """
+    INDEX_VERSION = 1
+    _opened = {}                      # 压缩包路径 -> DatasetArchive（每个进程各自打开）
+    _opened_lock = threading.Lock()
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        st = os.stat(self.path)
+        self.size = st.st_size
+        self.mtime_ns = st.st_mtime_ns
+        self.file = open(self.path, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if st.st_size else b''
+        self.members = self.load_index()   # 成员名 -> (数据偏移, 大小, 压缩后大小, 压缩方式)
+        self.dirs = {'': ([], set())}      # 目录 -> ([文件名], {子目录名})
+        for name in self.members:
+            parent, _, base = name.rpartition('/')
+            self._dir(parent)[0].append(base)
+        self._zip = None
+        self._zip_lock = threading.Lock()
+
+    def _dir(self, rel_dir):
+        """取得（必要时逐级创建）目录节点"""
+        node = self.dirs.get(rel_dir)
+        if node is None:
+            node = self.dirs[rel_dir] = ([], set())
+            parent, _, base = rel_dir.rpartition('/')
+            self._dir(parent)[1].add(base)
+        return node
+
+    @classmethod
+    def open(cls, path):
+        """打开（或复用已打开的）压缩包"""
+        path = os.path.abspath(path)
+        with cls._opened_lock:
+            archive = cls._opened.get(path)
+            if archive is None:
+                archive = cls._opened[path] = cls(path)
+            return archive
+
+    @staticmethod
+    def is_archive(path):
+        return bool(_ARCHIVE_RE.search(str(path))) and os.path.isfile(path)
+
+    def index_path(self):
+        digest = hashlib.md5(self.path.encode('utf-8')).hexdigest()[:16]
+        return Path.home() / '.cache' / 'yolo-dataset-vis' / 'archives' / f'{digest}.json'
+
+    def load_index(self):
+        """读取缓存的成员索引（大小和 mtime 不变时），否则扫描压缩包并写入缓存"""
+        index_path = self.index_path()
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if (cached.get('version') == self.INDEX_VERSION and cached.get('size') == self.size
+                    and cached.get('mtime_ns') == self.mtime_ns):
+                return {name: tuple(value) for name, value in cached['members'].items()}
+        except (OSError, ValueError, KeyError):
+            pass
+        start = time.time()
+        members = self.scan_zip() if zipfile.is_zipfile(self.path) else self.scan_tar()
+        print(f"压缩包索引: {self.path}, {len(members)} 个文件, 耗时 {time.time() - start:.2f}s")
+        try:
+            index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = index_path.with_name(f'{index_path.name}.{os.getpid()}.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': self.INDEX_VERSION, 'size': self.size, 'mtime_ns': self.mtime_ns,
+                           'members': members}, f, ensure_ascii=False)
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            print(f"写入压缩包索引失败: {index_path}, 错误: {str(e)}")
+        return members
+
+    def scan_zip(self):
+        members = {}
+        with zipfile.ZipFile(self.path) as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                # 数据紧跟本地文件头，其文件名/扩展字段长度可能与中央目录不同
+                h = info.header_offset
+                name_len, extra_len = struct.unpack('<HH', self.mm[h + 26:h + 30])
+                method = -1 if info.flag_bits & 0x1 else info.compress_type   # 加密成员不支持
+                members[info.filename] = (h + 30 + name_len + extra_len, info.file_size,
+                                          info.compress_size, method)
+        return members
+
+    def scan_tar(self):
+        members = {}
+        try:
+            with tarfile.open(self.path, 'r:') as tf:
+                for info in tf:
+                    if info.isfile() and not info.issparse():
+                        members[info.name] = (info.offset_data, info.size, info.size, zipfile.ZIP_STORED)
+                    tf.members = []   # 不保留 TarInfo 列表，百万成员时节省内存
+        except tarfile.ReadError:
+            raise ValueError(f"不支持的压缩包（压缩的 tar 无法随机访问，请使用 .zip 或未压缩的 .tar）: {self.path}")
+        return members
+
+    def read(self, name):
+        """读取成员内容；未压缩成员返回 memoryview（零复制）"""
+        try:
+            offset, size, csize, method = self.members[name]
+        except KeyError:
+            raise FileNotFoundError(f"压缩包中不存在: {name}")
+        if method == zipfile.ZIP_STORED:
+            return memoryview(self.mm)[offset:offset + size]
+        if method == zipfile.ZIP_DEFLATED:
+            return zlib.decompress(self.mm[offset:offset + csize], -15, size)
+        if method < 0:
+            raise OSError(f"不支持加密的压缩包成员: {name}")
+        with self._zip_lock:
+            if self._zip is None:
+                self._zip = zipfile.ZipFile(self.path)
+            return self._zip.read(name)
+
+    def image_folder(self):
+        """包内最浅的 images 目录（没有时为压缩包根目录），返回虚拟路径"""
+        candidates = [d for d in self.dirs if d.rpartition('/')[2].lower() == 'images']
+        if not candidates:
+            return self.path
+        best = min(candidates, key=lambda d: (d.count('/'), d))
+        return os.path.join(self.path, *best.split('/'))
+
+    def scandir(self, rel_dir):
+        """列出包内目录，返回 ArchiveEntry 列表"""
+        node = self.dirs.get(rel_dir)
+        if node is None:
+            raise FileNotFoundError(f"压缩包中不存在目录: {rel_dir}")
+        files, subdirs = node
+        base = os.path.join(self.path, *rel_dir.split('/')) if rel_dir else self.path
+        prefix = f"{rel_dir}/" if rel_dir else ''
+        entries = [ArchiveEntry(name, os.path.join(base, name), True, 0, self.mtime_ns) for name in subdirs]
+        for name in files:
+            entries.append(ArchiveEntry(name, os.path.join(base, name), False,
+                                        self.members[prefix + name][1], self.mtime_ns))
+        return entries
+
+def split_archive_path(path):
+    """把压缩包内的虚拟路径拆成 (压缩包路径, 包内路径)；普通路径返回 (None, None)"""
+    text = str(path)
+    for match in _ARCHIVE_RE.finditer(text):
+        archive_path = text[:match.end()]
+        if os.path.abspath(archive_path) in DatasetArchive._opened or os.path.isfile(archive_path):
+            return archive_path, text[match.end() + 1:].replace(os.sep, '/').strip('/')
+    return None, None
+
+def read_dataset_bytes(path):
+    """读取文件内容（支持压缩包内的虚拟路径）"""
+    archive_path, inner = split_archive_path(path)
+    if archive_path is None:
+        with open(path, 'rb') as f:
+            return f.read()
+    return DatasetArchive.open(archive_path).read(inner)
+
+def read_dataset_text(path):
+    """读取文本文件内容（支持压缩包内的虚拟路径）"""
+    archive_path, inner = split_archive_path(path)
+    if archive_path is None:
+        with open(path, 'r') as f:
+            return f.read()
+    return bytes(DatasetArchive.open(archive_path).read(inner)).decode('utf-8')
+
+def dataset_stat(path):
+    """返回带 st_size / st_mtime_ns 的状态；文件不存在时抛出 FileNotFoundError"""
+    archive_path, inner = split_archive_path(path)
+    if archive_path is None:
+        return os.stat(path)
+    archive = DatasetArchive.open(archive_path)
+    member = archive.members.get(inner)
+    if member is None:
+        raise FileNotFoundError(f"压缩包中不存在: {inner}")
+    return ArchiveEntry(inner.rpartition('/')[2], str(path), False, member[1], archive.mtime_ns)
+
+def dataset_is_dir(path):
+    """是否为文件夹（压缩包本身及包内目录也算）"""
+    archive_path, inner = split_archive_path(path)
+    if archive_path is None:
+        return os.path.isdir(path)
+    return inner in DatasetArchive.open(archive_path).dirs
+
+def scandir_dataset(path):
+    """os.scandir 的替代：压缩包内的目录返回 ArchiveEntry 列表（同样可用于 with 语句）"""
+    archive_path, inner = split_archive_path(path)
+    if archive_path is None:
+        return os.scandir(path)
+    return contextlib.nullcontext(DatasetArchive.open(archive_path).scandir(inner))
+
+def cv2_imread_unicode(file_path, flags=None):
+    """
+    解决OpenCV读取中文路径图像的问题
+    """
+    if flags is None:
+        flags = cv2.IMREAD_COLOR
+    try:
+        # 方法1：使用numpy读取（压缩包内的文件按偏移直接读取）
+        with PROFILER.stage('read'):
+            image_data = read_dataset_bytes(file_path)
+        
+        # 将字节数据转换为numpy数组
+        nparr = np.frombuffer(image_data, np.uint8)
+        # 解码图像
+        with PROFILER.stage('imdecode'):
+            image = cv2.imdecode(nparr, flags)
+        return image
+    except Exception as e:
+        print(f"读取图像失败: {file_path}, 错误: {str(e)}")
+        return None
+
+def cv2_imwrite_unicode(file_path, image):
+    """
+    解决OpenCV写入中文路径图像的问题
+    """
+    try:
+        ext = Path(file_path).suffix or '.png'
+        ok, buf = cv2.imencode(ext, image)
+        if not ok:
+            return False
+        buf.tofile(str(file_path))
+        return True
+    except Exception as e:
+        print(f"写入图像失败: {file_path}, 错误: {str(e)}")
+        return False
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
+
+# 颜色配置（RGB）
+DEFAULT_COLORS = [
+    (255, 0, 0),    # 红色
+    (0, 255, 0),    # 绿色
+    (0, 0, 255),    # 蓝色
+    (255, 255, 0),  # 黄色
+    (255, 0, 255),  # 品红
+    (0, 255, 255),  # 青色
+    (128, 0, 128),  # 紫色
+    (255, 165, 0),  # 橙色
+    (0, 128, 128),  # 深青色
+    (128, 128, 0),  # 橄榄色
+]
+
+class YoloAnnotations:
+    """单个标签文件的列式标注
+
+    box_classes: (Nb,) int32 检测框类别
+    boxes:       (Nb, 4) float32 归一化 (x_center, y_center, width, height)
+    seg_classes: (Ns,) int32 分割类别
+    seg_coords:  (2P,) float32 所有多边形顶点的扁平坐标 x0, y0, x1, y1, ...
+    seg_offsets: (Ns+1,) int64 第 i 个多边形的顶点为 [seg_offsets[i], seg_offsets[i+1])
+    """
+    __slots__ = ('box_classes', 'boxes', 'seg_classes', 'seg_coords', 'seg_offsets')
+
+    def __init__(self, box_classes, boxes, seg_classes, seg_coords, seg_offsets):
+        self.box_classes = box_classes
+        self.boxes = boxes
+        self.seg_classes = seg_classes
+        self.seg_coords = seg_coords
+        self.seg_offsets = seg_offsets
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros(0, np.int32), np.zeros((0, 4), np.float32),
+                   np.zeros(0, np.int32), np.zeros(0, np.float32), np.zeros(1, np.int64))
+
+    def __len__(self):
+        return len(self.box_classes) + len(self.seg_classes)
+
+    @property
+    def num_boxes(self):
+        return len(self.box_classes)
+
+    @property
+    def num_segments(self):
+        return len(self.seg_classes)
+
+    @property
+    def seg_points(self):
+        """所有顶点 (P, 2) 视图"""
+        return self.seg_coords.reshape(-1, 2)
+
+    @property
+    def seg_sizes(self):
+        """每个多边形的顶点数"""
+        return np.diff(self.seg_offsets)
+
+    def segments(self):
+        """按多边形拆分的顶点数组列表（视图，不复制）"""
+        return np.split(self.seg_points, self.seg_offsets[1:-1]) if self.num_segments else []
+
+    def slice(self, b0, b1, s0, s1):
+        """取第 [b0, b1) 个检测框与第 [s0, s1) 个多边形（数组视图）"""
+        p0, p1 = int(self.seg_offsets[s0]), int(self.seg_offsets[s1])
+        return YoloAnnotations(self.box_classes[b0:b1], self.boxes[b0:b1],
+                               self.seg_classes[s0:s1], self.seg_coords[2 * p0:2 * p1],
+                               self.seg_offsets[s0:s1 + 1] - p0)
+
+    def take(self, box_indices, seg_indices):
+        """按下标取部分检测框与多边形（复制）"""
+        sizes = self.seg_sizes[seg_indices]
+        offsets = np.zeros(len(sizes) + 1, np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        starts = self.seg_offsets[:-1][seg_indices]
+        points = np.repeat(starts - offsets[:-1], sizes) + np.arange(offsets[-1])
+        return YoloAnnotations(self.box_classes[box_indices], self.boxes[box_indices],
+                               self.seg_classes[seg_indices], self.seg_points[points].ravel(), offsets)
+
+    def bounds(self, w, h):
+        """每个标注的像素包围盒 (N, 4) x0, y0, x1, y1：先检测框，后多边形"""
+        xc, yc, bw, bh = (self.boxes.astype(np.float64) * (w, h, w, h)).T
+        box_bounds = np.stack([xc - bw / 2, yc - bh / 2, xc + bw / 2, yc + bh / 2], 1)
+        seg_bounds = np.zeros((self.num_segments, 4))
+        nonempty = self.seg_sizes > 0
+        if nonempty.any():
+            pts = self.seg_points.astype(np.float64) * (w, h)
+            starts = self.seg_offsets[:-1][nonempty]
+            seg_bounds[nonempty, :2] = np.minimum.reduceat(pts, starts)
+            seg_bounds[nonempty, 2:] = np.maximum.reduceat(pts, starts)
+        return np.concatenate([box_bounds, seg_bounds])
+
+    def box_corners(self, w, h):
+        """检测框像素坐标 (Nb, 4, 2)，顶点顺序为左上、右上、右下、左下"""
+        xc, yc, bw, bh = (self.boxes.astype(np.float64) * (w, h, w, h)).T
+        x1, y1 = xc - bw / 2, yc - bh / 2
+        x2, y2 = x1 + bw, y1 + bh
+        return np.stack([np.stack([x1, y1], 1), np.stack([x2, y1], 1),
+                         np.stack([x2, y2], 1), np.stack([x1, y2], 1)], 1)
+
+def _parse_yolo_lines_slow(lines):
+    """逐行解析（含非法内容时的回退路径，跳过无法解析的行）"""
+    box_classes, boxes, seg_classes, seg_coords, seg_sizes = [], [], [], [], []
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 5:
+            continue
+        try:
+            class_id = int(float(parts[0]))
+            coords = [float(x) for x in parts[1:]]
+        except ValueError:
+            continue
+        if len(coords) == 4:  # 检测框格式
+            box_classes.append(class_id)
+            boxes.append(coords)
+        else:  # 分割格式
+            n = len(coords) // 2
+            seg_classes.append(class_id)
+            seg_coords.extend(coords[:2 * n])
+            seg_sizes.append(n)
+    return YoloAnnotations(np.array(box_classes, np.int32),
+                           np.array(boxes, np.float32).reshape(-1, 4),
+                           np.array(seg_classes, np.int32),
+                           np.array(seg_coords, np.float32),
+                           np.concatenate([[0], np.cumsum(seg_sizes, dtype=np.int64)]))
+
+def _parse_yolo_flat(text, lines):
+    """快速路径：整段文本一次性转换为浮点数组后按行切分
+
+    返回 (YoloAnnotations, 每行字段数)；含无法解析的内容时返回 (None, 每行字段数)
+    """
+    counts = np.fromiter((len(line.split()) for line in lines), dtype=np.int64, count=len(lines))
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning)
+            flat = np.fromstring(text, dtype=np.float64, sep=' ') if lines else np.zeros(0)
+    except ValueError:
+        return None, counts
+    if len(flat) != counts.sum():
+        return None, counts
+    return _annotations_from_flat(flat, counts), counts
+
+def _annotations_from_flat(flat, counts):
+    """由扁平数值数组与每行字段数构造列式标注：5 个字段为检测框，更多为多边形，更少的行忽略"""
+    starts = np.cumsum(counts) - counts
+
+    box_starts = starts[counts == 5]
+    box_rows = flat[box_starts[:, None] + np.arange(5)]
+
+    seg_mask = counts > 5
+    seg_starts = starts[seg_mask]
+    seg_sizes = (counts[seg_mask] - 1) // 2              # 奇数个坐标时舍弃最后一个
+    seg_offsets = np.concatenate([[0], np.cumsum(seg_sizes, dtype=np.int64)])
+    # 每个多边形坐标在 flat 中的位置：起点 + 1（跳过类别） + 多边形内偏移
+    n_coords = seg_sizes * 2
+    coord_base = np.repeat(seg_starts + 1 - 2 * seg_offsets[:-1], n_coords)
+    coord_idx = coord_base + np.arange(n_coords.sum())
+    return YoloAnnotations(box_rows[:, 0].astype(np.int32),
+                           box_rows[:, 1:].astype(np.float32),
+                           flat[seg_starts].astype(np.int32),
+                           flat[coord_idx].astype(np.float32),
+                           seg_offsets)
+
+def parse_yolo_text(text):
+    """解析YOLO标签文本为列式结构"""
+    lines = text.splitlines()
+    annotations, _ = _parse_yolo_flat(text, lines)
+    if annotations is None:
+        # 文件中有无法解析的内容，回退到逐行解析
+        return _parse_yolo_lines_slow(lines)
+    return annotations
+
+def parse_yolo_texts(texts):
+    """批量解析多个标签文本：拼接后一次转换，再按文件切分（小文件时省去逐文件开销）"""
+    file_lines = [text.splitlines() for text in texts]
+    lines = [line for ls in file_lines for line in ls]
+    annotations, counts = _parse_yolo_flat('\n'.join(lines), lines)
+    if annotations is None:
+        return [parse_yolo_text(text) for text in texts]
+    n = len(texts)
+    file_of_line = np.repeat(np.arange(n), [len(ls) for ls in file_lines])
+    box_off = np.concatenate([[0], np.cumsum(np.bincount(file_of_line[counts == 5], minlength=n))])
+    seg_off = np.concatenate([[0], np.cumsum(np.bincount(file_of_line[counts > 5], minlength=n))])
+    return [annotations.slice(box_off[i], box_off[i + 1], seg_off[i], seg_off[i + 1]) for i in range(n)]
+
+def parse_yolo_annotations(label_path):
+    """读取YOLO格式的标注，返回 YoloAnnotations"""
+    try:
+        return parse_yolo_text(read_dataset_text(label_path))
+    except FileNotFoundError:
+        return YoloAnnotations.empty()
+
+def read_label_map_file(file_path):
+    """读取标签映射文件（json 或 id:name 文本）"""
+    if str(file_path).endswith('.json'):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            label_map = json.load(f)
+        # 确保键是整数
+        return {int(k): v for k, v in label_map.items()}
+    # 文本格式: id:name
+    label_map = {}
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if ':' in line:
+                id_str, name = line.strip().split(':', 1)
+                label_map[int(id_str)] = name
+    return label_map
+
+# ---------------- 持久化标注索引 ----------------
+
+ANNOTATION_INDEX_VERSION = 1
+
+def label_key(image_path, image_root=None):
+    """图像对应的标签键：平铺文件夹为文件名（不含扩展名），递归加载时为相对图像根目录的路径"""
+    if image_root is None:
+        return Path(image_path).stem
+    rel = os.path.relpath(os.path.splitext(str(image_path))[0], str(image_root))
+    return rel.replace(os.sep, '/')
+
+def label_path_for(label_folder, key):
+    """标签键对应的标签文件路径（子文件夹结构与图像一致）"""
+    return Path(label_folder) / f"{key}.txt"
+
+def scan_label_files(label_folder, recursive=False):
+    """单次 os.scandir 列出标签文件（可递归子文件夹），返回 {标签键: (size, mtime_ns)}"""
+    result = {}
+    stack = ['']
+    while stack:
+        rel_dir = stack.pop()
+        prefix = f"{rel_dir}/" if rel_dir else ''
+        with scandir_dataset(os.path.join(str(label_folder), rel_dir)) as it:
+            for entry in it:
+                name = entry.name
+                if name[-4:].lower() == '.txt':
+                    if entry.is_file():
+                        st = entry.stat()
+                        result[prefix + name[:-4]] = (st.st_size, st.st_mtime_ns)
+                elif recursive and not name.startswith('.') and entry.is_dir(follow_symlinks=False):
+                    stack.append(prefix + name)
+    return result
+
+def compute_label_coverage(image_list, label_folder, image_root=None, recursive=False):
+    """单次 os.scandir 列出标签文件夹，按标签键集合比较图像与标签
+
+    返回 {'total', 'labeled', 'missing': 缺失标签的图像下标, 'empty': 空标签的图像下标,
+          'orphans': 没有对应图像的标签文件名}
+    """
+    scan = scan_label_files(label_folder, recursive)
+    image_stems = [label_key(p, image_root) for p in image_list]
+    stem_set = set(image_stems)
+    missing, empty = [], []
+    for i, stem in enumerate(image_stems):
+        st = scan.get(stem)
+        if st is None:
+            missing.append(i)
+        elif st[0] == 0:
+            empty.append(i)
+        elif st[0] < 64:
+            # 很小的文件可能只有空白，读一下确认
+            try:
+                if not read_dataset_text(label_path_for(label_folder, stem)).strip():
+                    empty.append(i)
+            except (OSError, UnicodeDecodeError):
+                pass
+    orphans = sorted(f"{stem}.txt" for stem in scan if stem not in stem_set)
+    return {
+        'total': len(image_list),
+        'labeled': len(image_list) - len(missing),
+        'missing': missing,
+        'empty': empty,
+        'orphans': orphans,
+    }
+
+def concat_annotations(parts):
+    """把多个文件的标注拼接为一个 YoloAnnotations，返回 (标注, 每文件检测框数, 每文件多边形数)"""
+    box_counts = np.array([p.num_boxes for p in parts], dtype=np.int64)
+    seg_counts = np.array([p.num_segments for p in parts], dtype=np.int64)
+    if not parts:
+        return YoloAnnotations.empty(), box_counts, seg_counts
+    point_counts = np.array([p.seg_offsets[-1] for p in parts], dtype=np.int64)
+    point_base = np.concatenate([[0], np.cumsum(point_counts)])
+    seg_offsets = [np.zeros(1, np.int64)]
+    seg_offsets += [np.asarray(p.seg_offsets[1:]) + base for p, base in zip(parts, point_base)]
+    combined = YoloAnnotations(
+        np.concatenate([p.box_classes for p in parts]).astype(np.int32, copy=False),
+        np.concatenate([p.boxes for p in parts]).astype(np.float32, copy=False).reshape(-1, 4),
+        np.concatenate([p.seg_classes for p in parts]).astype(np.int32, copy=False),
+        np.concatenate([p.seg_coords for p in parts]).astype(np.float32, copy=False),
+        np.concatenate(seg_offsets))
+    return combined, box_counts, seg_counts
+
+def _parse_label_files(label_paths):
+    """批量读取并解析一组标签文件（供进程池调用）"""
+    texts = []
+    for label_path in label_paths:
+        try:
+            texts.append(read_dataset_text(label_path))
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"读取标注失败: {label_path}, 错误: {str(e)}")
+            texts.append('')
+    return parse_yolo_texts(texts)
+
+class AnnotationIndex:
+    """标签文件夹的持久化标注索引
+
+    全部标注按文件顺序拼接为若干扁平数组，分别保存为 .npy 并以 mmap 方式打开；
+    每个文件记录 size 与 mtime，重新打开时只重新解析发生变化的文件。
+    索引保存在标签文件夹旁的 <文件夹名>.yoloidx 目录，不可写时退回用户缓存目录。
+    每次写入生成新的子目录，再原子替换 CURRENT 指向它，旧数据即使仍被映射也不受影响。
+    """
+    ARRAYS = ('file_size', 'file_mtime', 'file_box_off', 'file_seg_off',
+              'box_classes', 'boxes', 'seg_classes', 'seg_offsets', 'seg_coords')
+    _build_lock = threading.Lock()   # 同一进程内串行构建，避免并发写入
+
+    def __init__(self, label_folder, stems, arrays, recursive=False):
+        self.label_folder = str(label_folder)
+        self.recursive = recursive
+        self.stems = list(stems)
+        self.stem_to_row = {stem: i for i, stem in enumerate(self.stems)}
+        for name in self.ARRAYS:
+            # asarray 去掉 memmap 子类（仍共享映射内存），避免切片开销
+            setattr(self, name, np.asarray(arrays[name]))
+        # 全部标注视为一个整体的列式结构，按文件切片
+        self.all = YoloAnnotations(self.box_classes, self.boxes, self.seg_classes,
+                                   self.seg_coords, self.seg_offsets)
+
+    def __len__(self):
+        return len(self.stems)
+
+    @staticmethod
+    def index_dirs(label_folder):
+        """候选索引目录：标签文件夹旁，其次用户缓存目录"""
+        folder = Path(label_folder).resolve()
+        digest = hashlib.md5(str(folder).encode('utf-8')).hexdigest()[:16]
+        cache_root = Path.home() / '.cache' / 'yolo-dataset-vis' / 'index'
+        if split_archive_path(folder)[0] is not None:
+            return [cache_root / digest]   # 压缩包内的文件夹只能使用缓存目录
+        return [folder.with_name(folder.name + '.yoloidx'), cache_root / digest]
+
+    @classmethod
+    def load(cls, label_folder, recursive=False):
+        """打开已有索引（mmap），不存在、版本或递归模式不符时返回 None"""
+        for index_dir in cls.index_dirs(label_folder):
+            current_path = index_dir / 'CURRENT'
+            if not current_path.exists():
+                continue
+            try:
+                data_dir = index_dir / current_path.read_text(encoding='utf-8').strip()
+                with open(data_dir / 'meta.json', 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                if (meta.get('version') != ANNOTATION_INDEX_VERSION
+                        or bool(meta.get('recursive', False)) != recursive):
+                    continue
+                arrays = {name: np.load(data_dir / f'{name}.npy', mmap_mode='r') for name in cls.ARRAYS}
+                return cls(label_folder, meta['stems'], arrays, recursive)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"读取标注索引失败: {index_dir}, 错误: {str(e)}")
+        return None
+
+    @classmethod
+    def from_parts(cls, label_folder, stems, sizes, mtimes, parts, recursive=False):
+        """由每个文件的 YoloAnnotations 拼接出索引"""
+        combined, box_counts, seg_counts = concat_annotations(parts)
+        arrays = {
+            'file_size': np.asarray(sizes, dtype=np.int64),
+            'file_mtime': np.asarray(mtimes, dtype=np.int64),
+            'file_box_off': np.concatenate([[0], np.cumsum(box_counts)]),
+            'file_seg_off': np.concatenate([[0], np.cumsum(seg_counts)]),
+            'box_classes': combined.box_classes,
+            'boxes': combined.boxes,
+            'seg_classes': combined.seg_classes,
+            'seg_offsets': combined.seg_offsets,
+            'seg_coords': combined.seg_coords,
+        }
+        return cls(label_folder, stems, arrays, recursive)
+
+    @classmethod
+    def build(cls, label_folder, workers=None, progress=None, on_chunk=None, recursive=False,
+              cancel_event=None):
+        """增量构建：复用 size/mtime 未变化的文件，其余重新解析并写回磁盘
+
+        progress(已解析, 待解析总数) 汇报解析进度；on_chunk(标注, 每文件检测框数, 每文件多边形数)
+        依次收到未变化文件和每批新解析文件的标注，用于流式统计。
+        recursive 为 True 时包含子文件夹，标签键为相对路径。
+        cancel_event 被设置时停止解析并返回 None（不写入部分结果）。
+        """
+        with cls._build_lock:
+            return cls._build(label_folder, workers, progress, on_chunk, recursive, cancel_event)
+
+    @classmethod
+    def _build(cls, label_folder, workers, progress, on_chunk, recursive, cancel_event=None):
+        scan = scan_label_files(label_folder, recursive)
+        stems = sorted(scan)
+        sizes = np.array([scan[s][0] for s in stems], dtype=np.int64)
+        mtimes = np.array([scan[s][1] for s in stems], dtype=np.int64)
+        old = cls.load(label_folder, recursive)
+        unchanged = np.zeros(len(stems), dtype=bool)
+        if old is not None:
+            rows = np.array([old.stem_to_row.get(s, -1) for s in stems], dtype=np.int64)
+            known = rows >= 0
+            unchanged[known] = ((old.file_size[rows[known]] == sizes[known])
+                                & (old.file_mtime[rows[known]] == mtimes[known]))
+            if unchanged.all() and len(old) == len(stems):
+                if on_chunk:
+                    on_chunk(old.all, np.diff(old.file_box_off), np.diff(old.file_seg_off))
+                return old
+        parts = [old.get_row(rows[i]) if unchanged[i] else None for i in range(len(stems))]
+        to_parse = np.flatnonzero(~unchanged).tolist()
+        if on_chunk and unchanged.any():
+            on_chunk(*concat_annotations([p for p in parts if p is not None]))
+
+        folder = os.path.join(str(label_folder), '')
+        paths = [f"{folder}{stems[i]}.txt" for i in to_parse]
+        chunk = 1024
+        chunks = [paths[k:k + chunk] for k in range(0, len(paths), chunk)]
+        workers = workers or max(1, (multiprocessing.cpu_count() or 2) - 1)
+
+        def consume(results):
+            done = 0
+            for k, chunk_parts in enumerate(results):
+                for i, ann in zip(to_parse[k * chunk:(k + 1) * chunk], chunk_parts):
+                    parts[i] = ann
+                done += len(chunk_parts)
+                if on_chunk:
+                    on_chunk(*concat_annotations(chunk_parts))
+                if progress:
+                    progress(done, len(paths))
+                if cancel_event is not None and cancel_event.is_set():
+                    return False
+            return True
+
+        if len(chunks) > 1 and workers > 1:
+            # 大量文件时使用进程池并行解析，每个任务批量解析一组文件
+            with multiprocessing.Pool(workers, initializer=_init_pool_worker) as pool:
+                finished = consume(pool.imap(_parse_label_files, chunks))
+                if not finished:
+                    pool.terminate()
+        else:
+            finished = consume(map(_parse_label_files, chunks))
+        if not finished:
+            return None
+        print(f"标注索引: 共 {len(stems)} 个标签文件, 重新解析 {len(to_parse)} 个")
+
+        index = cls.from_parts(label_folder, stems, sizes, mtimes, parts, recursive)
+        if index.save():
+            return cls.load(label_folder, recursive) or index
+        return index
+
+    def save(self):
+        """写入新的索引数据目录并切换 CURRENT，返回是否成功"""
+        for index_dir in self.index_dirs(self.label_folder):
+            generation = f"{time.time_ns():x}"
+            data_dir = index_dir / generation
+            try:
+                data_dir.mkdir(parents=True)
+                for name in self.ARRAYS:
+                    np.save(data_dir / f'{name}.npy', np.asarray(getattr(self, name)))
+                with open(data_dir / 'meta.json', 'w', encoding='utf-8') as f:
+                    json.dump({'version': ANNOTATION_INDEX_VERSION, 'label_folder': self.label_folder,
+                               'recursive': self.recursive, 'stems': self.stems}, f, ensure_ascii=False)
+                tmp_path = index_dir / 'CURRENT.tmp'
+                tmp_path.write_text(generation, encoding='utf-8')
+                os.replace(tmp_path, index_dir / 'CURRENT')
+            except OSError as e:
+                shutil.rmtree(data_dir, ignore_errors=True)
+                print(f"写入标注索引失败: {index_dir}, 错误: {str(e)}")
+                continue
+            # 清理旧数据（Windows 下仍被映射的目录会留到下次清理）
+            for old_dir in index_dir.iterdir():
+                if old_dir.is_dir() and old_dir.name != generation and (old_dir / 'meta.json').exists():
+                    shutil.rmtree(old_dir, ignore_errors=True)
+            return True
+        return False
+
+    def get_row(self, row):
+        """第 row 个文件的标注（数组视图）"""
+        return self.all.slice(self.file_box_off[row], self.file_box_off[row + 1],
+                              self.file_seg_off[row], self.file_seg_off[row + 1])
+
+    def lookup(self, label_path):
+        """从索引读取标注；文件已变化或不在索引中时返回 None"""
+        label_path = Path(label_path)
+        try:
+            st = dataset_stat(label_path)
+        except FileNotFoundError:
+            return YoloAnnotations.empty()
+        if self.recursive:
+            key = os.path.relpath(os.path.splitext(str(label_path))[0], self.label_folder).replace(os.sep, '/')
+        else:
+            key = label_path.stem
+        row = self.stem_to_row.get(key)
+        if row is None or int(self.file_size[row]) != st.st_size or int(self.file_mtime[row]) != st.st_mtime_ns:
+            return None
+        return self.get_row(row)
+
+# ---------------- 标签质量检查 ----------------
+
+LABEL_ISSUES = {
+    'read': '无法读取',
+    'format': '格式错误',
+    'class': '类别 ID 异常',
+    'unknown_class': '未知类别',
+    'odd_coords': '坐标个数为奇数',
+    'few_points': '多边形少于 3 个点',
+    'out_of_range': '坐标超出 [0,1]',
+    'zero_area': '检测框面积为 0',
+    'duplicate': '重复检测框',
+}
+
+def box_iou_matrix(a, b):
+    """两组归一化 xywh 检测框的 IoU 矩阵 (len(a), len(b))"""
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    a1, a2 = a[:, :2] - a[:, 2:] / 2, a[:, :2] + a[:, 2:] / 2
+    b1, b2 = b[:, :2] - b[:, 2:] / 2, b[:, :2] + b[:, 2:] / 2
+    wh = np.clip(np.minimum(a2[:, None], b2[None]) - np.maximum(a1[:, None], b1[None]), 0, None)
+    inter = wh[..., 0] * wh[..., 1]
+    area_a = np.clip(a[:, 2], 0, None) * np.clip(a[:, 3], 0, None)
+    area_b = np.clip(b[:, 2], 0, None) * np.clip(b[:, 3], 0, None)
+    return inter / np.maximum(area_a[:, None] + area_b[None] - inter, 1e-12)
+
+def validate_label_text(text, known_classes=None, dup_iou=0.9):
+    """检查一个标签文件的内容，返回 [(行号, 问题类型, 说明)]
+
+    整个文件一次转换为浮点数组后按行向量化检查；含非数字内容时先逐行找出坏行再检查其余行。
+    known_classes 为已知类别 ID 集合（为空时不检查）；同类别检测框 IoU 不低于 dup_iou 视为重复。
+    """
+    issues = []
+    lines = text.splitlines()
+    counts = np.fromiter((len(line.split()) for line in lines), dtype=np.int64, count=len(lines))
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning)
+            flat = np.fromstring(text, dtype=np.float64, sep=' ') if lines else np.zeros(0)
+    except ValueError:
+        flat = None
+    if flat is None or len(flat) != counts.sum():
+        good = []
+        for i, line in enumerate(lines):
+            try:
+                [float(x) for x in line.split()]
+                good.append(line)
+            except ValueError:
+                issues.append((i + 1, 'format', f"包含非数字内容: {line.strip()[:40]}"))
+                counts[i] = 0
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning)
+            flat = np.fromstring('\n'.join(good), dtype=np.float64, sep=' ') if good else np.zeros(0)
+
+    line_no = np.arange(1, len(lines) + 1)
+    for i in np.flatnonzero((counts > 0) & (counts < 5)):
+        issues.append((int(line_no[i]), 'format', f"字段数 {counts[i]} 少于 5"))
+    starts = np.cumsum(counts) - counts
+    valid = counts >= 5
+    cls = flat[starts[valid]]
+    valid_no = line_no[valid]
+    bad_cls = (cls != np.floor(cls)) | (cls < 0)
+    for no, c in zip(valid_no[bad_cls], cls[bad_cls]):
+        issues.append((int(no), 'class', f"类别 ID {c:g} 不是非负整数"))
+    if known_classes:
+        unknown = ~bad_cls & ~np.isin(cls, list(known_classes))
+        for no, c in zip(valid_no[unknown], cls[unknown]):
+            issues.append((int(no), 'unknown_class', f"类别 {int(c)} 不在标签映射中"))
+
+    # 坐标范围：每个数值所在的行，去掉每行第一个（类别）
+    value_line = np.repeat(np.arange(len(lines)), counts)
+    is_coord = np.ones(len(flat), dtype=bool)
+    is_coord[starts[counts > 0]] = False
+    is_coord &= valid[value_line]
+    out = is_coord & ((flat < 0) | (flat > 1))
+    if out.any():
+        for i in np.unique(value_line[out]):
+            values = flat[starts[i] + 1:starts[i] + counts[i]]
+            issues.append((int(line_no[i]), 'out_of_range',
+                           f"坐标范围 [{values.min():.4g}, {values.max():.4g}]"))
+
+    # 检测框：宽或高不大于 0；同类别高重叠
+    is_box = counts == 5
+    box_rows = np.flatnonzero(is_box)
+    boxes = flat[starts[box_rows][:, None] + np.arange(1, 5)] if len(box_rows) else np.zeros((0, 4))
+    zero = (boxes[:, 2] <= 0) | (boxes[:, 3] <= 0)
+    for i in box_rows[zero]:
+        issues.append((int(line_no[i]), 'zero_area', f"宽 {flat[starts[i] + 3]:.4g}, 高 {flat[starts[i] + 4]:.4g}"))
+    if dup_iou and len(box_rows) > 1:
+        box_cls = flat[starts[box_rows]]
+        block = 1024   # 分块计算，避免大图上 N×N 矩阵占用过多内存
+        for b0 in range(0, len(box_rows), block):
+            iou = box_iou_matrix(boxes[b0:b0 + block], boxes)
+            same = box_cls[b0:b0 + block, None] == box_cls[None]
+            rows, cols = np.nonzero((iou >= dup_iou) & same)
+            keep = cols < rows + b0   # 每对只报告后出现的一个
+            for r, c in zip(rows[keep], cols[keep]):
+                issues.append((int(line_no[box_rows[r + b0]]), 'duplicate',
+                               f"与第 {int(line_no[box_rows[c]])} 行 IoU {iou[r, c]:.2f}"))
+
+    # 多边形：坐标个数为奇数、少于 3 个点
+    seg_rows = np.flatnonzero(counts > 5)
+    n_coords = counts[seg_rows] - 1
+    for i, n in zip(seg_rows[n_coords % 2 == 1], n_coords[n_coords % 2 == 1]):
+        issues.append((int(line_no[i]), 'odd_coords', f"{n} 个坐标值"))
+    for i, n in zip(seg_rows[n_coords // 2 < 3], n_coords[n_coords // 2 < 3]):
+        issues.append((int(line_no[i]), 'few_points', f"{n // 2} 个点"))
+    issues.sort(key=lambda issue: issue[0])
+    return issues
+
+_VALIDATE_OPTIONS = {}
+
+def _init_validate_worker(options):
+    """检查子进程初始化：保存检查参数"""
+    global _VALIDATE_OPTIONS
+    _init_pool_worker()
+    _VALIDATE_OPTIONS = options
+
+def _validate_label_files(items):
+    """检查一组标签文件（供进程池调用），items 为 [(标签键, 路径)]，返回 [(标签键, 行号, 类型, 说明)]"""
+    opts = _VALIDATE_OPTIONS
+    results = []
+    for key, path in items:
+        try:
+            text = read_dataset_text(path)
+        except (OSError, UnicodeDecodeError) as e:
+            results.append((key, 0, 'read', str(e)))
+            continue
+        for line, kind, detail in validate_label_text(text, opts.get('known_classes'), opts.get('dup_iou', 0.9)):
+            results.append((key, line, kind, detail))
+    return len(items), results
+
+def run_label_validation(label_folder, recursive=False, known_classes=None, dup_iou=0.9,
+                         workers=None, progress=None, on_issues=None, cancel_event=None):
+    """多进程检查标签文件夹中的全部标签文件
+
+    progress(已检查, 总数) 汇报进度；on_issues(问题列表) 依次收到每批结果；返回全部问题。
+    """
+    scan = scan_label_files(label_folder, recursive)
+    items = [(key, str(label_path_for(label_folder, key))) for key in sorted(scan)]
+    chunk = 256
+    chunks = [items[k:k + chunk] for k in range(0, len(items), chunk)]
+    options = {'known_classes': sorted(known_classes or ()), 'dup_iou': dup_iou}
+    workers = workers or max(1, (multiprocessing.cpu_count() or 2) - 1)
+    issues = []
+    done = 0
+
+    def consume(results):
+        nonlocal done
+        for count, chunk_issues in results:
+            done += count
+            issues.extend(chunk_issues)
+            if on_issues and chunk_issues:
+                on_issues(chunk_issues)
+            if progress:
+                progress(done, len(items))
+            if cancel_event is not None and cancel_event.is_set():
+                return False
+        return True
+
+    if len(chunks) > 1 and workers > 1:
+        with multiprocessing.Pool(workers, initializer=_init_validate_worker, initargs=(options,)) as pool:
+            if not consume(pool.imap_unordered(_validate_label_files, chunks)):
+                pool.terminate()
+    else:
+        _init_validate_worker(options)
+        consume(map(_validate_label_files, chunks))
+    return issues
+
+# ---------------- 预测与真值对比 ----------------
+
+IOU_THRESHOLDS = np.round(np.arange(0.5, 0.96, 0.05), 2)   # mAP@0.5:0.95 的 10 个阈值
+MATCH_METHODS = {'greedy': '贪心（按置信度）', 'hungarian': '匈牙利（最大总 IoU）'}
+# 对比显示样式：(线型, RGB)；TP 为匹配上的预测，FP 为误检的预测，FN 为漏检的真值
+COMPARE_STYLES = {
+    'tp': ('solid', (0, 200, 0)),
+    'fp': ('dashed', (255, 0, 0)),
+    'fn': ('dashdot', (255, 200, 0)),
+}
+
+def parse_prediction_text(text):
+    """解析预测标签：YOLO 格式，行末多一列置信度，返回 (YoloAnnotations, 置信度)
+
+    字段数为不小于 6 的偶数时最后一列为置信度，否则置信度为 1（与真值格式相同的行）。
+    置信度顺序与 YoloAnnotations 一致：先检测框，后多边形。
+    """
+    lines = text.splitlines()
+    counts = np.fromiter((len(line.split()) for line in lines), dtype=np.int64, count=len(lines))
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning)
+            flat = np.fromstring(text, dtype=np.float64, sep=' ') if lines else np.zeros(0)
+    except ValueError:
+        flat = None
+    if flat is None or len(flat) != counts.sum():
+        # 含非数字内容：只保留可以解析的行
+        good = []
+        for line in lines:
+            try:
+                [float(x) for x in line.split()]
+                good.append(line)
+            except ValueError:
+                continue
+        return parse_prediction_text('\n'.join(good)) if len(good) < len(lines) else (
+            YoloAnnotations.empty(), np.zeros(0, np.float32))
+    has_conf = (counts >= 6) & (counts % 2 == 0)
+    ends = np.cumsum(counts)
+    conf = np.ones(len(lines))
+    conf[has_conf] = flat[ends[has_conf] - 1]
+    flat = np.delete(flat, ends[has_conf] - 1)
+    counts = counts - has_conf
+    annotations = _annotations_from_flat(flat, counts)
+    scores = np.concatenate([conf[counts == 5], conf[counts > 5]]).astype(np.float32)
+    return annotations, scores
+
+def parse_predictions(pred_path):
+    """读取预测标签文件，返回 (YoloAnnotations, 置信度)，文件不存在时为空"""
+    try:
+        return parse_prediction_text(read_dataset_text(pred_path))
+    except FileNotFoundError:
+        return YoloAnnotations.empty(), np.zeros(0, np.float32)
+
+def annotation_boxes(annotations):
+    """全部标注的类别与归一化 xywh 包围盒：先检测框，后多边形（按顶点范围）"""
+    b = annotations.bounds(1, 1)
+    xywh = np.column_stack([(b[:, 0] + b[:, 2]) / 2, (b[:, 1] + b[:, 3]) / 2, b[:, 2] - b[:, 0], b[:, 3] - b[:, 1]])
+    return np.concatenate([annotations.box_classes, annotations.seg_classes]), xywh
+
+def linear_assignment(gain):
+    """最大化总收益的一一匹配（匈牙利算法，势函数版本，内层按列向量化），返回 (行下标, 列下标)"""
+    gain = np.asarray(gain, dtype=np.float64)
+    transposed = gain.shape[0] > gain.shape[1]
+    if transposed:
+        gain = gain.T
+    n, m = gain.shape
+    if n == 0:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64)
+    cost = gain.max() - gain
+    u, v = np.zeros(n + 1), np.zeros(m + 1)
+    p = np.zeros(m + 1, np.int64)      # p[j]: 第 j 列匹配的行（1 起，0 为未匹配）
+    way = np.zeros(m + 1, np.int64)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            free = ~used[1:]
+            cur = cost[p[j0] - 1] - u[p[j0]] - v[1:]
+            better = free & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+            masked = np.where(free, minv[1:], np.inf)
+            j1 = int(masked.argmin()) + 1
+            delta = masked[j1 - 1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    cols = np.flatnonzero(p[1:])
+    rows = p[1:][cols] - 1
+    order = np.argsort(rows)
+    rows, cols = rows[order], cols[order]
+    return (cols, rows) if transposed else (rows, cols)
+
+def match_detections(iou, scores, threshold, method='greedy'):
+    """同一类别内按 IoU 匹配预测与真值，返回每个预测匹配的真值下标（未匹配为 -1）
+
+    greedy：按置信度从高到低，每个预测取 IoU 最大且未被占用的真值（COCO 评估方式）；
+    hungarian：在 IoU 不低于阈值的配对中最大化总 IoU，不考虑置信度。
+    """
+    match = np.full(iou.shape[0], -1, dtype=np.int64)
+    valid = iou >= threshold
+    if not valid.any():
+        return match
+    if method == 'hungarian':
+        rows, cols = linear_assignment(np.where(valid, iou, 0.0))
+        keep = valid[rows, cols]
+        match[rows[keep]] = cols[keep]
+        return match
+    taken = np.zeros(iou.shape[1], dtype=bool)
+    candidates = valid.any(axis=1)
+    for p in np.argsort(-scores, kind='stable'):
+        if not candidates[p]:
+            continue
+        row = np.where(valid[p] & ~taken, iou[p], -1.0)
+        j = int(row.argmax())
+        if row[j] >= 0:
+            match[p] = j
+            taken[j] = True
+    return match
+
+def match_predictions(gt, pred, scores, thresholds, method='greedy'):
+    """逐类别分块计算 IoU（不生成跨类别的大矩阵）并匹配
+
+    返回 (len(thresholds), 预测数) 的真值下标矩阵，未匹配为 -1；下标顺序同 annotation_boxes。
+    """
+    gt_cls, gt_xywh = annotation_boxes(gt)
+    pred_cls, pred_xywh = annotation_boxes(pred)
+    match = np.full((len(thresholds), len(pred_cls)), -1, dtype=np.int64)
+    for c in np.unique(pred_cls):
+        pi = np.flatnonzero(pred_cls == c)
+        gi = np.flatnonzero(gt_cls == c)
+        if not len(gi):
+            continue
+        iou = box_iou_matrix(pred_xywh[pi], gt_xywh[gi])
+        for t, threshold in enumerate(thresholds):
+            local = match_detections(iou, scores[pi], threshold, method)
+            hit = local >= 0
+            match[t, pi[hit]] = gi[local[hit]]
+    return match
+
+def compare_predictions(gt, pred, scores, iou_threshold=0.5, conf_threshold=0.25, method='greedy'):
+    """单张图像的 TP / FP / FN 判定（只考虑置信度不低于 conf_threshold 的预测）
+
+    返回 (保留的预测下标, 每个保留预测匹配的真值下标（-1 为 FP）, 每个真值是否漏检 (FN))。
+    """
+    keep = np.flatnonzero(scores >= conf_threshold)
+    kept = pred.take(keep[keep < pred.num_boxes], keep[keep >= pred.num_boxes] - pred.num_boxes)
+    match = match_predictions(gt, kept, scores[keep], [iou_threshold], method)[0]
+    missed = np.ones(len(gt), dtype=bool)
+    missed[match[match >= 0]] = False
+    return keep, match, missed
+
+def average_precision(tp, scores, n_gt):
+    """单个类别在各 IoU 阈值下的 AP（COCO 101 点插值），tp 为 (阈值数, 预测数) 布尔矩阵"""
+    if n_gt == 0:
+        return np.full(len(tp), np.nan)
+    if tp.shape[1] == 0:
+        return np.zeros(len(tp))
+    order = np.argsort(-scores, kind='stable')
+    tp = tp[:, order]
+    ctp = np.cumsum(tp, axis=1)
+    recall = ctp / n_gt
+    precision = ctp / np.arange(1, tp.shape[1] + 1)
+    # 精度包络：每个召回率处取其后的最大精度
+    precision = np.flip(np.maximum.accumulate(np.flip(precision, axis=1), axis=1), axis=1)
+    points = np.linspace(0, 1, 101)
+    ap = np.empty(len(tp))
+    for t in range(len(tp)):
+        idx = np.searchsorted(recall[t], points, side='left')
+        ap[t] = np.where(idx < tp.shape[1], precision[t, np.minimum(idx, tp.shape[1] - 1)], 0).mean()
+    return ap
+
+class PredictionReport:
+    """数据集级预测评估：逐图像 TP / FP / FN 计数（错误分数 = FP + FN），以及按类别的 AP 与 mAP"""
+    def __init__(self, n_images, iou_threshold=0.5, conf_threshold=0.25, method='greedy'):
+        self.iou_threshold = iou_threshold
+        self.conf_threshold = conf_threshold
+        self.method = method
+        self.evaluated = np.zeros(n_images, dtype=bool)
+        self.n_gt = np.zeros(n_images, dtype=np.int64)
+        self.n_pred = np.zeros(n_images, dtype=np.int64)
+        self.tp = np.zeros(n_images, dtype=np.int64)
+        self.fp = np.zeros(n_images, dtype=np.int64)
+        self.fn = np.zeros(n_images, dtype=np.int64)
+        self._parts = []            # [(预测类别, 置信度, 各阈值 TP, 真值类别)]，finish 时合并
+        self.class_ap = {}          # 类别 -> (真值数, 各阈值 AP)
+
+    def add(self, rows, pred_classes, scores, tp, gt_classes):
+        """合并一批图像的结果，rows 为 [(图像下标, 真值数, 预测数, TP, FP, FN)]"""
+        if rows:
+            idx, n_gt, n_pred, tp_n, fp_n, fn_n = (np.array(c, dtype=np.int64) for c in zip(*rows))
+            self.evaluated[idx] = True
+            self.n_gt[idx], self.n_pred[idx] = n_gt, n_pred
+            self.tp[idx], self.fp[idx], self.fn[idx] = tp_n, fp_n, fn_n
+        self._parts.append((pred_classes, scores, tp, gt_classes))
+
+    def finish(self):
+        """计算各类别 AP（按置信度贪心匹配，与 COCO 一致）"""
+        parts = self._parts
+        pred_classes = np.concatenate([p[0] for p in parts]) if parts else np.zeros(0, np.int64)
+        scores = np.concatenate([p[1] for p in parts]) if parts else np.zeros(0)
+        tp = np.concatenate([p[2] for p in parts], axis=1) if parts else np.zeros((len(IOU_THRESHOLDS), 0), bool)
+        gt_classes = np.concatenate([p[3] for p in parts]) if parts else np.zeros(0, np.int64)
+        self._parts = []
+        gt_count = dict(zip(*np.unique(gt_classes, return_counts=True)))
+        self.class_ap = {}
+        for c in sorted(set(gt_count) | set(np.unique(pred_classes).tolist())):
+            mask = pred_classes == c
+            self.class_ap[int(c)] = (int(gt_count.get(c, 0)),
+                                     average_precision(tp[:, mask], scores[mask], gt_count.get(c, 0)))
+        return self
+
+    @property
+    def precision(self):
+        total = self.tp.sum() + self.fp.sum()
+        return self.tp.sum() / total if total else 0.0
+
+    @property
+    def recall(self):
+        total = self.tp.sum() + self.fn.sum()
+        return self.tp.sum() / total if total else 0.0
+
+    def mean_ap(self, threshold_index=None):
+        """有真值的类别的平均 AP；threshold_index 为 None 时取 0.5:0.95 的平均"""
+        aps = [ap if threshold_index is None else ap[threshold_index]
+               for n_gt, ap in self.class_ap.values() if n_gt > 0]
+        return float(np.mean(aps)) if aps else 0.0
+
+    @property
+    def errors(self):
+        return self.fp + self.fn
+
+    def worst_first(self):
+        """有错误的图像下标，按错误数从多到少（相同时漏检多的在前）"""
+        idx = np.flatnonzero(self.evaluated & (self.errors > 0))
+        return idx[np.lexsort((idx, -self.fn[idx], -self.errors[idx]))]
+
+    def summary_text(self, label_map=None):
+        label_map = label_map or {}
+        return (f"图像 {int(self.evaluated.sum())} 张，真值 {int(self.n_gt.sum())}，预测 {int(self.n_pred.sum())}"
+                f"（置信度 ≥ {self.conf_threshold:g}，IoU ≥ {self.iou_threshold:g}，{MATCH_METHODS[self.method]}）\n"
+                f"TP {int(self.tp.sum())}  FP {int(self.fp.sum())}  FN {int(self.fn.sum())}  "
+                f"精确率 {self.precision:.3f}  召回率 {self.recall:.3f}  "
+                f"mAP@0.5 {self.mean_ap(0):.3f}  mAP@0.5:0.95 {self.mean_ap():.3f}")
+
+_EVAL_OPTIONS = {}
+
+def _init_eval_worker(options):
+    """评估子进程初始化：保存匹配参数"""
+    global _EVAL_OPTIONS
+    _init_pool_worker()
+    _EVAL_OPTIONS = options
+
+def _evaluate_prediction_files(items):
+    """评估一组图像（供进程池调用），items 为 [(图像下标, 真值标签路径, 预测标签路径)]"""
+    opts = _EVAL_OPTIONS
+    rows, pred_classes, scores, tps, gt_classes = [], [], [], [], []
+    for index, gt_path, pred_path in items:
+        try:
+            gt = parse_yolo_annotations(gt_path)
+            pred, conf = parse_predictions(pred_path)
+        except (OSError, UnicodeDecodeError):
+            continue
+        keep, match, missed = compare_predictions(gt, pred, conf, opts['iou_threshold'],
+                                                  opts['conf_threshold'], opts['method'])
+        tp = int((match >= 0).sum())
+        rows.append((index, len(gt), len(pred), tp, len(keep) - tp, int(missed.sum())))
+        # mAP 使用全部预测，按置信度贪心匹配
+        pred_classes.append(annotation_boxes(pred)[0])
+        scores.append(conf)
+        tps.append(match_predictions(gt, pred, conf, IOU_THRESHOLDS) >= 0)
+        gt_classes.append(annotation_boxes(gt)[0])
+    empty = np.zeros(0, np.int64)
+    return (len(items), rows,
+            np.concatenate(pred_classes) if pred_classes else empty,
+            np.concatenate(scores) if scores else np.zeros(0, np.float32),
+            np.concatenate(tps, axis=1) if tps else np.zeros((len(IOU_THRESHOLDS), 0), bool),
+            np.concatenate(gt_classes) if gt_classes else empty)
+
+def run_prediction_evaluation(image_paths, label_folder, pred_folder, image_root=None, iou_threshold=0.5,
+                              conf_threshold=0.25, method='greedy', workers=None, progress=None,
+                              cancel_event=None):
+    """多进程评估整个数据集的预测，返回 PredictionReport
+
+    真值与预测按相同的相对路径查找（label_key）；progress(已评估, 总数) 汇报进度。
+    """
+    items = [(i, str(label_path_for(label_folder, key)), str(label_path_for(pred_folder, key)))
+             for i, key in enumerate(label_key(p, image_root) for p in image_paths)]
+    chunk = 256
+    chunks = [items[k:k + chunk] for k in range(0, len(items), chunk)]
+    options = {'iou_threshold': iou_threshold, 'conf_threshold': conf_threshold, 'method': method}
+    report = PredictionReport(len(items), iou_threshold, conf_threshold, method)
+    workers = workers or max(1, (multiprocessing.cpu_count() or 2) - 1)
+    done = 0
+
+    def consume(results):
+        nonlocal done
+        for count, rows, pred_classes, scores, tp, gt_classes in results:
+            done += count
+            report.add(rows, pred_classes, scores, tp, gt_classes)
+            if progress:
+                progress(done, len(items))
+            if cancel_event is not None and cancel_event.is_set():
+                return False
+        return True
+
+    if len(chunks) > 1 and workers > 1:
+        with multiprocessing.Pool(workers, initializer=_init_eval_worker, initargs=(options,)) as pool:
+            if not consume(pool.imap_unordered(_evaluate_prediction_files, chunks)):
+                pool.terminate()
+    else:
+        _init_eval_worker(options)
+        consume(map(_evaluate_prediction_files, chunks))
+    return report.finish()
+
+# ---------------- 重复图像检测 ----------------
+
+HASH_VERSION = 1
+_POPCOUNT8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+def popcount64(values):
+    """uint64 数组逐元素统计 1 的个数"""
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values).astype(np.int64)
+    return _POPCOUNT8[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1, dtype=np.int64)
+
+def _pack_bits(bits):
+    """64 个布尔值打包为一个 uint64（高位在前）"""
+    return int(np.packbits(bits.ravel()).view('>u8')[0])
+
+def dhash(gray):
+    """差值哈希：缩放到 9×8，比较水平相邻像素"""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    return _pack_bits(small[:, 1:] > small[:, :-1])
+
+def phash(gray):
+    """感知哈希：缩放到 32×32 做 DCT，取左上 8×8 低频与中位数比较"""
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].ravel()
+    return _pack_bits(low > np.median(low[1:]))
+
+def image_hash(image_path, method='dhash'):
+    """读取图像（缩小解码为灰度）并计算 64 位感知哈希，失败返回 None"""
+    gray = cv2_imread_unicode(image_path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if gray is None or gray.size == 0:
+        return None
+    return dhash(gray) if method == 'dhash' else phash(gray)
+
+def _hash_image_files(items):
+    """批量计算哈希（供进程池调用），items 为 [(路径, 方法)]"""
+    return [image_hash(path, method) for path, method in items]
+
+class ImageHashCache:
+    """图像哈希的磁盘缓存：按路径、大小和 mtime 校验，保存为 npz
+
+    每个图像文件夹一个缓存文件，位于 ~/.cache/yolo-dataset-vis/hashes。
+    """
+    def __init__(self, folder, method='dhash'):
+        digest = hashlib.md5(f"{os.path.abspath(folder)}|{method}".encode('utf-8')).hexdigest()[:16]
+        self.path = Path.home() / '.cache' / 'yolo-dataset-vis' / 'hashes' / f'{digest}.npz'
+        self.method = method
+        self.entries = {}   # 路径 -> (size, mtime_ns, hash)
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                if int(data['version']) == HASH_VERSION:
+                    self.entries = dict(zip(data['paths'].tolist(),
+                                            zip(data['sizes'].tolist(), data['mtimes'].tolist(),
+                                                data['hashes'].tolist())))
+        except (OSError, KeyError, ValueError):
+            pass
+
+    def save(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            paths = list(self.entries)
+            values = list(self.entries.values())
+            tmp_path = self.path.with_name(f'{self.path.stem}.{os.getpid()}.tmp.npz')
+            np.savez(tmp_path, version=HASH_VERSION, paths=np.array(paths, dtype=str),
+                     sizes=np.array([v[0] for v in values], dtype=np.int64),
+                     mtimes=np.array([v[1] for v in values], dtype=np.int64),
+                     hashes=np.array([v[2] for v in values], dtype=np.uint64))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"写入哈希缓存失败: {self.path}, 错误: {str(e)}")
+
+def compute_image_hashes(image_paths, folder, method='dhash', workers=None, progress=None, cancel_event=None):
+    """多进程计算全部图像的感知哈希（未变化的图像取自缓存）
+
+    返回 (哈希 uint64 数组, 是否有效的布尔数组)；progress(已完成, 待计算总数) 汇报进度。
+    """
+    cache = ImageHashCache(folder, method)
+    hashes = np.zeros(len(image_paths), dtype=np.uint64)
+    valid = np.zeros(len(image_paths), dtype=bool)
+    todo, stats = [], {}
+    for i, path in enumerate(image_paths):
+        key = str(path)
+        try:
+            st = dataset_stat(path)
+        except OSError:
+            continue
+        stats[i] = (st.st_size, st.st_mtime_ns)
+        cached = cache.entries.get(key)
+        if cached is not None and cached[:2] == stats[i]:
+            hashes[i], valid[i] = cached[2], True
+        else:
+            todo.append(i)
+    chunk = 64
+    chunks = [[(str(image_paths[i]), method) for i in todo[k:k + chunk]] for k in range(0, len(todo), chunk)]
+    workers = workers or max(1, (multiprocessing.cpu_count() or 2) - 1)
+
+    def consume(results):
+        for k, values in enumerate(results):
+            for i, value in zip(todo[k * chunk:(k + 1) * chunk], values):
+                if value is not None:
+                    hashes[i], valid[i] = value, True
+                    cache.entries[str(image_paths[i])] = stats[i] + (value,)
+            if progress:
+                progress(min((k + 1) * chunk, len(todo)), len(todo))
+            if cancel_event is not None and cancel_event.is_set():
+                return False
+        return True
+
+    if len(chunks) > 1 and workers > 1:
+        with multiprocessing.Pool(workers, initializer=_init_pool_worker) as pool:
+            if not consume(pool.imap(_hash_image_files, chunks)):
+                pool.terminate()
+    else:
+        consume(map(_hash_image_files, chunks))
+    if todo:
+        cache.save()
+    return hashes, valid
+
+def find_hash_pairs(hashes, max_distance=4):
+    """多索引哈希（multi-index hashing）查找汉明距离不超过 max_distance 的哈希对
+
+    把 64 位哈希切成 max_distance+1 段，由抽屉原理，距离不超过阈值的两个哈希至少有一段完全相同；
+    每段排序后只比较该段相同的候选对，避免 O(n²) 全量比较。某段相同的候选对若在更早的段中也相同，
+    则已在那一段处理过，直接跳过，每对只输出一次。哈希应事先去重（见 find_duplicate_clusters）。
+    返回 (i, j, 距离) 三个数组，i < j。
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    n = len(hashes)
+    segments = max_distance + 1
+    bounds = np.linspace(0, 64, segments + 1).astype(np.int64)
+    keys = np.stack([(hashes >> np.uint64(bounds[s])) & np.uint64((1 << int(bounds[s + 1] - bounds[s])) - 1)
+                     for s in range(segments)]) if n else np.zeros((segments, 0), dtype=np.uint64)
+    found_i, found_j = [], []
+    block = 2048
+    for s in range(segments):
+        order = np.argsort(keys[s], kind='stable')
+        sorted_keys = keys[s][order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        sizes = np.diff(np.r_[starts, n])
+        for start, size in zip(starts[sizes > 1], sizes[sizes > 1]):
+            members = order[start:start + size]
+            # 同一段相同的桶可能很大（如大量纯色图），分块计算距离
+            for b0 in range(0, size, block):
+                rows = members[b0:b0 + block]
+                hit = (popcount64(hashes[rows, None] ^ hashes[None, members]) <= max_distance)
+                hit &= rows[:, None] < members[None, :]
+                for t in range(s):
+                    hit &= keys[t][rows, None] != keys[t][None, members]
+                r, c = np.nonzero(hit)
+                found_i.append(rows[r])
+                found_j.append(members[c])
+    if not found_i:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    i, j = np.concatenate(found_i), np.concatenate(found_j)
+    return i, j, popcount64(hashes[i] ^ hashes[j])
+
+def find_duplicate_clusters(hashes, max_distance=4, groups=None):
+    """查找近似重复的图像组，返回 [下标数组]（按组大小降序）
+
+    完全相同的哈希先合并（视频抽帧、固定机位的数据集中可能有上万张相同的图像），
+    只对不同的哈希值做多索引查找，成组后再按哈希值展开为图像下标，不生成组内的两两配对。
+    groups 给出每个哈希所属的集合时只保留跨集合的重复（用于两个文件夹之间比较）。
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    unique, inverse, counts = np.unique(hashes, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+    i, j, _ = find_hash_pairs(unique, max_distance)
+    if groups is None:
+        selves = np.flatnonzero(counts > 1)
+    else:
+        # 每个哈希值包含的集合范围；两个哈希值都只属于同一个集合时不构成跨集合重复
+        groups = np.asarray(groups, dtype=np.int64)
+        gmin = np.full(len(unique), np.iinfo(np.int64).max)
+        gmax = np.full(len(unique), np.iinfo(np.int64).min)
+        np.minimum.at(gmin, inverse, groups)
+        np.maximum.at(gmax, inverse, groups)
+        single = gmin == gmax
+        cross = ~(single[i] & single[j] & (gmin[i] == gmin[j]))
+        i, j = i[cross], j[cross]
+        selves = np.flatnonzero(~single)
+    # 自身成对 (u, u) 让单独一个哈希值的重复组也进入并查集
+    i, j = np.concatenate([i, selves]), np.concatenate([j, selves])
+    order = np.argsort(inverse, kind='stable')
+    starts = np.r_[0, np.cumsum(counts)]
+    clusters = [np.sort(np.concatenate([order[starts[u]:starts[u + 1]] for u in members]))
+                for members in cluster_pairs(len(unique), i, j)]
+    clusters.sort(key=lambda members: (-len(members), members[0]))
+    return clusters
+
+def cluster_pairs(n, i, j):
+    """并查集把哈希对合并为重复组，返回 [下标数组]（按组大小降序）"""
+    parent = np.arange(n)
+
+    def find(x):
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    for a, b in zip(i.tolist(), j.tolist()):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    involved = np.unique(np.concatenate([i, j])) if len(i) else np.zeros(0, dtype=np.int64)
+    roots = np.array([find(x) for x in involved.tolist()], dtype=np.int64)
+    # 按根排序后在边界处切分（involved 已升序，稳定排序保持组内升序）
+    order = np.argsort(roots, kind='stable')
+    _, starts = np.unique(roots[order], return_index=True)
+    clusters = np.split(involved[order], starts[1:]) if len(order) else []
+    clusters.sort(key=lambda members: (-len(members), members[0]))
+    return clusters
+
+# ---------------- 数据集统计 ----------------
+
+class DatasetStats:
+    """可增量合并的数据集统计（固定分箱，按批累加）"""
+    SIZE_BINS = np.linspace(0.0, 1.0, 51)               # 归一化宽/高
+    ASPECT_BINS = np.logspace(-4, 4, 49, base=2.0)      # 宽高比 1/16 ~ 16
+    MAX_OBJECTS = 100                                   # 每图目标数，最后一格为 100+
+    MAX_VERTICES = 200                                  # 多边形顶点数，最后一格为 200+
+
+    def __init__(self):
+        self.num_files = 0
+        self.num_boxes = 0
+        self.num_segments = 0
+        self.class_instances = np.zeros(0, np.int64)
+        self.class_images = np.zeros(0, np.int64)
+        self.width_hist = np.zeros(len(self.SIZE_BINS) - 1, np.int64)
+        self.height_hist = np.zeros(len(self.SIZE_BINS) - 1, np.int64)
+        self.aspect_hist = np.zeros(len(self.ASPECT_BINS) - 1, np.int64)
+        self.objects_hist = np.zeros(self.MAX_OBJECTS + 1, np.int64)
+        self.vertex_hist = np.zeros(self.MAX_VERTICES + 1, np.int64)
+
+    @staticmethod
+    def _add_counts(total, counts):
+        if len(counts) > len(total):
+            total = np.concatenate([total, np.zeros(len(counts) - len(total), np.int64)])
+        total[:len(counts)] += counts
+        return total
+
+    def add(self, annotations, box_counts, seg_counts):
+        """累加一批文件：annotations 为拼接后的标注，box_counts/seg_counts 为每个文件的数量"""
+        n = len(box_counts)
+        self.num_files += n
+        self.num_boxes += annotations.num_boxes
+        self.num_segments += annotations.num_segments
+        classes = np.concatenate([annotations.box_classes, annotations.seg_classes]).astype(np.int64)
+        file_ids = np.concatenate([np.repeat(np.arange(n), box_counts), np.repeat(np.arange(n), seg_counts)])
+        valid = classes >= 0
+        classes, file_ids = classes[valid], file_ids[valid]
+        if len(classes):
+            self.class_instances = self._add_counts(self.class_instances, np.bincount(classes))
+            k = int(classes.max()) + 1
+            pairs = np.unique(file_ids * k + classes)
+            self.class_images = self._add_counts(self.class_images, np.bincount(pairs % k, minlength=k))
+        boxes = annotations.boxes
+        if len(boxes):
+            self.width_hist += np.histogram(np.clip(boxes[:, 2], 0, 1), self.SIZE_BINS)[0]
+            self.height_hist += np.histogram(np.clip(boxes[:, 3], 0, 1), self.SIZE_BINS)[0]
+            ok = (boxes[:, 2] > 0) & (boxes[:, 3] > 0)
+            aspect = np.clip(boxes[ok, 2] / boxes[ok, 3], self.ASPECT_BINS[0], self.ASPECT_BINS[-1])
+            self.aspect_hist += np.histogram(aspect, self.ASPECT_BINS)[0]
+        objects = np.minimum(np.asarray(box_counts) + np.asarray(seg_counts), self.MAX_OBJECTS)
+        self.objects_hist += np.bincount(objects, minlength=self.MAX_OBJECTS + 1)
+        if annotations.num_segments:
+            vertices = np.minimum(annotations.seg_sizes, self.MAX_VERTICES)
+            self.vertex_hist += np.bincount(vertices, minlength=self.MAX_VERTICES + 1)
+
+    def copy(self):
+        other = DatasetStats()
+        for name, value in vars(self).items():
+            setattr(other, name, value.copy() if isinstance(value, np.ndarray) else value)
+        return other
+
+    def plot(self, fig, label_map, top_k=30):
+        """在 fig 上绘制 2x3 统计图"""
+        fig.clear()
+        axes = fig.subplots(2, 3)
+        fig.suptitle(f"标签文件: {self.num_files}  检测框: {self.num_boxes}  分割: {self.num_segments}")
+
+        def class_bar(ax, counts, title):
+            ids = np.flatnonzero(counts)
+            ids = ids[np.argsort(counts[ids])[::-1][:top_k]]
+            names = [str(label_map.get(int(i), i)) for i in ids]
+            ax.bar(range(len(ids)), counts[ids], color='tab:blue')
+            ax.set_xticks(range(len(ids)))
+            ax.set_xticklabels(names, rotation=60, fontsize=7)
+            ax.set_title(title)
+
+        class_bar(axes[0, 0], self.class_instances, "各类别实例数")
+        class_bar(axes[0, 1], self.class_images, "各类别图像数")
+        ax = axes[0, 2]
+        centers = (self.SIZE_BINS[:-1] + self.SIZE_BINS[1:]) / 2
+        ax.step(centers, self.width_hist, where='mid', label='宽')
+        ax.step(centers, self.height_hist, where='mid', label='高')
+        ax.set_title("检测框宽/高（归一化）")
+        ax.legend(fontsize=8)
+        ax = axes[1, 0]
+        ax.stairs(self.aspect_hist, self.ASPECT_BINS, fill=True)
+        ax.set_xscale('log', base=2)
+        ax.set_title("检测框宽高比")
+        ax = axes[1, 1]
+        ax.bar(np.arange(len(self.objects_hist)), self.objects_hist, width=1.0)
+        ax.set_title(f"每图目标数（{self.MAX_OBJECTS} 为 {self.MAX_OBJECTS}+）")
+        ax = axes[1, 2]
+        ax.bar(np.arange(len(self.vertex_hist)), self.vertex_hist, width=1.0, color='tab:green')
+        ax.set_title(f"多边形顶点数（{self.MAX_VERTICES} 为 {self.MAX_VERTICES}+）")
+        fig.tight_layout()
+
+# ---------------- 标注筛选 ----------------
+
+def read_image_size(path):
+    """只读取图像文件头获得 (宽, 高)，失败返回 (0, 0)"""
+    from PIL import Image
+    # 只读取文件头、不解码像素：关闭 PIL 的超大图像保护（航拍/卫星图常超过默认上限）
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        archive_path, _ = split_archive_path(path)
+        if archive_path is not None:
+            path = io.BytesIO(read_dataset_bytes(path))
+        with Image.open(path) as image:
+            return image.size
+    except Exception:
+        return (0, 0)
+
+class AnnotationQuery:
+    """基于标注索引对整个数据集求值的筛选表达式（全部为向量化运算）
+
+    表达式为 Python 语法子集：比较、and / or / not、括号和四则运算。每张图像可用的字段：
+      objects / boxes / segments              目标数 / 检测框数 / 多边形数
+      classes                                 不同类别数
+      min_w, min_h, max_w, max_h, min_area    目标外接框的归一化尺寸
+      min_w_px, min_h_px, min_side_px         目标外接框的像素尺寸（需要读取图像尺寸）
+      missing                                 没有标签文件
+      has(7, 8)  count(7)  cls == 7  cls in (1, 2)
+    例如: has(7) and objects > 50、min_side_px < 8
+    """
+    FIELDS = ('objects', 'boxes', 'segments', 'classes', 'min_w', 'min_h', 'max_w', 'max_h',
+              'min_area', 'min_w_px', 'min_h_px', 'min_side_px', 'missing')
+    PIXEL_FIELDS = ('min_w_px', 'min_h_px', 'min_side_px')
+    _COMPARE = {ast.Eq: np.equal, ast.NotEq: np.not_equal, ast.Lt: np.less,
+                ast.LtE: np.less_equal, ast.Gt: np.greater, ast.GtE: np.greater_equal}
+    _ARITH = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.true_divide}
+
+    def __init__(self, index):
+        self.index = index
+        self.num_files = nfiles = len(index)
+        ann = index.all
+        box_counts = np.diff(index.file_box_off)
+        seg_counts = np.diff(index.file_seg_off)
+        # 多边形外接框
+        seg_w = np.zeros(ann.num_segments, np.float32)
+        seg_h = np.zeros(ann.num_segments, np.float32)
+        sizes = ann.seg_sizes
+        nonempty = sizes > 0
+        if nonempty.any():
+            points = ann.seg_coords.reshape(-1, 2)
+            starts = ann.seg_offsets[:-1][nonempty]
+            for out, col in ((seg_w, 0), (seg_h, 1)):
+                values = points[:, col]
+                out[nonempty] = np.maximum.reduceat(values, starts) - np.minimum.reduceat(values, starts)
+        files = np.arange(nfiles)
+        obj_file = np.concatenate([np.repeat(files, box_counts), np.repeat(files, seg_counts)])
+        # 按文件排序，之后每个文件的目标连续存放，可用 reduceat 按文件归约
+        order = np.argsort(obj_file, kind='stable')
+        self.obj_file = obj_file[order]
+        self.obj_class = np.concatenate([ann.box_classes, ann.seg_classes])[order]
+        self.obj_w = np.concatenate([ann.boxes[:, 2], seg_w])[order]
+        self.obj_h = np.concatenate([ann.boxes[:, 3], seg_h])[order]
+        self.box_counts = box_counts
+        self.seg_counts = seg_counts
+        self.obj_counts = box_counts + seg_counts
+        self.obj_off = np.concatenate([[0], np.cumsum(self.obj_counts)])
+        self._file_cache = {}
+
+    @classmethod
+    def parse(cls, expression):
+        """解析表达式，返回语法树；语法错误或使用未知字段时抛出 ValueError"""
+        try:
+            tree = ast.parse(expression.strip(), mode='eval')
+        except SyntaxError as e:
+            raise ValueError(f"表达式语法错误: {e.msg}")
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name) and node.id not in cls.FIELDS + ('cls', 'has', 'count'):
+                raise ValueError(f"未知字段: {node.id}")
+        return tree
+
+    @classmethod
+    def needs_sizes(cls, tree):
+        """表达式是否用到像素尺寸字段"""
+        return any(isinstance(node, ast.Name) and node.id in cls.PIXEL_FIELDS for node in ast.walk(tree))
+
+    def rows_for(self, image_list, image_root=None):
+        """图像下标 -> 索引文件行号（无标签文件为 -1）"""
+        stem_to_row = self.index.stem_to_row
+        return np.fromiter((stem_to_row.get(label_key(p, image_root), -1) for p in image_list),
+                           dtype=np.int64, count=len(image_list))
+
+    def evaluate(self, tree, rows, sizes=None):
+        """对每张图像求值，返回符合条件的图像下标
+
+        rows 为 rows_for 的结果；sizes 为 (N, 2) 的图像宽高，像素字段需要。
+        """
+        if isinstance(tree, str):
+            tree = self.parse(tree)
+        ctx = {'rows': rows, 'valid': rows >= 0, 'sizes': sizes, 'cache': {}}
+        result = self._eval(tree.body, ctx)
+        mask = np.broadcast_to(np.asarray(result, dtype=bool), rows.shape)
+        return np.flatnonzero(mask)
+
+    def _per_file_reduce(self, ufunc, values, empty):
+        """按文件归约每个目标的值，没有目标的文件取 empty"""
+        out = np.full(self.num_files, empty, dtype=np.float64)
+        has_objects = self.obj_counts > 0
+        if has_objects.any():
+            out[has_objects] = ufunc.reduceat(values, self.obj_off[:-1][has_objects])
+        return out
+
+    def _file_field(self, name, ctx):
+        """文件级字段（长度为文件数）"""
+        if name in self.PIXEL_FIELDS:
+            cache = ctx['cache']
+        else:
+            cache = self._file_cache
+        if name in cache:
+            return cache[name]
+        if name == 'objects':
+            value = self.obj_counts
+        elif name == 'boxes':
+            value = self.box_counts
+        elif name == 'segments':
+            value = self.seg_counts
+        elif name == 'classes':
+            pairs = np.unique(self.obj_file.astype(np.int64) * (int(self.obj_class.max(initial=0)) + 1)
+                              + self.obj_class)
+            value = np.bincount(pairs // (int(self.obj_class.max(initial=0)) + 1), minlength=self.num_files)
+        elif name in ('min_w', 'min_h'):
+            value = self._per_file_reduce(np.minimum, self.obj_w if name == 'min_w' else self.obj_h, np.inf)
+        elif name in ('max_w', 'max_h'):
+            value = self._per_file_reduce(np.maximum, self.obj_w if name == 'max_w' else self.obj_h, 0.0)
+        elif name == 'min_area':
+            value = self._per_file_reduce(np.minimum, self.obj_w * self.obj_h, np.inf)
+        else:
+            sizes = ctx['sizes']
+            if sizes is None:
+                raise ValueError(f"字段 {name} 需要图像尺寸")
+            rows, valid = ctx['rows'], ctx['valid']
+            file_w = np.zeros(self.num_files, np.float64)
+            file_h = np.zeros(self.num_files, np.float64)
+            file_w[rows[valid]] = sizes[valid, 0]
+            file_h[rows[valid]] = sizes[valid, 1]
+            px_w = self.obj_w * file_w[self.obj_file]
+            px_h = self.obj_h * file_h[self.obj_file]
+            if name == 'min_w_px':
+                value = self._per_file_reduce(np.minimum, px_w, np.inf)
+            elif name == 'min_h_px':
+                value = self._per_file_reduce(np.minimum, px_h, np.inf)
+            else:
+                value = self._per_file_reduce(np.minimum, np.minimum(px_w, px_h), np.inf)
+        cache[name] = value
+        return value
+
+    def _per_image(self, file_values, ctx, default=0):
+        """文件级数组映射为图像级数组"""
+        rows, valid = ctx['rows'], ctx['valid']
+        out = np.full(len(rows), default, dtype=np.asarray(file_values).dtype)
+        out[valid] = file_values[rows[valid]]
+        return out
+
+    def _class_counts(self, classes):
+        mask = np.isin(self.obj_class, classes)
+        return np.bincount(self.obj_file[mask], minlength=self.num_files)
+
+    def _constant(self, node):
+        value = ast.literal_eval(node)
+        if isinstance(value, bool) or not isinstance(value, (int, float, tuple, list)):
+            raise ValueError(f"不支持的常量: {ast.unparse(node)}")
+        return value
+
+    def _eval(self, node, ctx):
+        if isinstance(node, ast.BoolOp):
+            values = [np.asarray(self._eval(v, ctx), dtype=bool) for v in node.values]
+            op = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            return functools.reduce(op, values)
+        if isinstance(node, ast.UnaryOp):
+            value = self._eval(node.operand, ctx)
+            if isinstance(node.op, ast.Not):
+                return ~np.asarray(value, dtype=bool)
+            if isinstance(node.op, ast.USub):
+                return -value
+        if isinstance(node, ast.BinOp) and type(node.op) in self._ARITH:
+            return self._ARITH[type(node.op)](self._eval(node.left, ctx), self._eval(node.right, ctx))
+        if isinstance(node, ast.Compare):
+            return self._compare(node, ctx)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in ('has', 'count'):
+            if not node.args or node.keywords:
+                raise ValueError(f"{node.func.id}() 需要类别 ID 参数")
+            counts = self._per_image(self._class_counts([int(self._constant(a)) for a in node.args]), ctx)
+            return counts > 0 if node.func.id == 'has' else counts
+        if isinstance(node, ast.Name) and node.id not in ('cls', 'has', 'count'):
+            if node.id == 'missing':
+                return ~ctx['valid']
+            default = np.inf if node.id.startswith('min_') else 0
+            return self._per_image(self._file_field(node.id, ctx), ctx, default)
+        if isinstance(node, ast.Constant):
+            return self._constant(node)
+        raise ValueError(f"不支持的表达式: {ast.unparse(node)}")
+
+    def _compare(self, node, ctx):
+        left_node = node.left
+        result = None
+        for op, right_node in zip(node.ops, node.comparators):
+            if isinstance(left_node, ast.Name) and left_node.id == 'cls':
+                # cls == 7 / cls in (1, 2)：图像中包含该类别
+                classes = self._constant(right_node)
+                classes = list(classes) if isinstance(classes, (tuple, list)) else [classes]
+                value = self._per_image(self._class_counts([int(c) for c in classes]), ctx) > 0
+                if isinstance(op, (ast.NotEq, ast.NotIn)):
+                    value = ~value
+                elif not isinstance(op, (ast.Eq, ast.In)):
+                    raise ValueError("cls 只支持 ==、!=、in、not in")
+            elif type(op) in self._COMPARE:
+                value = self._COMPARE[type(op)](self._eval(left_node, ctx), self._eval(right_node, ctx))
+            else:
+                raise ValueError(f"不支持的比较: {ast.unparse(node)}")
+            result = value if result is None else np.logical_and(result, value)
+            left_node = right_node
+        return result
+
+# ---------------- 图像缓存 ----------------
+
+def make_display_copy(image, max_side):
+    """生成显示分辨率副本；图像本身不超过 max_side 时直接返回原图"""
+    h, w = image.shape[:2]
+    if max(h, w) <= max_side:
+        return image
+    scale = max_side / max(h, w)
+    return cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))),
+                      interpolation=cv2.INTER_AREA)
+
+def decode_for_cache(file_path, max_side, rgb=False):
+    """解码图像并生成显示副本（供后台线程调用），返回 (原图, 显示副本)
+
+    rgb=True 时在后台线程中原地转换为 RGB，界面显示时不必每帧再转换。
+    """
+    image = cv2_imread_unicode(file_path)
+    if image is None:
+        return None, None
+    if rgb:
+        with PROFILER.stage('cvtColor'):
+            cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+    with PROFILER.stage('resize'):
+        display = make_display_copy(image, max_side)
+    return image, display
+
+# 缩小解码标志：JPEG 在解码阶段直接按 1/2、1/4、1/8 降采样
+REDUCED_READ_FLAGS = {
+    1: 'IMREAD_COLOR',
+    2: 'IMREAD_REDUCED_COLOR_2',
+    4: 'IMREAD_REDUCED_COLOR_4',
+    8: 'IMREAD_REDUCED_COLOR_8',
+}
+
+def choose_reduction(full_side, target_side):
+    """根据原图与画布尺寸选择缩小解码倍数（1/2/4/8），保证结果不小于画布"""
+    if not full_side or not target_side:
+        return 1
+    for factor in (8, 4, 2):
+        if full_side / factor >= target_side:
+            return factor
+    return 1
+
+def decode_preview(file_path, factor, rgb=False):
+    """缩小解码预览图，返回 (预览图, 估计的原图尺寸 (h, w))"""
+    image = cv2_imread_unicode(file_path, getattr(cv2, REDUCED_READ_FLAGS[factor]))
+    if image is None:
+        return None, None
+    if rgb:
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+    h, w = image.shape[:2]
+    return image, (h * factor, w * factor)
+
+class ImageCache:
+    """按字节预算限制的多分辨率图像缓存
+
+    每张图像保存原图和显示分辨率副本两级，超出预算时先按 LRU 淘汰原图，
+    其次淘汰拖动预览用的缩小解码图，最后淘汰显示副本。
+    小图的显示副本与原图为同一数组，只计一次。
+    界面中的缓存保存 RGB 图像（解码时在后台线程转换）。
+    """
+    def __init__(self, max_bytes=1024 * 1024 * 1024, display_max_side=2048):
+        self.max_bytes = max_bytes
+        self.display_max_side = display_max_side
+        self.full = OrderedDict()      # key -> 原图
+        self.display = OrderedDict()   # key -> (显示副本, 原图尺寸 (h, w))
+        self.preview = OrderedDict()   # key -> (缩小解码预览图, 估计原图尺寸 (h, w))
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        return key in self.display or key in self.full
+
+    def __len__(self):
+        return len(self.display.keys() | self.full.keys())
+
+    def get_full(self, key):
+        """获取原图，未命中返回 None"""
+        if key in self.full:
+            self.full.move_to_end(key)
+            self.hits += 1
+            return self.full[key]
+        entry = self.display.get(key)
+        if entry is not None and entry[0].shape[:2] == entry[1]:
+            self.display.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        return None
+
+    def get_display(self, key):
+        """获取 (显示副本, 原图尺寸)，必要时由缓存的原图生成，未命中返回 None"""
+        entry = self.display.get(key)
+        if entry is not None:
+            self.display.move_to_end(key)
+            self.hits += 1
+            return entry
+        if key in self.full:
+            self.hits += 1
+            return self.put(key, self.full[key])
+        self.misses += 1
+        return None
+
+    def get_preview(self, key):
+        """获取拖动预览用图像：优先显示副本，其次缩小解码图，未命中返回 None"""
+        entry = self.display.get(key)
+        if entry is None:
+            entry = self.preview.get(key)
+            if entry is not None:
+                self.preview.move_to_end(key)
+        else:
+            self.display.move_to_end(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put_preview(self, key, image, full_shape):
+        """写入缩小解码预览图（已有显示副本时忽略）"""
+        if key in self.display:
+            return
+        old = self.preview.pop(key, None)
+        if old is not None:
+            self.nbytes -= old[0].nbytes
+        self.preview[key] = (image, full_shape)
+        self.nbytes += image.nbytes
+        self._evict()
+
+    def put(self, key, image, display=None, full_shape=None):
+        """写入原图（及可选的显示副本），返回显示条目
+
+        瓦片显示的超大图像不缓存原图：image 为 None，full_shape 给出原图尺寸 (h, w)。
+        """
+        self.discard(key)
+        if display is None:
+            display = make_display_copy(image, self.display_max_side)
+        entry = (display, tuple(full_shape or image.shape[:2]))
+        self.display[key] = entry
+        self.nbytes += display.nbytes
+        if image is not None and display is not image:
+            self.full[key] = image
+            self.nbytes += image.nbytes
+        self._evict()
+        return entry
+
+    def discard(self, key):
+        """移除某张图像的全部缓存"""
+        image = self.full.pop(key, None)
+        if image is not None:
+            self.nbytes -= image.nbytes
+        entry = self.display.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[0].nbytes
+        entry = self.preview.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[0].nbytes
+
+    def clear(self):
+        self.full.clear()
+        self.display.clear()
+        self.preview.clear()
+        self.nbytes = 0
+
+    def _evict(self):
+        # 原图先于任何显示副本淘汰；最近写入的显示副本始终保留
+        while self.nbytes > self.max_bytes and self.full:
+            _, image = self.full.popitem(last=False)
+            self.nbytes -= image.nbytes
+            self.evictions += 1
+        while self.nbytes > self.max_bytes and self.preview:
+            _, (image, _) = self.preview.popitem(last=False)
+            self.nbytes -= image.nbytes
+            self.evictions += 1
+        while self.nbytes > self.max_bytes and len(self.display) > 1:
+            key, (display, _) = self.display.popitem(last=False)
+            self.nbytes -= display.nbytes
+            image = self.full.pop(key, None)
+            if image is not None:
+                self.nbytes -= image.nbytes
+            self.evictions += 1
+
+    def stats_text(self):
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return (f"缓存: {self.nbytes / 2**20:.0f}/{self.max_bytes / 2**20:.0f}MB "
+                f"(原图 {len(self.full)}, 显示 {len(self.display)}, 预览 {len(self.preview)})\n"
+                f"命中: {self.hits}, 未命中: {self.misses} ({rate:.0f}%), 淘汰: {self.evictions}")
+
+# ---------------- 瓦片金字塔 ----------------
+
+TILE_SIZE = 512
+TILE_MIN_SIDE = 8192         # 长边不小于该值的图像使用瓦片金字塔显示
+TILE_VERSION = 1
+TILE_CACHE_BYTES = 10 * 1024 ** 3   # 瓦片缓存总大小上限，超出时按最近使用时间清理
+LOSSLESS_SUFFIXES = {'.png', '.bmp', '.tif', '.tiff'}
+
+class TilePyramid:
+    """超大图像的磁盘瓦片金字塔
+
+    第 0 层为原图，之后每层长宽减半，直到整层不超过一个瓦片。各层按 TILE_SIZE 切块编码
+    （有损源图用 JPEG，无损源图用 PNG），依次写入 tiles.bin，偏移与各层尺寸记录在 tiles.json。
+    缓存目录为 ~/.cache/yolo-dataset-vis/tiles，按图像路径、大小和 mtime 生成键，源图变化后自动重建；
+    每次生成后清理源图已变化或已删除的旧金字塔，并把总大小限制在 TILE_CACHE_BYTES 以内（按最近打开时间）。
+    只生成一次；之后显示时按视野读取并解码所需瓦片（mmap），不再解码整张原图。
+    """
+    def __init__(self, folder, manifest):
+        self.folder = Path(folder)
+        self.key = self.folder.name
+        self.tile_size = manifest['tile_size']
+        self.levels = [tuple(size) for size in manifest['levels']]   # [(宽, 高)]
+        self.offsets = np.asarray(manifest['offsets'], dtype=np.int64)
+        self.level_starts = np.concatenate([[0], np.cumsum([self.grid(i)[0] * self.grid(i)[1]
+                                                            for i in range(len(self.levels))])])
+        with open(self.folder / 'tiles.bin', 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def cache_root(root=None):
+        return Path(root) if root else Path.home() / '.cache' / 'yolo-dataset-vis' / 'tiles'
+
+    @staticmethod
+    def cache_dir(image_path, root=None, tile_size=TILE_SIZE):
+        """金字塔缓存目录；图像不存在时返回 None"""
+        try:
+            st = dataset_stat(image_path)
+        except OSError:
+            return None
+        root = TilePyramid.cache_root(root)
+        text = f"{TILE_VERSION}|{tile_size}|{os.path.abspath(image_path)}|{st.st_mtime_ns}|{st.st_size}"
+        return root / hashlib.md5(text.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def open(cls, image_path, root=None):
+        """打开已生成的金字塔，不存在或已失效时返回 None"""
+        folder = cls.cache_dir(image_path, root)
+        if folder is None:
+            return None
+        try:
+            with open(folder / 'tiles.json', 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') != TILE_VERSION:
+                return None
+            pyramid = cls(folder, manifest)
+        except (OSError, ValueError, KeyError):
+            return None
+        try:
+            os.utime(folder / 'tiles.json')   # 记录最近使用时间，供 prune 按 LRU 清理
+        except OSError:
+            pass
+        return pyramid
+
+    @classmethod
+    def prune(cls, root=None, max_bytes=TILE_CACHE_BYTES, keep=None):
+        """删除源图已变化或已删除的金字塔，并按最近使用时间删除最旧的金字塔，直到总大小不超过 max_bytes
+
+        keep 为刚生成、不应删除的缓存目录；返回删除的目录数。
+        """
+        entries, removed = [], 0
+        try:
+            folders = [f for f in cls.cache_root(root).iterdir() if f.is_dir() and not f.name.endswith('.tmp')]
+        except OSError:
+            return 0
+        for folder in folders:
+            if keep is not None and folder == Path(keep):
+                continue
+            try:
+                with open(folder / 'tiles.json', 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                stale = cls.cache_dir(manifest['source'], root, manifest['tile_size']) != folder
+                used = (folder / 'tiles.json').stat().st_mtime
+                size = sum(p.stat().st_size for p in folder.iterdir())
+            except (OSError, ValueError, KeyError, TypeError):
+                stale, used, size = True, 0, 0   # 不完整的缓存目录
+            if stale:
+                shutil.rmtree(folder, ignore_errors=True)
+                removed += 1
+            else:
+                entries.append((used, size, folder))
+        total = sum(size for _, size, _ in entries)
+        if keep is not None:
+            total += sum(p.stat().st_size for p in Path(keep).iterdir() if p.is_file())
+        for _, size, folder in sorted(entries, key=lambda e: e[0]):
+            if total <= max_bytes:
+                break
+            shutil.rmtree(folder, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+    @classmethod
+    def build(cls, image_path, root=None, tile_size=TILE_SIZE, workers=None):
+        """解码原图并生成金字塔（耗时较长，供后台线程调用），读取失败返回 None"""
+        folder = cls.cache_dir(image_path, root, tile_size)
+        if folder is None:
+            return None
+        with PROFILER.stage('tile_build'):
+            image = cv2_imread_unicode(image_path)
+            if image is None:
+                return None
+            if Path(split_archive_path(image_path)[1] or image_path).suffix.lower() in LOSSLESS_SUFFIXES:
+                ext, params = '.png', [cv2.IMWRITE_PNG_COMPRESSION, 1]
+            else:
+                ext, params = '.jpg', [cv2.IMWRITE_JPEG_QUALITY, 90]
+
+            def encode(tile):
+                ok, buf = cv2.imencode(ext, tile, params)
+                if not ok:
+                    raise OSError(f"瓦片编码失败: {image_path}")
+                return buf
+
+            tmp = folder.with_name(f"{folder.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.mkdir(parents=True, exist_ok=True)
+            levels, offsets = [], [0]
+            try:
+                with open(tmp / 'tiles.bin', 'wb') as f, \
+                        ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 2)) as executor:
+                    level = image
+                    while True:
+                        h, w = level.shape[:2]
+                        levels.append((w, h))
+                        tiles = (level[y:y + tile_size, x:x + tile_size]
+                                 for y in range(0, h, tile_size) for x in range(0, w, tile_size))
+                        # cv2.imencode 释放 GIL，多线程并行编码，按顺序写入
+                        for buf in executor.map(encode, tiles):
+                            f.write(buf.tobytes())
+                            offsets.append(offsets[-1] + len(buf))
+                        if max(w, h) <= tile_size:
+                            break
+                        level = cv2.resize(level, ((w + 1) // 2, (h + 1) // 2), interpolation=cv2.INTER_AREA)
+                del image, level
+                manifest = {'version': TILE_VERSION, 'source': os.path.abspath(image_path), 'tile_size': tile_size,
+                            'ext': ext, 'levels': levels, 'offsets': offsets}
+                with open(tmp / 'tiles.json', 'w', encoding='utf-8') as f:
+                    json.dump(manifest, f, ensure_ascii=False)
+                try:
+                    os.replace(tmp, folder)
+                except OSError:
+                    pass   # 其他线程已生成同一金字塔
+            finally:
+                shutil.rmtree(tmp, ignore_errors=True)
+        try:
+            cls.prune(root, keep=folder)
+        except OSError as e:
+            print(f"清理瓦片缓存失败: {str(e)}")
+        return cls.open(image_path, root)
+
+    @property
+    def full_shape(self):
+        """原图尺寸 (h, w)"""
+        w, h = self.levels[0]
+        return h, w
+
+    def grid(self, level):
+        """第 level 层的瓦片列数、行数"""
+        w, h = self.levels[level]
+        return -(-w // self.tile_size), -(-h // self.tile_size)
+
+    def overview_level(self, max_side):
+        """不超过 max_side 的最精细层（作为整图显示副本）"""
+        for level, (w, h) in enumerate(self.levels):
+            if max(w, h) <= max_side:
+                return level
+        return len(self.levels) - 1
+
+    def level_for(self, scale, max_level):
+        """每个屏幕像素对应 scale 个原图像素时，选择分辨率不低于屏幕的最粗层（不超过 max_level）"""
+        if scale <= 1:
+            return 0
+        return max(0, min(max_level, int(np.floor(np.log2(scale)))))
+
+    def tile_range(self, level, x0, y0, x1, y1):
+        """原图像素矩形覆盖的第 level 层瓦片范围 (c0, r0, c1, r1)，右下为开区间"""
+        cols, rows = self.grid(level)
+        sx, sy = self.level_scale(level)
+        ts = self.tile_size
+        c0 = max(0, min(cols - 1, int(x0 / sx) // ts))
+        r0 = max(0, min(rows - 1, int(y0 / sy) // ts))
+        c1 = max(c0 + 1, min(cols, int(np.ceil(x1 / sx / ts))))
+        r1 = max(r0 + 1, min(rows, int(np.ceil(y1 / sy / ts))))
+        return c0, r0, c1, r1
+
+    def level_scale(self, level):
+        """第 level 层一个像素对应的原图像素数 (x, y)"""
+        w0, h0 = self.levels[0]
+        w, h = self.levels[level]
+        return w0 / w, h0 / h
+
+    def region_extent(self, level, c0, r0, c1, r1):
+        """瓦片范围在原图像素坐标中的 imshow extent"""
+        w, h = self.levels[level]
+        sx, sy = self.level_scale(level)
+        ts = self.tile_size
+        x0, y0 = c0 * ts * sx, r0 * ts * sy
+        x1, y1 = min(c1 * ts, w) * sx, min(r1 * ts, h) * sy
+        return (x0 - 0.5, x1 - 0.5, y1 - 0.5, y0 - 0.5)
+
+    def read_tile(self, level, row, col):
+        """解码单个瓦片（RGB，供后台线程调用），失败返回 None"""
+        i = int(self.level_starts[level]) + row * self.grid(level)[0] + col
+        buf = np.frombuffer(self.data, dtype=np.uint8, count=int(self.offsets[i + 1] - self.offsets[i]),
+                            offset=int(self.offsets[i]))
+        with PROFILER.stage('tile_decode'):
+            tile = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+        if tile is not None:
+            cv2.cvtColor(tile, cv2.COLOR_BGR2RGB, dst=tile)
+        return tile
+
+    def assemble(self, level, c0, r0, c1, r1, tiles):
+        """把瓦片拼成一张图像；tiles 为 {(row, col): RGB}，缺少的瓦片透明（此时返回 RGBA）"""
+        w, h = self.levels[level]
+        ts = self.tile_size
+        width, height = min(c1 * ts, w) - c0 * ts, min(r1 * ts, h) - r0 * ts
+        complete = len(tiles) == (c1 - c0) * (r1 - r0)
+        mosaic = np.zeros((height, width, 3 if complete else 4), dtype=np.uint8)
+        for (row, col), tile in tiles.items():
+            y, x = (row - r0) * ts, (col - c0) * ts
+            th, tw = tile.shape[:2]
+            mosaic[y:y + th, x:x + tw, :3] = tile
+            if not complete:
+                mosaic[y:y + th, x:x + tw, 3] = 255
+        return mosaic
+
+    def read_level(self, level):
+        """读取整层图像（RGB）"""
+        c1, r1 = self.grid(level)
+        tiles = {(r, c): self.read_tile(level, r, c) for r in range(r1) for c in range(c1)}
+        return self.assemble(level, 0, 0, c1, r1, {k: t for k, t in tiles.items() if t is not None})
+
+    def overview(self, max_side):
+        """整图显示副本（RGB），长边不超过 max_side"""
+        return self.read_level(self.overview_level(max_side))
+
+def wants_tile_pyramid(file_path):
+    """是否为需要瓦片金字塔显示的超大图像（只读取文件头；压缩包内的图像不使用）"""
+    if split_archive_path(file_path)[0] is not None:
+        return False
+    return max(read_image_size(file_path)) >= TILE_MIN_SIDE
 
-matplotlib.use('TkAgg')  # 使用Tkinter
+def decode_for_view(file_path, max_side, build=True):
+    """界面解码入口（后台线程调用），返回 (原图, 显示副本, 原图尺寸 (h, w))，读取失败时均为 None
 
-# 设置matplotlib中文字体
-def setup_chinese_font():
-    """设置matplotlib中文字体"""
-    import matplotlib.font_manager as fm
-    
-    # 获取系统字体列表
-    font_list = [f.name for f in fm.fontManager.ttflist]
-    
-    # 按优先级尝试设置中文字体
-    chinese_fonts = ['SimHei', 'Microsoft YaHei', 'SimSun', 'KaiTi']
-    
-    for font in chinese_fonts:
-        if font in font_list:
-            plt.rcParams['font.sans-serif'] = [font]
-            break
-    else:
-        # 如果没有找到中文字体，使用默认字体并警告
-        print("警告：未找到合适的中文字体，中文可能显示为方块")
-        plt.rcParams['font.sans-serif'] = ['DejaVu Sans']
-    
-    plt.rcParams['axes.unicode_minus'] = False
+    超大图像不保留原图：读取（必要时先生成）瓦片金字塔，显示副本取自金字塔概览层，原图为 None；
+    金字塔无法生成时退回整图解码。build=False 时（预取相邻图像）只打开已有的金字塔，
+    尚未生成时直接返回 None，不解码整张原图。其他图像与 decode_for_cache 相同，缓存中为 RGB。
+    """
+    if wants_tile_pyramid(file_path):
+        if not build:
+            pyramid = TilePyramid.open(file_path)
+            if pyramid is None:
+                return None, None, None
+            return None, pyramid.overview(max_side), pyramid.full_shape
+        try:
+            pyramid = TilePyramid.open(file_path) or TilePyramid.build(file_path)
+        except OSError as e:
+            print(f"生成瓦片金字塔失败: {file_path}, 错误: {str(e)}")
+            pyramid = None
+        if pyramid is not None:
+            return None, pyramid.overview(max_side), pyramid.full_shape
+    image, display = decode_for_cache(file_path, max_side, rgb=True)
+    if image is None:
+        return None, None, None
+    return image, display, image.shape[:2]
+
+class TileCache:
+    """解码后瓦片的 LRU 缓存（按字节预算）"""
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.tiles = OrderedDict()    # (金字塔键, 层, 行, 列) -> RGB
+        self.nbytes = 0
+
+    def __contains__(self, key):
+        return key in self.tiles
+
+    def get(self, key):
+        tile = self.tiles.get(key)
+        if tile is not None:
+            self.tiles.move_to_end(key)
+        return tile
+
+    def put(self, key, tile):
+        old = self.tiles.pop(key, None)
+        if old is not None:
+            self.nbytes -= old.nbytes
+        self.tiles[key] = tile
+        self.nbytes += tile.nbytes
+        while self.nbytes > self.max_bytes and len(self.tiles) > 1:
+            _, old = self.tiles.popitem(last=False)
+            self.nbytes -= old.nbytes
 
-# 初始化字体设置
-setup_chinese_font()
+    def clear(self):
+        self.tiles.clear()
+        self.nbytes = 0
 
-def cv2_imread_unicode(file_path):
+# ---------------- 标注空间索引 ----------------
+
+CULL_MIN_ANNOTATIONS = 2000   # 普通图像的标注数达到该值时也按视野裁剪
+
+class AnnotationGrid:
+    """标注包围盒的均匀网格索引（CSR 存储），按视野矩形查询可见标注
+
+    每个标注登记到它覆盖的网格单元；覆盖单元过多的大目标单独存放，每次查询都参与精确判断。
     """
-    解决OpenCV读取中文路径图像的问题
+    def __init__(self, annotations, w, h, cells=64, max_cells=256):
+        self.num_boxes = annotations.num_boxes
+        self.bounds = annotations.bounds(w, h)
+        self.cells = cells
+        self.cell_w, self.cell_h = max(w, 1) / cells, max(h, 1) / cells
+        n = len(self.bounds)
+        cx0, cx1 = self._cell_range(self.bounds[:, 0], self.bounds[:, 2], self.cell_w)
+        cy0, cy1 = self._cell_range(self.bounds[:, 1], self.bounds[:, 3], self.cell_h)
+        nx, ny = cx1 - cx0 + 1, cy1 - cy0 + 1
+        spans = nx * ny
+        large = spans > max_cells
+        self.large = np.flatnonzero(large)
+        spans[large] = 0
+        items = np.repeat(np.arange(n), spans)
+        local = np.arange(spans.sum()) - np.repeat(np.cumsum(spans) - spans, spans)
+        cell_ids = (cy0[items] + local // nx[items]) * cells + cx0[items] + local % nx[items]
+        order = np.argsort(cell_ids, kind='stable')
+        self.items = items[order]
+        self.cell_offsets = np.searchsorted(cell_ids[order], np.arange(cells * cells + 1))
+
+    def _cell_range(self, lo, hi, size):
+        last = self.cells - 1
+        return (np.clip(np.floor(lo / size), 0, last).astype(np.int64),
+                np.clip(np.floor(hi / size), 0, last).astype(np.int64))
+
+    def query(self, x0, y0, x1, y1):
+        """与像素矩形相交的标注，返回 (检测框下标, 多边形下标)，均升序"""
+        (cx0,), (cx1,) = self._cell_range(np.array([x0]), np.array([x1]), self.cell_w)
+        (cy0,), (cy1,) = self._cell_range(np.array([y0]), np.array([y1]), self.cell_h)
+        parts = [self.large]
+        for cy in range(cy0, cy1 + 1):
+            row = cy * self.cells
+            parts.append(self.items[self.cell_offsets[row + cx0]:self.cell_offsets[row + cx1 + 1]])
+        candidates = np.unique(np.concatenate(parts))
+        b = self.bounds[candidates]
+        hit = candidates[(b[:, 0] <= x1) & (b[:, 2] >= x0) & (b[:, 1] <= y1) & (b[:, 3] >= y0)]
+        split = np.searchsorted(hit, self.num_boxes)
+        return hit[:split], hit[split:] - self.num_boxes
+
+# ---------------- Matplotlib 保留模式渲染 ----------------
+
+class RetainedRenderer:
+    """保留模式渲染器
+
+    复用同一个 AxesImage（set_data 更新）和每类标注一个 PolyCollection，
+    标签文字使用 Text 对象池。标注对象为 animated，整帧重绘时在 draw_event 中
+    叠加并保存背景；仅显示选项变化时恢复背景后 blit 重绘标注。
+    超大图像放大时另有一个细节层 AxesImage，显示当前视野的瓦片拼图，叠在整图显示副本之上。
+    预测对比时 TP / FP / FN 各用一个 PolyCollection，线型与颜色见 COMPARE_STYLES。
+    """
+    def __init__(self, ax, canvas):
+        from matplotlib.collections import PolyCollection
+        self.ax = ax
+        self.canvas = canvas
+        self.image_artist = None
+        self.detail_artist = None
+        self.image_size = None
+        self.boxes = PolyCollection([], facecolors='none', linewidths=2, animated=True)
+        self.segments = PolyCollection([], linewidths=2, animated=True)
+        ax.add_collection(self.segments, autolim=False)
+        ax.add_collection(self.boxes, autolim=False)
+        self.compare = {}
+        for kind, (style, color) in COMPARE_STYLES.items():
+            collection = PolyCollection([], facecolors='none', edgecolors=[np.array(color) / 255.0],
+                                        linewidths=2, linestyles=style, animated=True)
+            ax.add_collection(collection, autolim=False)
+            self.compare[kind] = collection
+        self.texts = []          # Text 对象池
+        self.text_kinds = []     # 每个标签对应的标注类型（bbox / segment）
+        self.background = None
+        self.show_annotations = True
+        self.saving = False
+        # 性能浮层（左上角，随标注一起 blit）
+        self.hud = ax.text(0.01, 0.99, '', transform=ax.transAxes, va='top', ha='left', fontsize=8,
+                           color='white', animated=True, visible=False, zorder=10,
+                           bbox=dict(boxstyle="round,pad=0.3", facecolor='black', alpha=0.6))
+        canvas.mpl_connect('draw_event', self.on_draw)
+
+    def set_image(self, image_rgb, full_shape):
+        """更新显示图像，返回图像尺寸是否发生变化"""
+        h, w = full_shape
+        extent = (-0.5, w - 0.5, h - 0.5, -0.5)
+        if self.image_artist is None:
+            self.image_artist = self.ax.imshow(image_rgb, extent=extent)
+        else:
+            self.image_artist.set_data(image_rgb)
+            self.image_artist.set_extent(extent)
+            self.image_artist.set_visible(True)
+        # 切换图像时复位视野（相当于原先 ax.clear 的效果）
+        self.ax.set_xlim(extent[0], extent[1])
+        self.ax.set_ylim(extent[2], extent[3])
+        self.hide_detail()
+        resized = self.image_size != (w, h)
+        self.image_size = (w, h)
+        return resized
+
+    def hide_image(self):
+        if self.image_artist is not None:
+            self.image_artist.set_visible(False)
+        self.hide_detail()
+
+    def set_detail(self, mosaic, extent):
+        """显示细节层（视野内的瓦片拼图），extent 为原图像素坐标；不改变视野"""
+        if self.detail_artist is None:
+            # imshow 可能按细节层范围重设视野，创建后恢复当前视野
+            xlim, ylim = self.ax.get_xlim(), self.ax.get_ylim()
+            self.detail_artist = self.ax.imshow(mosaic, extent=extent, zorder=0.5)
+            self.ax.set_xlim(xlim)
+            self.ax.set_ylim(ylim)
+        else:
+            self.detail_artist.set_data(mosaic)
+            self.detail_artist.set_extent(extent)
+            self.detail_artist.set_visible(True)
+
+    def hide_detail(self):
+        if self.detail_artist is not None:
+            self.detail_artist.set_visible(False)
+
+    def set_annotations(self, annotations, w, h, label_map, colors):
+        """根据列式标注重建集合顶点与颜色（图像切换时调用）"""
+        palette = np.asarray(colors, dtype=np.float64) / 255.0
+        box_verts = annotations.box_corners(w, h)
+        box_colors = palette[annotations.box_classes % len(palette)]
+        seg_verts = [pts * (w, h) for pts in annotations.segments() if len(pts) >= 3]
+        seg_classes = annotations.seg_classes[annotations.seg_sizes >= 3]
+        seg_colors = palette[seg_classes % len(palette)]
+        self.boxes.set_verts(box_verts)
+        self.boxes.set_edgecolor(box_colors if len(box_colors) else 'none')
+        self.segments.set_verts(seg_verts)
+        self.segments.set_facecolor(seg_colors if len(seg_colors) else 'none')
+        self.segments.set_edgecolor(seg_colors if len(seg_colors) else 'none')
+        labels = [('bbox', label_map.get(int(c), f"class_{c}"), x, y - 5, color)
+                  for c, (x, y), color in zip(annotations.box_classes, box_verts[:, 0], box_colors)]
+        labels += [('segment', label_map.get(int(c), f"class_{c}"), pts[0][0], pts[0][1] - 5, color)
+                   for c, pts, color in zip(seg_classes, seg_verts, seg_colors)]
+        self.set_labels(labels)
+
+    def set_labels(self, labels):
+        """labels: [(类型, 文本, x, y, 颜色)]，复用 Text 对象池"""
+        while len(self.texts) < len(labels):
+            self.texts.append(self.ax.text(0, 0, '', fontsize=10, animated=True,
+                                           bbox=dict(boxstyle="round,pad=0.3", facecolor='white', alpha=0.7)))
+        self.text_kinds = []
+        for text, (kind, label, x, y, color) in zip(self.texts, labels):
+            text.set_text(label)
+            text.set_position((x, y))
+            text.set_color(color)
+            self.text_kinds.append(kind)
+        for text in self.texts[len(labels):]:
+            text.set_visible(False)
+
+    def clear_annotations(self):
+        self.set_annotations(YoloAnnotations.empty(), 1, 1, {}, DEFAULT_COLORS)
+        self.set_comparison(None)
+
+    def set_comparison(self, groups, labels=None):
+        """设置预测对比标注：groups 为 {'tp'/'fp'/'fn': 顶点列表}，None 时清空；
+        labels 同 set_labels（应在 set_annotations 之后调用）"""
+        for kind, collection in self.compare.items():
+            collection.set_verts(groups.get(kind, []) if groups else [])
+        if labels is not None:
+            self.set_labels(labels)
+
+    def apply_options(self, show_boxes, show_segments, show_labels, alpha):
+        """仅修改对象属性，不重建标注"""
+        self.boxes.set_visible(self.show_annotations and show_boxes)
+        self.segments.set_visible(self.show_annotations and show_segments)
+        for collection in self.compare.values():
+            collection.set_visible(self.show_annotations)
+        self.segments.set_alpha(alpha)
+        for text, kind in zip(self.texts, self.text_kinds):
+            shown = {'bbox': show_boxes, 'segment': show_segments}.get(kind, True)   # 对比标签始终显示
+            text.set_visible(self.show_annotations and show_labels and shown)
+
+    def set_hud(self, text):
+        """设置性能浮层文字，None 时隐藏"""
+        self.hud.set_visible(text is not None)
+        if text is not None:
+            self.hud.set_text(text)
+
+    def animated_artists(self):
+        return ([self.segments, self.boxes] + list(self.compare.values())
+                + self.texts[:len(self.text_kinds)] + [self.hud])
+
+    def on_draw(self, event):
+        """整帧重绘后保存背景并叠加标注"""
+        if self.saving or (event is not None and event.canvas is not self.canvas):
+            return
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self.draw_annotations()
+
+    def draw_annotations(self):
+        for artist in self.animated_artists():
+            if artist.get_visible():
+                self.ax.draw_artist(artist)
+
+    def blit(self):
+        """恢复背景并只重绘标注"""
+        if self.background is None:
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self.background)
+        self.draw_annotations()
+        self.canvas.blit(self.canvas.figure.bbox)
+
+    def savefig(self, file_path, **kwargs):
+        """保存图像：标注暂时改为普通对象以便写入文件"""
+        artists = self.animated_artists()
+        hud_visible = self.hud.get_visible()
+        self.saving = True
+        try:
+            self.hud.set_visible(False)   # 浮层不写入文件
+            for artist in artists:
+                artist.set_animated(False)
+            self.canvas.figure.savefig(file_path, **kwargs)
+        finally:
+            for artist in artists:
+                artist.set_animated(True)
+            self.hud.set_visible(hud_visible)
+            self.saving = False
+            self.canvas.draw()
+
+# ---------------- OpenCV 标注绘制（批量导出 / OpenCV 渲染后端） ----------------
+
+_LABEL_FONT_CACHE = {}
+
+def _label_font(size):
+    """获取与matplotlib一致的字体（用于绘制中文标签）"""
+    font = _LABEL_FONT_CACHE.get(size)
+    if font is None:
+        import matplotlib
+        import matplotlib.font_manager as fm
+        from PIL import ImageFont
+        setup_chinese_font()
+        font_path = fm.findfont(fm.FontProperties(family=matplotlib.rcParams['font.sans-serif']))
+        font = ImageFont.truetype(font_path, size)
+        _LABEL_FONT_CACHE[size] = font
+    return font
+
+def _measure_label(text, font_px, font_scale, thickness):
+    """返回标签文字尺寸 (宽, 高, 基线以下高度)"""
+    if text.isascii():
+        (tw, th), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+        return tw, th, baseline
+    left, top, right, bottom = _label_font(font_px).getbbox(text)
+    return right - left, font_px, max(0, bottom - font_px)
+
+def draw_labels_cv2(image, labels, scale=1.0, thin=False):
+    """批量绘制标签 labels: [(文本, x, y, BGR颜色)]，y 为文字基线位置
+
+    所有白色底框合成到一个掩码后只混合一次；thin=True 时按顺序放置，
+    跳过与已放置标签重叠的标签（用粗网格记录占用区域）。
+    """
+    if not labels:
+        return
+    h, w = image.shape[:2]
+    font_px = max(10, int(round(14 * scale)))
+    pad = max(2, int(round(font_px * 0.3)))
+    font_scale = font_px / 22.0
+    thickness = max(1, int(round(scale)))
+    cell = max(4, font_px // 2)
+    occupied = np.zeros((h // cell + 1, w // cell + 1), dtype=bool) if thin else None
+    sizes = {}
+    placed = []
+    for text, x, y, color in labels:
+        size = sizes.get(text)
+        if size is None:
+            size = sizes[text] = _measure_label(text, font_px, font_scale, thickness)
+        tw, th, baseline = size
+        x0 = int(max(0, min(w - 1, x)))
+        y0 = int(max(th + pad, min(h - 1, y)))
+        bx1, by1 = max(0, x0 - pad), max(0, y0 - th - pad)
+        bx2, by2 = min(w, x0 + tw + pad), min(h, y0 + baseline + pad)
+        if bx2 <= bx1 or by2 <= by1:
+            continue
+        if thin:
+            cells = occupied[by1 // cell:by2 // cell + 1, bx1 // cell:bx2 // cell + 1]
+            if cells.any():
+                continue
+            cells[:] = True
+        placed.append((text, x0, y0, color, (bx1, by1, bx2, by2)))
+    # 白色底框，透明度 0.7（与 matplotlib bbox 一致），一次混合
+    mask = np.zeros((h, w), dtype=bool)
+    for *_, (bx1, by1, bx2, by2) in placed:
+        mask[by1:by2, bx1:bx2] = True
+    image[mask] = (image[mask] * 0.3 + 255 * 0.7).astype(np.uint8)
+    unicode_labels = []
+    for text, x0, y0, color, _ in placed:
+        if text.isascii():
+            cv2.putText(image, text, (x0, y0), cv2.FONT_HERSHEY_SIMPLEX, font_scale,
+                        color, thickness, cv2.LINE_AA)
+        else:
+            unicode_labels.append((text, x0, y0, color))
+    if unicode_labels:
+        # 中文标签通过 PIL 一次性绘制
+        from PIL import Image, ImageDraw
+        pil = Image.fromarray(image)
+        draw = ImageDraw.Draw(pil)
+        font = _label_font(font_px)
+        for text, x0, y0, color in unicode_labels:
+            draw.text((x0, y0), text, font=font, fill=tuple(int(c) for c in color), anchor='ls')
+        image[:] = np.asarray(pil)
+
+def draw_annotations_cv2(image, annotations, label_map, colors=DEFAULT_COLORS,
+                         show_boxes=True, show_segments=True, show_labels=True, alpha=0.3,
+                         thin_labels=False):
+    """直接在 BGR 图像上绘制检测框、分割区域和标签，返回新图像
+
+    检测框按颜色分组批量绘制；分割区域全部填充到一张覆盖层后只混合一次。
+    """
+    out = image.copy()
+    h, w = out.shape[:2]
+    # 线宽/字号随图像尺寸缩放，使效果接近 matplotlib 渲染
+    scale = max(1.0, max(h, w) / 1000.0)
+    thickness = max(2, int(round(2 * scale)))
+    bgr = [(b, g, r) for r, g, b in colors]
+    labels = []
+
+    box_pts = box_cls = None
+    if show_boxes and annotations.num_boxes:
+        corners = annotations.box_corners(w, h)
+        box_cls = annotations.box_classes % len(colors)
+        box_pts = np.round(corners).astype(np.int32)
+        if show_labels:
+            labels.extend(zip(annotations.box_classes, corners[:, 0, 0], corners[:, 0, 1] - 5))
+
+    seg_pts, seg_cls = [], np.zeros(0, dtype=np.int64)
+    if show_segments and annotations.num_segments:
+        keep = annotations.seg_sizes >= 3
+        pixel = [pts * (w, h) for pts in annotations.segments()]
+        seg_pts = [np.round(pts).astype(np.int32) for pts, k in zip(pixel, keep) if k]
+        seg_cls = annotations.seg_classes[keep] % len(colors)
+        if show_labels:
+            labels.extend((c, pts[0][0], pts[0][1] - 5)
+                          for c, pts, k in zip(annotations.seg_classes, pixel, keep) if k)
+
+    if seg_pts and alpha > 0:
+        overlay = out.copy()
+        for ci in np.unique(seg_cls):
+            cv2.fillPoly(overlay, [seg_pts[i] for i in np.flatnonzero(seg_cls == ci)], bgr[ci], cv2.LINE_AA)
+        out = cv2.addWeighted(overlay, alpha, out, 1 - alpha, 0)
+    for ci in np.unique(seg_cls):
+        cv2.polylines(out, [seg_pts[i] for i in np.flatnonzero(seg_cls == ci)], True, bgr[ci],
+                      thickness, cv2.LINE_AA)
+    if box_pts is not None:
+        for ci in np.unique(box_cls):
+            cv2.polylines(out, list(box_pts[box_cls == ci]), True, bgr[ci], thickness, cv2.LINE_AA)
+    if labels:
+        names = {}
+        batch = []
+        for class_id, x, y in labels:
+            class_id = int(class_id)
+            name = names.get(class_id)
+            if name is None:
+                name = names[class_id] = str(label_map.get(class_id, f"class_{class_id}"))
+            batch.append((name, x, y, bgr[class_id % len(colors)]))
+        draw_labels_cv2(out, batch, scale, thin=thin_labels)
+    return out
+
+# ---------------- 缩略图 ----------------
+
+THUMBNAIL_SIZE = 160
+THUMBNAIL_VERSION = 1
+
+def make_thumbnail(image_path, label_path=None, size=THUMBNAIL_SIZE, colors=DEFAULT_COLORS):
+    """生成带标注框的缩略图（BGR，长边为 size），读取失败返回 None"""
+    w, h = read_image_size(image_path)
+    image, _ = decode_preview(image_path, choose_reduction(max(w, h), size))
+    if image is None:
+        return None
+    image = make_display_copy(image, size)
+    annotations = YoloAnnotations.empty()
+    if label_path is not None:
+        try:
+            annotations = parse_yolo_annotations(label_path)
+        except Exception as e:
+            print(f"读取标注失败: {label_path}, 错误: {str(e)}")
+    if len(annotations):
+        image = draw_annotations_cv2(image, annotations, {}, colors, show_labels=False, alpha=0.3)
+    return image
+
+class ThumbnailCache:
+    """磁盘缩略图缓存：按图像路径、图像和标签文件的 mtime 生成键，保存为 JPEG
+
+    缓存目录为 ~/.cache/yolo-dataset-vis/thumbs，按键的前两位分子目录。
+    文件变化后键随之变化，旧缩略图不再被使用。
+    """
+    def __init__(self, root=None, size=THUMBNAIL_SIZE):
+        self.root = Path(root) if root else Path.home() / '.cache' / 'yolo-dataset-vis' / 'thumbs'
+        self.size = size
+
+    def key(self, image_path, label_path=None):
+        """缓存键；图像不存在时返回 None"""
+        try:
+            st = dataset_stat(image_path)
+        except OSError:
+            return None
+        try:
+            label_mtime = dataset_stat(label_path).st_mtime_ns if label_path is not None else 0
+        except OSError:
+            label_mtime = 0
+        text = (f"{THUMBNAIL_VERSION}|{self.size}|{os.path.abspath(image_path)}|"
+                f"{st.st_mtime_ns}|{st.st_size}|{label_mtime}")
+        return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+    def path_for(self, key):
+        return self.root / key[:2] / f"{key}.jpg"
+
+    def get_or_make(self, image_path, label_path=None, colors=DEFAULT_COLORS):
+        """读取缓存的缩略图，没有时生成并写入缓存（供后台线程调用），返回 BGR 图像或 None"""
+        key = self.key(image_path, label_path)
+        if key is None:
+            return None
+        path = self.path_for(key)
+        if path.exists():
+            thumb = cv2_imread_unicode(path)
+            if thumb is not None:
+                return thumb
+        thumb = make_thumbnail(image_path, label_path, self.size, colors)
+        if thumb is not None:
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_name(f"{path.stem}.{threading.get_ident()}.tmp.jpg")
+                if cv2_imwrite_unicode(tmp_path, thumb):
+                    os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"写入缩略图缓存失败: {path}, 错误: {str(e)}")
+        return thumb
+
+# ---------------- 多进程批量导出 ----------------
+
+_EXPORT_OPTIONS = {}
+
+def _init_export_worker(options):
+    """导出子进程初始化：保存渲染参数"""
+    global _EXPORT_OPTIONS
+    _init_pool_worker()
+    _EXPORT_OPTIONS = options
+
+def _export_annotations(opts, key):
+    """导出子进程中读取标签键对应的标注（未设置标签文件夹或读取失败时为空）"""
+    if opts.get('label_folder'):
+        try:
+            return parse_yolo_annotations(label_path_for(opts['label_folder'], key))
+        except Exception as e:
+            print(f"读取标注失败: {key}.txt, 错误: {str(e)}")
+    return YoloAnnotations.empty()
+
+def _export_one(image_path):
+    """导出单张图像（在子进程中执行），返回是否成功"""
+    opts = _EXPORT_OPTIONS
+    image_path = Path(image_path)
+    image = cv2_imread_unicode(image_path)
+    if image is None:
+        return False
+    key = label_key(image_path, opts.get('image_root'))
+    annotations = _export_annotations(opts, key)
+    out = draw_annotations_cv2(image, annotations, opts['label_map'], opts['colors'],
+                               opts['show_boxes'], opts['show_segments'], opts['show_labels'],
+                               opts['alpha'])
+    # 子文件夹中的图像以 "目录__文件名" 命名，避免重名覆盖
+    output_path = Path(opts['output_dir']) / f"{key.replace('/', '__')}_visualized.png"
+    return cv2_imwrite_unicode(output_path, out)
+
+def run_batch_export(image_paths, label_folder, output_dir, label_map, colors=DEFAULT_COLORS,
+                     show_boxes=True, show_segments=True, show_labels=True, alpha=0.3,
+                     workers=None, progress=None, cancel_event=None, image_root=None):
+    """多进程批量导出，progress(done, total, rate) 用于汇报进度；返回 (成功数, 失败数)
+
+    image_root 为递归加载时的图像根目录，用于按相对路径查找标签。
+    """
+    image_paths = [str(p) for p in image_paths]
+    total = len(image_paths)
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    options = {
+        'label_folder': str(label_folder) if label_folder else None,
+        'image_root': str(image_root) if image_root else None,
+        'output_dir': str(output_dir),
+        'label_map': dict(label_map),
+        'colors': list(colors),
+        'show_boxes': show_boxes,
+        'show_segments': show_segments,
+        'show_labels': show_labels,
+        'alpha': alpha,
+    }
+    workers = workers or max(1, (multiprocessing.cpu_count() or 2) - 1)
+    chunksize = max(1, min(64, total // (workers * 8) if total else 1))
+    done = failed = 0
+    start = time.time()
+    with multiprocessing.Pool(workers, initializer=_init_export_worker, initargs=(options,)) as pool:
+        for ok in pool.imap_unordered(_export_one, image_paths, chunksize=chunksize):
+            done += 1
+            if not ok:
+                failed += 1
+            if progress:
+                progress(done, total, done / max(time.time() - start, 1e-6))
+            if cancel_event is not None and cancel_event.is_set():
+                pool.terminate()
+                break
+    return done - failed, failed
+
+# ---------------- 视频导出 ----------------
+
+VIDEO_FOURCC = {'.mp4': 'mp4v', '.avi': 'MJPG', '.mkv': 'XVID'}
+
+def default_video_size(image_path, max_side=1920):
+    """默认视频分辨率：第一张图像的尺寸，长边不超过 max_side，宽高取偶数"""
+    w, h = read_image_size(image_path)
+    if not w or not h:
+        return 1280, 720
+    scale = min(1.0, max_side / max(w, h))
+    return max(2, int(w * scale) // 2 * 2), max(2, int(h * scale) // 2 * 2)
+
+def parse_size(text):
+    """解析 "宽x高" 形式的分辨率，返回 (宽, 高)；格式无效时抛出 ValueError"""
+    w, _, h = text.strip().lower().partition('x')
+    w, h = int(w), int(h)
+    if w <= 0 or h <= 0:
+        raise ValueError(f"无效的分辨率: {text}")
+    return w, h
+
+def _render_video_frame(item):
+    """渲染一帧（在子进程中执行）：解码、按比例缩放到统一分辨率、绘制标注与标题，读取失败返回 None
+
+    先缩放再绘制，标注线宽和字号按视频分辨率计算，缩小后仍清晰可读。
+    """
+    position, image_path = item
+    opts = _EXPORT_OPTIONS
+    image = cv2_imread_unicode(image_path)
+    if image is None:
+        return None
+    w, h = opts['size']
+    ih, iw = image.shape[:2]
+    scale = min(w / iw, h / ih)
+    cw, ch = max(1, min(w, round(iw * scale))), max(1, min(h, round(ih * scale)))
+    content = cv2.resize(image, (cw, ch), interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+    annotations = _export_annotations(opts, label_key(image_path, opts.get('image_root')))
+    content = draw_annotations_cv2(content, annotations, opts['label_map'], opts['colors'],
+                                   opts['show_boxes'], opts['show_segments'], opts['show_labels'],
+                                   opts['alpha'])
+    frame = np.zeros((h, w, 3), dtype=np.uint8)
+    x0, y0 = (w - cw) // 2, (h - ch) // 2
+    frame[y0:y0 + ch, x0:x0 + cw] = content
+    if opts['caption']:
+        caption = f"{position + 1}/{opts['total']}  {Path(image_path).name}"
+        draw_labels_cv2(frame, [(caption, 8, h - 12, (0, 0, 0))], max(1.0, h / 1000.0))
+    return frame
+
+def run_video_export(image_paths, output_path, label_folder, label_map, colors=DEFAULT_COLORS,
+                     show_boxes=True, show_segments=True, show_labels=True, alpha=0.3,
+                     fps=2.0, size=None, caption=True, workers=None, max_pending=None,
+                     progress=None, cancel_event=None, image_root=None):
+    """按 image_paths 的顺序把图像渲染为幻灯片视频，返回 (写入帧数, 失败数)
+
+    解码、缩放和标注绘制在进程池中并行，编码（cv2.VideoWriter）在调用线程中按顺序进行；
+    在途帧数不超过 max_pending，内存占用与图像数量无关。size 为 (宽, 高)，默认见 default_video_size。
     """
+    image_paths = [str(p) for p in image_paths]
+    total = len(image_paths)
+    if not total:
+        return 0, 0
+    w, h = size or default_video_size(image_paths[0])
+    w, h = max(2, int(w) // 2 * 2), max(2, int(h) // 2 * 2)   # 多数编码器要求偶数尺寸
+    options = {
+        'label_folder': str(label_folder) if label_folder else None,
+        'image_root': str(image_root) if image_root else None,
+        'label_map': dict(label_map),
+        'colors': list(colors),
+        'show_boxes': show_boxes,
+        'show_segments': show_segments,
+        'show_labels': show_labels,
+        'alpha': alpha,
+        'size': (w, h),
+        'caption': caption,
+        'total': total,
+    }
+    workers = workers or max(1, (multiprocessing.cpu_count() or 2) - 1)
+    max_pending = max_pending or workers * 4
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    ext = output_path.suffix.lower() or '.mp4'
+    # VideoWriter 在 Windows 上不支持非 ASCII 路径：先写入临时文件，完成后移动
+    write_path = output_path
+    if not str(output_path).isascii():
+        write_path = Path(tempfile.mkdtemp(prefix='yolo-vis-video-')) / f"video{ext}"
+    writer = cv2.VideoWriter(str(write_path), cv2.VideoWriter_fourcc(*VIDEO_FOURCC.get(ext, 'mp4v')),
+                             float(fps), (w, h))
+    written = failed = 0
+    start = time.time()
+    items = enumerate(image_paths)
+    pending = deque()
+    opened = writer.isOpened()
     try:
-        # 方法1：使用numpy读取
-        with open(file_path, 'rb') as f:
-            image_data = f.read()
-        
-        # 将字节数据转换为numpy数组
-        nparr = np.frombuffer(image_data, np.uint8)
-        # 解码图像
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        return image
-    except Exception as e:
-        print(f"读取图像失败: {file_path}, 错误: {str(e)}")
+        if not opened:
+            raise RuntimeError(f"无法创建视频文件: {output_path}（格式不受支持或缺少编码器）")
+        with multiprocessing.Pool(workers, initializer=_init_export_worker, initargs=(options,)) as pool:
+            for item in items:
+                pending.append(pool.apply_async(_render_video_frame, (item,)))
+                if len(pending) >= max_pending:
+                    break
+            while pending:
+                frame = pending.popleft().get()
+                # 先补充下一帧，编码当前帧时子进程继续渲染
+                item = next(items, None)
+                if item is not None:
+                    pending.append(pool.apply_async(_render_video_frame, (item,)))
+                if frame is None:
+                    failed += 1
+                else:
+                    with PROFILER.stage('encode'):
+                        writer.write(frame)
+                    written += 1
+                if progress:
+                    done = written + failed
+                    progress(done, total, done / max(time.time() - start, 1e-6))
+                if cancel_event is not None and cancel_event.is_set():
+                    pool.terminate()
+                    break
+    finally:
+        writer.release()
+        if write_path != output_path:
+            # 打开失败时临时文件夹中没有可用的视频，只清理
+            if opened:
+                shutil.move(str(write_path), str(output_path))
+            shutil.rmtree(write_path.parent, ignore_errors=True)
+    return written, failed
+
+# ---------------- 图像列表 ----------------
+
+_NATURAL_SPLIT = re.compile(r'(\d+)')
+
+def natural_key(text):
+    """自然排序键：按文本中的数字顺序"""
+    return tuple(int(t) if t.isdigit() else t.lower() for t in _NATURAL_SPLIT.split(text))
+
+def iter_image_entries(folder, recursive=False, batch_size=2048):
+    """单次 os.scandir 遍历图像文件（可递归子文件夹），按批产出 [(排序键, Path)]
+
+    排序键在遍历时只计算一次：(相对目录, 文件名, 完整文件名) 的自然排序键。
+    """
+    extensions = {ext.lower() for ext in IMAGE_EXTENSIONS}
+    folder = str(folder)
+    stack = ['']
+    batch = []
+    while stack:
+        rel_dir = stack.pop()
+        dir_key = natural_key(rel_dir)
+        try:
+            it = scandir_dataset(os.path.join(folder, rel_dir))
+        except OSError as e:
+            print(f"读取文件夹失败: {os.path.join(folder, rel_dir)}, 错误: {str(e)}")
+            continue
+        with it as entries:
+            for entry in entries:
+                name = entry.name
+                dot = name.rfind('.')
+                if dot > 0 and name[dot:].lower() in extensions:
+                    if entry.is_file():
+                        batch.append(((dir_key, natural_key(name[:dot]), name), Path(entry.path)))
+                        if len(batch) >= batch_size:
+                            yield batch
+                            batch = []
+                elif recursive and not name.startswith('.') and entry.is_dir(follow_symlinks=False):
+                    stack.append(f"{rel_dir}/{name}" if rel_dir else name)
+    if batch:
+        yield batch
+
+def list_images(folder, recursive=False):
+    """列出文件夹中的图像（自然数字顺序）"""
+    entries = [entry for batch in iter_image_entries(folder, recursive) for entry in batch]
+    entries.sort(key=lambda e: e[0])
+    return [path for _, path in entries]
+
+def image_sort_key(path, folder):
+    """单个图像的排序键，与 iter_image_entries 产出的排序键一致"""
+    rel_dir, _, name = os.path.relpath(str(path), str(folder)).replace(os.sep, '/').rpartition('/')
+    dot = name.rfind('.')
+    return natural_key(rel_dir), natural_key(name[:dot] if dot > 0 else name), name
+
+class ImageNameIndex:
+    """图像名称索引：精确/数字查找为哈希表，前缀查找在排序表上二分，
+    子串与模糊（子序列）匹配在全部名称拼接成的字符串上用 str.find / 正则扫描"""
+
+    def __init__(self, image_list, image_root=None):
+        # 名称即标签键：平铺文件夹为文件名，递归加载时为相对路径，统一小写
+        names = [label_key(p, image_root).lower() for p in image_list]
+        self.names = names
+        self.exact = {}
+        self.numeric = {}
+        for i, name in enumerate(names):
+            self.exact.setdefault(name, i)
+            base = name.rpartition('/')[2]
+            if base != name:
+                self.exact.setdefault(base, i)   # 递归模式下也可只输入文件名
+            if base.isdigit():
+                self.numeric.setdefault(int(base), i)
+        order = sorted(range(len(names)), key=names.__getitem__)
+        self.sorted_names = [names[i] for i in order]
+        self.sorted_rows = order
+        self.blob = '\n'.join(names)
+        self.line_starts = np.cumsum([0] + [len(n) + 1 for n in names[:-1]])
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    def normalize(text):
+        return text.strip().lower().replace('\\', '/')
+
+    def find(self, text):
+        """精确查找（可带扩展名，不区分大小写），其次按数字匹配；未找到返回 None"""
+        key = self.normalize(text)
+        row = self.exact.get(key)
+        if row is None:
+            stem, ext = os.path.splitext(key)
+            if ext in IMAGE_EXTENSIONS:
+                row = self.exact.get(stem)
+        if row is None and key.isdigit():
+            row = self.numeric.get(int(key))
+        return row
+
+    def prefix(self, text, limit=50):
+        """名称以 text 开头的图像下标（按名称排序）"""
+        key = self.normalize(text)
+        lo = bisect.bisect_left(self.sorted_names, key)
+        hi = bisect.bisect_left(self.sorted_names, key + '\uffff', lo, min(len(self.sorted_names), lo + limit))
+        return self.sorted_rows[lo:hi]
+
+    def _scan(self, pattern, limit, seen, rows):
+        """在拼接字符串上扫描匹配，按行去重收集图像下标"""
+        for match in pattern.finditer(self.blob):
+            row = int(np.searchsorted(self.line_starts, match.start(), side='right')) - 1
+            if row not in seen:
+                seen.add(row)
+                rows.append(row)
+                if len(rows) >= limit:
+                    return True
+        return False
+
+    def search(self, text, limit=50):
+        """增量搜索：精确 > 前缀 > 子串 > 子序列（模糊），返回至多 limit 个图像下标"""
+        key = self.normalize(text)
+        if not key or not self.names:
+            return []
+        rows, seen = [], set()
+        exact = self.find(key)
+        if exact is not None:
+            rows.append(exact)
+            seen.add(exact)
+        for row in self.prefix(key, limit):
+            if row not in seen and len(rows) < limit:
+                seen.add(row)
+                rows.append(row)
+        if len(rows) >= limit:
+            return rows
+        if self._scan(re.compile(re.escape(key)), limit, seen, rows) or len(key) < 2:
+            return rows
+        fuzzy = '[^\n]*?'.join(re.escape(c) for c in key)
+        self._scan(re.compile(fuzzy), limit, seen, rows)
+        return rows
+
+# ---------------- 文件夹监视 ----------------
+
+class PollingWatcher:
+    """定时扫描文件夹，比较文件 size/mtime 找出变化（通用后备方案）
+
+    on_changes(paths, rescan) 在后台线程中调用：paths 为新增、修改或删除的文件路径集合，
+    rescan=True 表示事件可能丢失（如 inotify 队列溢出），需要整体重新扫描。
+    """
+    def __init__(self, folders, recursive, on_changes, interval=2.0):
+        self.folders = [str(f) for f in folders]
+        self.recursive = recursive
+        self.on_changes = on_changes
+        self.interval = interval
+        self.stop_event = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True, name=type(self).__name__).start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def snapshot(self):
+        """{文件路径: (size, mtime_ns)}，跳过隐藏文件和文件夹"""
+        result = {}
+        stack = list(self.folders)
+        while stack:
+            folder = stack.pop()
+            try:
+                with os.scandir(folder) as it:
+                    for entry in it:
+                        if entry.name.startswith('.'):
+                            continue
+                        if entry.is_file():
+                            st = entry.stat()
+                            result[entry.path] = (st.st_size, st.st_mtime_ns)
+                        elif self.recursive and entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+            except OSError:
+                continue
+        return result
+
+    def run(self):
+        old = self.snapshot()
+        interval = self.interval
+        while not self.stop_event.wait(interval):
+            start = time.time()
+            new = self.snapshot()
+            changed = {path for path in old.keys() | new.keys() if old.get(path) != new.get(path)}
+            old = new
+            if changed:
+                self.on_changes(changed, False)
+            # 文件很多时扫描本身较慢，相应降低频率
+            interval = max(self.interval, (time.time() - start) * 20)
+
+class InotifyWatcher(PollingWatcher):
+    """Linux inotify 监视（ctypes 调用 libc，无额外依赖），无法使用时退回定时扫描
+
+    文件写完（IN_CLOSE_WRITE）、移入移出、删除时产生事件；递归模式下新建的子文件夹自动加入监视。
+    同一批事件在 settle 秒内无新事件后一起交给回调。
+    """
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+            | IN_DELETE_SELF | IN_MOVE_SELF)
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, folders, recursive, on_changes, interval=2.0, settle=0.3):
+        super().__init__(folders, recursive, on_changes, interval)
+        self.settle = settle
+        self.libc = None
+        self.fd = -1
+        self.wd_paths = {}   # 监视描述符 -> 文件夹路径
+
+    @staticmethod
+    def available():
+        return sys.platform.startswith('linux')
+
+    def add_watch(self, folder):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), self.MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), folder)
+        self.wd_paths[wd] = folder
+
+    def add_tree(self, folder, changed=None):
+        """监视文件夹（递归模式下包括全部子文件夹）；changed 不为 None 时收集其中已有的文件"""
+        stack = [folder]
+        while stack:
+            folder = stack.pop()
+            self.add_watch(folder)
+            if not self.recursive and changed is None:
+                continue
+            try:
+                with os.scandir(folder) as it:
+                    for entry in it:
+                        if entry.name.startswith('.'):
+                            continue
+                        if self.recursive and entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif changed is not None and entry.is_file():
+                            changed.add(entry.path)
+            except OSError:
+                continue
+
+    def read_events(self):
+        """读取一批事件，返回 [(mask, 文件夹路径, 名称, 监视描述符)]"""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + self.EVENT.size <= len(data):
+            wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            events.append((mask, self.wd_paths.get(wd), name, wd))
+        return events
+
+    def run(self):
+        import ctypes.util
+        import select
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+            self.fd = self.libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+            if self.fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+            for folder in self.folders:
+                self.add_tree(folder)
+        except (OSError, AttributeError) as e:
+            # 例如监视数量超过 fs.inotify.max_user_watches
+            print(f"inotify 不可用，改为定时扫描: {str(e)}")
+            self.close()
+            return super().run()
+        changed, rescan, last_event = set(), False, 0.0
+        try:
+            while not self.stop_event.is_set():
+                ready, _, _ = select.select([self.fd], [], [], 0.1)
+                if ready:
+                    for mask, folder, name, wd in self.read_events():
+                        last_event = time.time()
+                        if mask & self.IN_Q_OVERFLOW:
+                            rescan = True
+                        elif mask & self.IN_IGNORED:
+                            self.wd_paths.pop(wd, None)
+                        elif mask & (self.IN_DELETE_SELF | self.IN_MOVE_SELF):
+                            rescan = rescan or folder in self.folders
+                        elif folder is None or name.startswith('.'):
+                            continue
+                        elif mask & self.IN_ISDIR:
+                            path = os.path.join(folder, name)
+                            if not self.recursive:
+                                continue
+                            if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                                try:
+                                    self.add_tree(path, changed)
+                                except OSError:
+                                    rescan = True
+                            elif mask & (self.IN_MOVED_FROM | self.IN_DELETE):
+                                rescan = True   # 整个子文件夹被移走，逐个文件已无从得知
+                        elif not mask & self.IN_CREATE:
+                            # 新建文件等到写完（IN_CLOSE_WRITE）再处理
+                            changed.add(os.path.join(folder, name))
+                if (changed or rescan) and time.time() - last_event >= self.settle:
+                    self.on_changes(changed, rescan)
+                    changed, rescan = set(), False
+        finally:
+            self.close()
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+def path_in_folder(path, folder, recursive=False):
+    """path 是否位于 folder 中（非递归时只算直接子文件）"""
+    parent = Path(path).parent
+    folder = Path(folder)
+    return parent == folder or (recursive and folder in parent.parents)
+
+def create_folder_watcher(folders, recursive, on_changes):
+    """为存在的本地文件夹创建监视器（Linux 使用 inotify，其他平台定时扫描）；压缩包内的文件夹不监视"""
+    folders = [str(f) for f in dict.fromkeys(folders)
+               if f and split_archive_path(f)[0] is None and os.path.isdir(f)]
+    if not folders:
         return None
+    watcher_class = InotifyWatcher if InotifyWatcher.available() else PollingWatcher
+    return watcher_class(folders, recursive, on_changes).start()
+
+def _add_dataset_arguments(parser):
+    """export / video 子命令共用的数据集与绘制参数"""
+    parser.add_argument('-i', '--images', required=True, help='图像文件夹（也可以是 zip / tar 压缩包或包内目录）')
+    parser.add_argument('-l', '--labels', help='标签文件夹（默认 images→labels）')
+    parser.add_argument('-m', '--label-map', help='标签映射文件（json 或 id:name 文本）')
+    parser.add_argument('-r', '--recursive', action='store_true', help='包含子文件夹（标签按相同子目录结构查找）')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='进程数（默认 CPU 核数-1）')
+    parser.add_argument('--alpha', type=float, default=0.3, help='分割透明度')
+    parser.add_argument('--no-boxes', action='store_true', help='不绘制检测框')
+    parser.add_argument('--no-segments', action='store_true', help='不绘制分割区域')
+    parser.add_argument('--no-labels', action='store_true', help='不绘制标签')
+
+def _load_cli_dataset(args):
+    """解析数据集参数，返回 (标签文件夹或 None, 标签映射, 图像列表)"""
+    if DatasetArchive.is_archive(args.images):
+        args.images = DatasetArchive.open(args.images).image_folder()
+    label_folder = args.labels or str(args.images).replace('images', 'labels')
+    if not dataset_is_dir(label_folder):
+        print(f"警告：标签文件夹不存在: {label_folder}")
+        label_folder = None
+    label_map = read_label_map_file(args.label_map) if args.label_map else {}
+    return label_folder, label_map, list_images(args.images, args.recursive)
+
+def _progress_printer(unit='张'):
+    """命令行进度输出回调 report(done, total, rate)"""
+    last_report = [0.0]
+
+    def report(done, total, rate):
+        # 限制刷新频率，避免终端输出成为瓶颈
+        now = time.time()
+        if done < total and now - last_report[0] < 0.2:
+            return
+        last_report[0] = now
+        print(f"\r进度: {done}/{total} ({done / total * 100:.1f}%)  {rate:.1f} {unit}/秒",
+              end='', flush=True)
+
+    return report
+
+def filter_images(image_paths, label_folder, expression, image_root=None, workers=None):
+    """按筛选表达式（见 AnnotationQuery）过滤图像列表，保持原有顺序"""
+    tree = AnnotationQuery.parse(expression)
+    index = AnnotationIndex.build(label_folder, workers=workers, recursive=image_root is not None)
+    query = AnnotationQuery(index)
+    rows = query.rows_for(image_paths, image_root)
+    sizes = None
+    if AnnotationQuery.needs_sizes(tree):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            sizes = np.array(list(pool.map(read_image_size, image_paths)), dtype=np.float64).reshape(-1, 2)
+    return [image_paths[i] for i in query.evaluate(tree, rows, sizes)]
+
+def export_cli(argv=None):
+    """命令行批量导出入口：python main.py export -i 图像文件夹 -o 输出文件夹"""
+    parser = argparse.ArgumentParser(prog='main.py export', description='无界面批量导出标注可视化图像')
+    _add_dataset_arguments(parser)
+    parser.add_argument('-o', '--output', required=True, help='输出文件夹')
+    args = parser.parse_args(argv)
+
+    label_folder, label_map, image_paths = _load_cli_dataset(args)
+    if not image_paths:
+        print("在选择的文件夹中没有找到图像文件")
+        return 1
+
+    start = time.time()
+    ok, failed = run_batch_export(image_paths, label_folder, args.output, label_map,
+                                  show_boxes=not args.no_boxes, show_segments=not args.no_segments,
+                                  show_labels=not args.no_labels, alpha=args.alpha,
+                                  workers=args.workers, progress=_progress_printer(),
+                                  image_root=args.images if args.recursive else None)
+    elapsed = time.time() - start
+    print(f"\n已导出 {ok} 张图像到 {args.output}，失败 {failed} 张，"
+          f"耗时 {elapsed:.1f}s ({ok / max(elapsed, 1e-6):.1f} 张/秒)")
+    return 0 if failed == 0 else 2
+
+def video_cli(argv=None):
+    """命令行视频导出入口：python main.py video -i 图像文件夹 -o 输出.mp4"""
+    parser = argparse.ArgumentParser(prog='main.py video', description='把数据集导出为带标注的幻灯片视频')
+    _add_dataset_arguments(parser)
+    parser.add_argument('-o', '--output', required=True, help='输出视频文件（.mp4 / .avi）')
+    parser.add_argument('--fps', type=float, default=2.0, help='每秒显示的图像数')
+    parser.add_argument('--size', help='视频分辨率，如 1280x720（默认取第一张图像，长边不超过 1920）')
+    parser.add_argument('--filter', help='筛选表达式，如 "has(7) and objects > 50"（语法同界面中的筛选）')
+    parser.add_argument('--no-caption', action='store_true', help='不显示序号和文件名')
+    args = parser.parse_args(argv)
+
+    size = None
+    if args.size:
+        try:
+            size = parse_size(args.size)
+        except ValueError:
+            parser.error(f"无效的分辨率: {args.size}")
+    label_folder, label_map, image_paths = _load_cli_dataset(args)
+    image_root = args.images if args.recursive else None
+    if args.filter:
+        if label_folder is None:
+            print("筛选需要标签文件夹")
+            return 1
+        try:
+            image_paths = filter_images(image_paths, label_folder, args.filter, image_root, args.workers)
+        except ValueError as e:
+            print(f"筛选表达式错误: {str(e)}")
+            return 1
+    if not image_paths:
+        print("没有符合条件的图像")
+        return 1
+
+    start = time.time()
+    written, failed = run_video_export(image_paths, args.output, label_folder, label_map,
+                                       show_boxes=not args.no_boxes, show_segments=not args.no_segments,
+                                       show_labels=not args.no_labels, alpha=args.alpha, fps=args.fps,
+                                       size=size, caption=not args.no_caption, workers=args.workers,
+                                       progress=_progress_printer('帧'), image_root=image_root)
+    elapsed = time.time() - start
+    print(f"\n已写入 {written} 帧到 {args.output}，失败 {failed} 张，"
+          f"耗时 {elapsed:.1f}s ({written / max(elapsed, 1e-6):.1f} 帧/秒)")
+    return 0 if failed == 0 else 2
+
+def eval_cli(argv=None):
+    """命令行预测评估入口：python main.py eval -i 图像文件夹 -p 预测文件夹"""
+    parser = argparse.ArgumentParser(prog='main.py eval', description='评估模型预测：TP / FP / FN、按类别 AP 与 mAP')
+    parser.add_argument('-i', '--images', required=True, help='图像文件夹（也可以是 zip / tar 压缩包或包内目录）')
+    parser.add_argument('-l', '--labels', help='真值标签文件夹（默认 images→labels）')
+    parser.add_argument('-p', '--predictions', required=True, help='预测标签文件夹（YOLO 格式，行末为置信度）')
+    parser.add_argument('-m', '--label-map', help='标签映射文件（json 或 id:name 文本）')
+    parser.add_argument('-r', '--recursive', action='store_true', help='包含子文件夹（标签按相同子目录结构查找）')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='进程数（默认 CPU 核数-1）')
+    parser.add_argument('--iou', type=float, default=0.5, help='判定 TP 的 IoU 阈值')
+    parser.add_argument('--conf', type=float, default=0.25, help='统计 TP / FP / FN 时的置信度阈值（mAP 使用全部预测）')
+    parser.add_argument('--method', choices=sorted(MATCH_METHODS), default='greedy', help='TP / FP / FN 的匹配方式')
+    parser.add_argument('--top', type=int, default=20, help='列出错误最多的图像数')
+    parser.add_argument('-o', '--output', help='把逐图像结果写入 json 文件')
+    args = parser.parse_args(argv)
+
+    label_folder, label_map, image_paths = _load_cli_dataset(args)
+    if label_folder is None:
+        return 1
+    if not image_paths:
+        print("在选择的文件夹中没有找到图像文件")
+        return 1
+
+    start = time.time()
+    printer = _progress_printer()
+    report = run_prediction_evaluation(image_paths, label_folder, args.predictions,
+                                       args.images if args.recursive else None, args.iou, args.conf,
+                                       args.method, workers=args.workers,
+                                       progress=lambda done, total: printer(
+                                           done, total, done / max(time.time() - start, 1e-6)))
+    elapsed = time.time() - start
+    print(f"\n{report.summary_text(label_map)}\n评估耗时 {elapsed:.1f}s")
+    print("\n类别                          真值数    AP50  AP50:95")
+    for c, (n_gt, ap) in report.class_ap.items():
+        name = f"{c}: {label_map.get(c, f'class_{c}')}"
+        print(f"{name:<30}{n_gt:>6}" + ("       -        -" if n_gt == 0 else f"  {ap[0]:.3f}    {ap.mean():.3f}"))
+    worst = report.worst_first()
+    if len(worst):
+        print(f"\n错误最多的图像（共 {len(worst)} 张有错误）:")
+        for i in worst[:args.top]:
+            print(f"  {image_paths[i].name}: FP {report.fp[i]}, FN {report.fn[i]}")
+    if args.output:
+        result = {
+            'iou_threshold': args.iou, 'conf_threshold': args.conf, 'method': args.method,
+            'precision': report.precision, 'recall': report.recall,
+            'map50': report.mean_ap(0), 'map50_95': report.mean_ap(),
+            'classes': {str(c): {'gt': n_gt, 'ap50': None if n_gt == 0 else float(ap[0]),
+                                 'ap50_95': None if n_gt == 0 else float(ap.mean())}
+                        for c, (n_gt, ap) in report.class_ap.items()},
+            'images': [{'image': str(image_paths[i]), 'gt': int(report.n_gt[i]), 'pred': int(report.n_pred[i]),
+                        'tp': int(report.tp[i]), 'fp': int(report.fp[i]), 'fn': int(report.fn[i])}
+                       for i in np.flatnonzero(report.evaluated)],
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"评估结果已写入: {args.output}")
+    return 0
+
+class ThumbnailGrid:
+    """虚拟化缩略图网格窗口
+
+    只为可见格子创建画布图元，滚动由自己换算虚拟坐标，百万张图像也只绘制一屏；
+    缩略图由线程池生成并写入磁盘缓存，界面线程定时取回结果。
+    显示当前浏览子集（筛选结果或全部图像），单击缩略图跳转到该图像并回到主视图。
+    """
+    PAD = 8
+    TEXT_HEIGHT = 18
+    MEMORY_ITEMS = 600          # 内存中保留的 PhotoImage 数量
+
+    def __init__(self, app):
+        self.app = app
+        self.size = THUMBNAIL_SIZE
+        self.cell_w = self.size + self.PAD
+        self.cell_h = self.size + self.PAD + self.TEXT_HEIGHT
+        self.cache = ThumbnailCache(size=self.size)
+        self.executor = ThreadPoolExecutor(max_workers=max(2, min(8, os.cpu_count() or 2)),
+                                           thread_name_prefix='thumbnail')
+        self.results = queue.SimpleQueue()
+        self.pending = {}              # 图像下标 -> Future
+        self.photos = OrderedDict()    # 图像下标 -> PhotoImage（LRU）
+        self.top = 0.0                 # 可见区域顶端在虚拟画布中的 y 坐标
+        self.columns = 1
+        self.scroll_to_current = True
+        # 打开时的列表与子集快照，之后主窗口切换文件夹不影响网格
+        self.image_list = app.image_list
+        self.view_indices = app.view_indices
+        self.count = app.nav_count()
+        self.label_folder = getattr(app, 'label_folder', None)
+        self.image_root = app.image_root
+        self.colors = list(app.colors)
+
+        self.window = tk.Toplevel(app.root)
+        title = "缩略图" if self.view_indices is None else f"缩略图 - {app.view_description}"
+        self.window.title(f"{title} ({self.count} 张)")
+        self.window.geometry("1100x800")
+        self.canvas = tk.Canvas(self.window, bg='#202020', highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(self.window, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.canvas.bind('<Configure>', lambda e: self.render())
+        self.canvas.bind('<Button-1>', self.on_click)
+        self.window.bind('<MouseWheel>', lambda e: self.scroll_by(-e.delta / 120 * self.cell_h / 2))
+        self.window.bind('<Button-4>', lambda e: self.scroll_by(-self.cell_h / 2))
+        self.window.bind('<Button-5>', lambda e: self.scroll_by(self.cell_h / 2))
+        self.window.bind('<Prior>', lambda e: self.scroll_by(-self.canvas.winfo_height()))
+        self.window.bind('<Next>', lambda e: self.scroll_by(self.canvas.winfo_height()))
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.window.after(30, self.poll)
+
+    def index_at(self, pos):
+        """网格位置 -> image_list 下标"""
+        return int(self.view_indices[pos]) if self.view_indices is not None else pos
+
+    def total_height(self):
+        return -(-self.count // self.columns) * self.cell_h
+
+    def clamp_top(self):
+        limit = max(0, self.total_height() - self.canvas.winfo_height())
+        self.top = max(0.0, min(float(limit), self.top))
+
+    def scroll_by(self, dy):
+        self.top += dy
+        self.render()
+
+    def on_scrollbar(self, *args):
+        """滚动条回调：moveto 比例 / scroll 行或页"""
+        if args[0] == 'moveto':
+            self.top = float(args[1]) * self.total_height()
+        elif args[0] == 'scroll':
+            step = self.canvas.winfo_height() if args[2] == 'pages' else self.cell_h
+            self.top += int(args[1]) * step
+        self.render()
+
+    def render(self):
+        """只绘制可见格子，并为缺少缩略图的格子提交生成任务"""
+        width = self.canvas.winfo_width()
+        height = self.canvas.winfo_height()
+        self.columns = max(1, width // self.cell_w)
+        if self.scroll_to_current and height > 1:
+            self.scroll_to_current = False
+            row = self.app.nav_position() // self.columns
+            self.top = row * self.cell_h - (height - self.cell_h) / 2
+        self.clamp_top()
+        total = max(1, self.total_height())
+        self.scrollbar.set(self.top / total, min(1.0, (self.top + height) / total))
+
+        x0 = (width - self.columns * self.cell_w) // 2 + self.PAD // 2
+        first_row = int(self.top // self.cell_h)
+        last_row = int((self.top + height) // self.cell_h)
+        start = first_row * self.columns
+        stop = min(self.count, (last_row + 1) * self.columns)
+        current = self.app.current_index if self.app.image_list is self.image_list else None
+        self.canvas.delete('all')
+        visible = []
+        for pos in range(start, stop):
+            index = self.index_at(pos)
+            visible.append(index)
+            row, col = divmod(pos, self.columns)
+            x = x0 + col * self.cell_w
+            y = row * self.cell_h - self.top + self.PAD // 2
+            outline = '#ffcc00' if index == current else '#404040'
+            self.canvas.create_rectangle(x - 2, y - 2, x + self.size + 2, y + self.size + 2,
+                                         outline=outline, width=2 if index == current else 1)
+            photo = self.photos.get(index)
+            if photo is not None:
+                self.photos.move_to_end(index)
+                self.canvas.create_image(x + self.size // 2, y + self.size // 2, image=photo)
+            name = self.image_list[index].name
+            if len(name) > 24:
+                name = name[:10] + '…' + name[-12:]
+            self.canvas.create_text(x + self.size // 2, y + self.size + 3, text=name, anchor=tk.N,
+                                    fill='#dddddd', font=('TkDefaultFont', 8))
+        # 预取下一屏；离开可见范围且尚未开始的任务取消
+        ahead = range(stop, min(self.count, stop + (stop - start)))
+        wanted = set(visible)
+        wanted.update(self.index_at(pos) for pos in ahead)
+        for index, future in list(self.pending.items()):
+            if index not in wanted and future.cancel():
+                del self.pending[index]
+        for index in visible + [self.index_at(pos) for pos in ahead]:
+            if index not in self.photos and index not in self.pending:
+                self.pending[index] = self.executor.submit(self.load_thumbnail, index)
+
+    def load_thumbnail(self, index):
+        """后台线程：读取或生成缩略图，结果放入队列"""
+        path = self.image_list[index]
+        thumb = None
+        try:
+            label_path = None
+            if self.label_folder:
+                label_path = label_path_for(self.label_folder, label_key(path, self.image_root))
+            thumb = self.cache.get_or_make(path, label_path, self.colors)
+            if thumb is not None:
+                thumb = cv2.cvtColor(thumb, cv2.COLOR_BGR2RGB)
+        except Exception as e:
+            print(f"生成缩略图失败: {path}, 错误: {str(e)}")
+        self.results.put((index, thumb))
+
+    def poll(self):
+        """界面线程取回缩略图，转换为 PhotoImage 后重绘"""
+        if not self.window.winfo_exists():
+            return
+        from PIL import Image, ImageTk
+        changed = False
+        while True:
+            try:
+                index, thumb = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending.pop(index, None)
+            if thumb is None:
+                continue
+            self.photos[index] = ImageTk.PhotoImage(Image.fromarray(thumb), master=self.window)
+            changed = True
+            while len(self.photos) > self.MEMORY_ITEMS:
+                self.photos.popitem(last=False)
+        if changed:
+            self.render()
+        self.window.after(30, self.poll)
+
+    def on_click(self, event):
+        """单击缩略图：跳转到该图像并回到主视图"""
+        x0 = (self.canvas.winfo_width() - self.columns * self.cell_w) // 2
+        col = int((event.x - x0) // self.cell_w)
+        pos = int((event.y + self.top) // self.cell_h) * self.columns + col
+        if not 0 <= col < self.columns or not 0 <= pos < self.count:
+            return
+        if self.app.image_list is not self.image_list:
+            self.close()
+            return
+        index = self.index_at(pos)
+        self.close()
+        self.app.go_to_index(index)
+        self.app.root.lift()
+        self.app.root.focus_force()
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.app.thumbnail_grid is self:
+            self.app.thumbnail_grid = None
+        if self.window.winfo_exists():
+            self.window.destroy()
 
 class AnnotationVisualizer:
     def __init__(self, root):
@@ -72,32 +3862,71 @@ class AnnotationVisualizer:
         self.image_list = []
         self.current_index = 0
         self.label_map = {}
+        self.label_map_custom = False   # 标签映射是否由用户加载或编辑（默认映射只是占位）
         self.show_boxes = True
         self.show_segments = True
         self.show_labels = True
         self.alpha = 0.3
         
         # 颜色配置
-        self.colors = [
-            (255, 0, 0),    # 红色
-            (0, 255, 0),    # 绿色
-            (0, 0, 255),    # 蓝色
-            (255, 255, 0),  # 黄色
-            (255, 0, 255),  # 品红
-            (0, 255, 255),  # 青色
-            (128, 0, 128),  # 紫色
-            (255, 165, 0),  # 橙色
-            (0, 128, 128),  # 深青色
-            (128, 128, 0),  # 橄榄色
-        ]
+        self.colors = list(DEFAULT_COLORS)
         
         # 新增：图像缓存 & 防抖
-        self.image_cache = OrderedDict()
-        self.cache_size = 30  # 可根据内存调节
+        self.image_cache = ImageCache(max_bytes=1024 * 1024 * 1024)  # 按字节预算，可根据内存调节
         self.pending_update = None  # 防抖 after id
         self.scale_dragging = False  # 新增：是否正在拖动
         self.last_preview_time = 0   # 新增：上次快速预览时间戳
         
+        # 新增：后台预取（线程池解码，结果经 root.after 交回界面线程）
+        self.prefetch_executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix='prefetch')
+        self.prefetch_futures = {}            # (路径, 类型) -> Future（未完成的解码请求）
+        # 瓦片金字塔只为当前图像生成，单线程执行，避免多张超大原图同时解码
+        self.pyramid_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pyramid')
+        self.prefetch_results = queue.SimpleQueue()
+        self.prefetch_poll_id = None          # 结果轮询 after id
+        self.prefetch_ahead = 6               # 浏览方向上预取张数
+        self.prefetch_behind = 2              # 反方向预取张数
+        self.nav_direction = 1                # 最近一次浏览方向
+        self.waiting_for_current = False      # 当前帧是否在等待后台解码
+        self.last_full_side = None            # 最近解码原图的长边，用于选择预览缩小倍数
+        self.current_entry = None             # 当前帧 (显示副本, 原图尺寸)
+        self.current_annotations = YoloAnnotations.empty()  # 当前帧标注（列式）
+        self.annotation_index = None          # 持久化标注索引（后台构建完成后可用）
+        self.view_indices = None              # 当前浏览子集（image_list 下标，默认升序），None 表示全部
+        self.view_description = None          # 浏览子集说明
+        self.image_root = None                # 递归加载时的图像根目录（标签按相对路径查找）
+        self.load_generation = 0              # 图像列表加载序号，丢弃过期的后台扫描结果
+        self.name_index = None                # 图像名称索引（列表加载完成后后台构建）
+        self.suggest_after_id = None          # 输入联想防抖 after id
+        self.suggest_rows = []                # 联想列表对应的图像下标
+        self.query_cache = None               # (标注索引, 筛选引擎, 图像列表, 图像->索引行号)
+        self.image_sizes = {}                 # 图像路径 -> (宽, 高)，像素筛选字段使用
+        self.thumbnail_grid = None            # 打开中的缩略图网格窗口
+        self.annotation_cache = OrderedDict() # 标签路径 -> ((size, mtime_ns), 标注)，LRU
+        self.annotation_cache_size = 512
+        self.folder_watcher = None            # 图像 / 标签文件夹监视器
+        self.fs_changes = queue.SimpleQueue() # 监视线程 -> 界面线程的文件变化
+        self.index_refresh_id = None          # 标签变化后增量更新索引的防抖 after id
+        # 新增：超大图像瓦片显示与视野裁剪
+        self.pyramids = OrderedDict()         # 图像路径 -> 已打开的 TilePyramid（LRU）
+        self.pyramid_requests = set()         # 已请求在后台生成金字塔的图像路径
+        self.tile_view = None                 # 当前图像的 TilePyramid，普通图像为 None
+        self.tile_cache = TileCache()
+        self.tile_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='tile')
+        self.tile_futures = {}                # 瓦片键 -> Future
+        self.tile_results = queue.SimpleQueue()
+        self.tile_poll_id = None
+        self.detail_state = None              # 当前细节层 (金字塔键, 层, 瓦片范围, 已有瓦片数)
+        self.viewport_update_id = None        # 视野变化防抖 after id
+        self.annotation_grid = None           # (标注, 宽, 高, AnnotationGrid)
+        self.visible_selection = None         # 当前显示的 (检测框下标, 多边形下标)，None 表示全部
+        self.visible_annotations = YoloAnnotations.empty()  # 当前实际交给渲染器的标注
+        # 新增：预测与真值对比
+        self.pred_folder = None               # 预测标签文件夹（YOLO 格式 + 置信度列）
+        self.current_comparison = None        # 当前图像的 (TP, FP, FN) 数
+        self.view_sorted = None               # 按给定顺序浏览时 (argsort, 升序下标)，用于反查位置
+        self.prediction_report = None         # 最近一次预测评估结果
+        
         self.setup_ui()
         self.load_default_label_map()
         
@@ -106,6 +3935,7 @@ class AnnotationVisualizer:
         self.root.bind('<Right>', lambda e: self.step_index(1))
         self.root.bind('<Control-Left>', lambda e: self.step_index(-10))
         self.root.bind('<Control-Right>', lambda e: self.step_index(10))
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
     def setup_ui(self):
         """设置用户界面"""
@@ -114,7 +3944,7 @@ class AnnotationVisualizer:
         main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
         # 左侧控制面板
-        control_frame = ttk.Frame(main_frame, width=300)
+        control_frame = ttk.Frame(main_frame, width=316)   # 300 + 滚动条
         control_frame.pack(side=tk.LEFT, fill=tk.Y, padx=(0, 10))
         control_frame.pack_propagate(False)
         
@@ -122,8 +3952,71 @@ class AnnotationVisualizer:
         display_frame = ttk.Frame(main_frame)
         display_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
         
-        self.setup_control_panel(control_frame)
+        self.setup_control_panel(self.make_scrollable(control_frame))
         self.setup_display_area(display_frame)
+
+    def make_scrollable(self, parent):
+        """在 parent 中放置可纵向滚动的区域（Canvas + Scrollbar），返回用于放置控件的内部 Frame
+
+        控制面板的控件总高度超过窗口高度时，底部的标签映射、保存/导出等区域仍可滚动到。
+        """
+        background = ttk.Style().lookup('TFrame', 'background') or None
+        canvas = tk.Canvas(parent, highlightthickness=0, borderwidth=0, background=background)
+        scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=canvas.yview)
+        canvas.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        inner = ttk.Frame(canvas)
+        window_id = canvas.create_window(0, 0, window=inner, anchor=tk.NW)
+
+        def overflow():
+            return inner.winfo_reqheight() > canvas.winfo_height()
+
+        def update_region(event=None):
+            canvas.configure(scrollregion=(0, 0, inner.winfo_reqwidth(), inner.winfo_reqheight()))
+            if not overflow():
+                canvas.yview_moveto(0)
+
+        inner.bind('<Configure>', update_region)
+        # 内部 Frame 随画布宽度伸缩（控件 fill=tk.X 仍然有效）
+        canvas.bind('<Configure>', lambda e: (canvas.itemconfigure(window_id, width=e.width), update_region()))
+
+        def inside(widget):
+            name, prefix = str(widget), str(canvas)
+            return name == prefix or name.startswith(prefix + '.')
+
+        def on_wheel(event):
+            # 数值框、下拉框自己处理滚轮（调整数值），此时不滚动面板
+            if not overflow() or isinstance(event.widget, str) or not inside(event.widget) or \
+                    event.widget.winfo_class() in ('TSpinbox', 'TCombobox', 'TScale'):
+                return
+            if event.num == 4:
+                step = -1
+            elif event.num == 5:
+                step = 1
+            else:
+                step = -1 if event.delta > 0 else 1
+            canvas.yview_scroll(step * 3, 'units')
+
+        # 鼠标位于面板内时才接管滚轮，不影响图像区域和其他窗口
+        def bind_wheel(event):
+            for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+                self.root.bind_all(sequence, on_wheel)
+
+        def unbind_wheel(event):
+            # 移到面板内的子控件上也会触发 <Leave>，指针仍在面板内时保留
+            try:
+                widget = self.root.winfo_containing(event.x_root, event.y_root)
+            except (KeyError, tk.TclError):   # 指针在下拉列表等弹出窗口上
+                widget = None
+            if widget is not None and inside(widget):
+                return
+            for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+                self.root.unbind_all(sequence)
+
+        canvas.bind('<Enter>', bind_wheel)
+        canvas.bind('<Leave>', unbind_wheel)
+        return inner
         
     def setup_control_panel(self, parent):
         """设置控制面板"""
@@ -135,8 +4028,18 @@ class AnnotationVisualizer:
                   command=self.select_image_folder).pack(fill=tk.X, pady=2)
         ttk.Button(file_frame, text="选择标签文件夹", 
                   command=self.select_label_folder).pack(fill=tk.X, pady=2)
+        # 新增：模型预测（YOLO 格式 + 置信度列），与标签对比
+        ttk.Button(file_frame, text="选择预测文件夹",
+                  command=self.select_pred_folder).pack(fill=tk.X, pady=2)
+        # 新增：直接打开 zip / tar 数据集压缩包（不解压）
+        ttk.Button(file_frame, text="打开数据集压缩包",
+                  command=self.select_archive).pack(fill=tk.X, pady=2)
         ttk.Button(file_frame, text="加载标签映射", 
                   command=self.load_label_map).pack(fill=tk.X, pady=2)
+        # 新增：递归加载子文件夹（标签文件夹保持相同的子目录结构）
+        self.recursive_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(file_frame, text="包含子文件夹", variable=self.recursive_var,
+                        command=self.reload_images).pack(anchor=tk.W, pady=2)
         
         # 导航区域
         nav_frame = ttk.LabelFrame(parent, text="图像导航", padding=10)
@@ -146,6 +4049,8 @@ class AnnotationVisualizer:
         nav_buttons.pack(fill=tk.X)
         ttk.Button(nav_buttons, text="上一张", command=self.prev_image).pack(side=tk.LEFT)
         ttk.Button(nav_buttons, text="下一张", command=self.next_image).pack(side=tk.RIGHT)
+        # 新增：缩略图网格
+        ttk.Button(nav_buttons, text="缩略图", command=self.show_thumbnail_grid).pack(side=tk.LEFT, expand=True)
         
         # 新增：跳转到指定图像
         jump_frame = ttk.Frame(nav_frame)
@@ -155,6 +4060,17 @@ class AnnotationVisualizer:
         self.jump_entry.pack(side=tk.LEFT, padx=4)
         ttk.Button(jump_frame, text="Go", width=4, command=self.jump_to_image).pack(side=tk.LEFT)
         self.jump_entry.bind('<Return>', lambda e: self.jump_to_image())
+        # 新增：输入联想（前缀 / 子串 / 模糊匹配），按键后实时刷新
+        self.jump_entry.bind('<KeyRelease>', self.on_jump_key)
+        self.jump_entry.bind('<Down>', lambda e: self.focus_suggestions())
+        self.jump_entry.bind('<Escape>', lambda e: self.hide_suggestions())
+        self.suggest_frame = ttk.Frame(nav_frame)
+        self.suggest_listbox = tk.Listbox(self.suggest_frame, height=6, activestyle='dotbox')
+        self.suggest_listbox.pack(fill=tk.X)
+        self.suggest_listbox.bind('<Return>', lambda e: self.open_suggestion())
+        self.suggest_listbox.bind('<Double-Button-1>', lambda e: self.open_suggestion())
+        self.suggest_listbox.bind('<Escape>', lambda e: self.hide_suggestions())
+        self.jump_frame = jump_frame
         
         self.image_info_label = ttk.Label(nav_frame, text="未选择图像")
         self.image_info_label.pack(pady=5)
@@ -173,6 +4089,14 @@ class AnnotationVisualizer:
         self.scale_value_label = ttk.Label(slider_frame, text="0/0")
         self.scale_value_label.pack(anchor=tk.E)
         
+        # 新增：浏览子集提示
+        view_frame = ttk.Frame(nav_frame)
+        view_frame.pack(fill=tk.X)
+        self.view_label = ttk.Label(view_frame, text="浏览: 全部图像")
+        self.view_label.pack(side=tk.LEFT)
+        ttk.Button(view_frame, text="显示全部", width=8,
+                   command=lambda: self.set_view(None)).pack(side=tk.RIGHT)
+        
         # 显示选项
         options_frame = ttk.LabelFrame(parent, text="显示选项", padding=10)
         options_frame.pack(fill=tk.X, pady=(0, 10))
@@ -180,17 +4104,17 @@ class AnnotationVisualizer:
         self.show_boxes_var = tk.BooleanVar(value=True)
         ttk.Checkbutton(options_frame, text="显示检测框", 
                        variable=self.show_boxes_var,
-                       command=self.update_display).pack(anchor=tk.W)
+                       command=self.refresh_overlay).pack(anchor=tk.W)
         
         self.show_segments_var = tk.BooleanVar(value=True)
         ttk.Checkbutton(options_frame, text="显示分割区域", 
                        variable=self.show_segments_var,
-                       command=self.update_display).pack(anchor=tk.W)
+                       command=self.refresh_overlay).pack(anchor=tk.W)
         
         self.show_labels_var = tk.BooleanVar(value=True)
         ttk.Checkbutton(options_frame, text="显示标签", 
                        variable=self.show_labels_var,
-                       command=self.update_display).pack(anchor=tk.W)
+                       command=self.refresh_overlay).pack(anchor=tk.W)
         
         # 透明度控制
         ttk.Label(options_frame, text="分割透明度:").pack(anchor=tk.W, pady=(10, 0))
@@ -200,6 +4124,75 @@ class AnnotationVisualizer:
                                command=self.update_alpha)
         alpha_scale.pack(fill=tk.X)
         
+        # 渲染方式：Matplotlib 逐对象绘制 / OpenCV 一次性合成（适合密集标注）
+        ttk.Label(options_frame, text="渲染方式:").pack(anchor=tk.W, pady=(10, 0))
+        self.render_backend_var = tk.StringVar(value='matplotlib')
+        backend_frame = ttk.Frame(options_frame)
+        backend_frame.pack(fill=tk.X)
+        ttk.Radiobutton(backend_frame, text="Matplotlib", value='matplotlib',
+                        variable=self.render_backend_var,
+                        command=self.refresh_annotations).pack(side=tk.LEFT)
+        ttk.Radiobutton(backend_frame, text="OpenCV", value='opencv',
+                        variable=self.render_backend_var,
+                        command=self.refresh_annotations).pack(side=tk.LEFT, padx=(10, 0))
+        
+        # 新增：预测对比（TP 实线 / FP 虚线 / FN 点划线）
+        compare_frame = ttk.Frame(options_frame)
+        compare_frame.pack(fill=tk.X, pady=(10, 0))
+        self.compare_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(compare_frame, text="对比预测", variable=self.compare_var,
+                        command=self.refresh_annotations).pack(side=tk.LEFT)
+        self.pred_conf_var = tk.StringVar(value="0.25")
+        self.pred_iou_var = tk.StringVar(value="0.5")
+        for text, var in (("置信度≥", self.pred_conf_var), ("IoU≥", self.pred_iou_var)):
+            ttk.Label(compare_frame, text=text).pack(side=tk.LEFT, padx=(6, 0))
+            spinbox = ttk.Spinbox(compare_frame, from_=0.0, to=1.0, increment=0.05, width=5,
+                                  textvariable=var, command=self.refresh_annotations)
+            spinbox.pack(side=tk.LEFT)
+            spinbox.bind('<Return>', lambda e: self.refresh_annotations())
+        method_frame = ttk.Frame(options_frame)
+        method_frame.pack(fill=tk.X)
+        ttk.Label(method_frame, text="匹配方式:").pack(side=tk.LEFT)
+        self.match_method_var = tk.StringVar(value='greedy')
+        for method, text in (('greedy', "贪心"), ('hungarian', "匈牙利")):
+            ttk.Radiobutton(method_frame, text=text, value=method, variable=self.match_method_var,
+                            command=self.refresh_annotations).pack(side=tk.LEFT, padx=(6, 0))
+        
+        # 新增：分阶段计时浮层与导出
+        perf_frame = ttk.Frame(options_frame)
+        perf_frame.pack(fill=tk.X, pady=(5, 0))
+        self.show_hud_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(perf_frame, text="性能浮层", variable=self.show_hud_var,
+                        command=self.toggle_hud).pack(side=tk.LEFT)
+        ttk.Button(perf_frame, text="导出计时", command=self.export_profile).pack(side=tk.RIGHT)
+        
+        # 数据集分析
+        analysis_frame = ttk.LabelFrame(parent, text="数据集分析", padding=10)
+        analysis_frame.pack(fill=tk.X, pady=(0, 10))
+        ttk.Button(analysis_frame, text="数据集统计",
+                  command=self.show_dataset_stats).pack(fill=tk.X, pady=2)
+        ttk.Button(analysis_frame, text="标签检查",
+                  command=self.validate_labels).pack(fill=tk.X, pady=2)
+        ttk.Button(analysis_frame, text="预测评估",
+                  command=self.evaluate_predictions).pack(fill=tk.X, pady=2)
+        dedup_frame = ttk.Frame(analysis_frame)
+        dedup_frame.pack(fill=tk.X, pady=2)
+        ttk.Button(dedup_frame, text="查找重复图像",
+                  command=self.find_duplicates).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        ttk.Button(dedup_frame, text="与其他文件夹比较",
+                  command=lambda: self.find_duplicates(compare=True)).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        # 新增：筛选表达式，只浏览符合条件的图像
+        filter_frame = ttk.Frame(analysis_frame)
+        filter_frame.pack(fill=tk.X, pady=(4, 0))
+        ttk.Label(filter_frame, text="筛选:").pack(side=tk.LEFT)
+        self.filter_entry = ttk.Entry(filter_frame)
+        self.filter_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=4)
+        self.filter_entry.bind('<Return>', lambda e: self.apply_filter())
+        ttk.Button(filter_frame, text="应用", width=5, command=self.apply_filter).pack(side=tk.LEFT)
+        self.filter_status = ttk.Label(analysis_frame, text="例: has(7) and objects > 50, min_side_px < 8",
+                                       foreground='gray')
+        self.filter_status.pack(anchor=tk.W)
+        
         # 标签映射编辑
         label_frame = ttk.LabelFrame(parent, text="标签映射", padding=10)
         label_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
@@ -223,19 +4216,24 @@ class AnnotationVisualizer:
         self.label_listbox.pack(fill=tk.BOTH, expand=True)
         self.label_listbox.bind('<Delete>', self.delete_label)
         
-        # # 保存/导出功能
-        # save_frame = ttk.LabelFrame(parent, text="保存/导出", padding=10)
-        # save_frame.pack(fill=tk.X)
+        # 保存/导出功能
+        save_frame = ttk.LabelFrame(parent, text="保存/导出", padding=10)
+        save_frame.pack(fill=tk.X)
         
         # ttk.Button(save_frame, text="保存当前图像", 
         #           command=self.save_current_image).pack(fill=tk.X, pady=2)
-        # ttk.Button(save_frame, text="批量导出", 
-        #           command=self.batch_export).pack(fill=tk.X, pady=2)
+        ttk.Button(save_frame, text="批量导出", 
+                  command=self.batch_export).pack(fill=tk.X, pady=2)
+        # 新增：按当前浏览顺序导出幻灯片视频
+        ttk.Button(save_frame, text="导出视频", 
+                  command=self.export_video).pack(fill=tk.X, pady=2)
         # ttk.Button(save_frame, text="保存标签映射", 
         #           command=self.save_label_map).pack(fill=tk.X, pady=2)
         
     def setup_display_area(self, parent):
         """设置显示区域"""
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
         # 创建matplotlib图形
         self.fig = Figure(figsize=(10, 8), dpi=100)
         self.ax = self.fig.add_subplot(111)
@@ -244,6 +4242,7 @@ class AnnotationVisualizer:
         
         # 创建画布
         self.canvas = FigureCanvasTkAgg(self.fig, parent)
+        self.renderer = RetainedRenderer(self.ax, self.canvas)
         self.canvas.draw()
         self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
         
@@ -252,6 +4251,9 @@ class AnnotationVisualizer:
         toolbar_frame.pack(fill=tk.X)
         self.toolbar = NavigationToolbar2Tk(self.canvas, toolbar_frame)
         self.toolbar.update()
+        # 平移 / 缩放后按视野加载瓦片并裁剪标注
+        self.ax.callbacks.connect('xlim_changed', self.on_viewport_changed)
+        self.ax.callbacks.connect('ylim_changed', self.on_viewport_changed)
         
     def auto_detect_label_folder(self):
         """自动检测标签文件夹"""
@@ -273,7 +4275,7 @@ class AnnotationVisualizer:
         ]
         
         for pattern in possible_patterns:
-            if Path(pattern).exists():
+            if dataset_is_dir(pattern):
                 self.label_folder = pattern
                 print(f"自动检测到标签文件夹: {pattern}")
                 messagebox.showinfo("自动检测", f"已自动检测到标签文件夹:\n{pattern}")
@@ -287,67 +4289,354 @@ class AnnotationVisualizer:
         if folder:
             self.image_folder = folder
             self.auto_detect_label_folder()
+            self.build_annotation_index()
             self.load_image_list()
             
+    def select_archive(self):
+        """打开数据集压缩包：后台建立成员索引，之后按图像文件夹方式加载包内的 images 目录"""
+        path = filedialog.askopenfilename(title="选择数据集压缩包",
+                                          filetypes=[("数据集压缩包", "*.zip *.tar"), ("所有文件", "*.*")])
+        if not path:
+            return
+        print(f"正在打开压缩包: {path}")
+
+        def on_done(archive, error):
+            if error is not None:
+                messagebox.showerror("错误", f"打开压缩包失败: {str(error)}")
+                return
+            self.image_folder = archive.image_folder()
+            self.auto_detect_label_folder()
+            self.build_annotation_index()
+            self.load_image_list()
+
+        self.run_in_background(lambda: DatasetArchive.open(path), on_done)
+
     def select_label_folder(self):
         """选择标签文件夹"""
         folder = filedialog.askdirectory(title="选择标签文件夹")
         if folder:
             self.label_folder = folder
+            self.build_annotation_index()
             if hasattr(self, 'image_list') and self.image_list:
+                self.start_watching()
                 self.update_display()
                 
+    def select_pred_folder(self):
+        """选择预测标签文件夹，并打开预测对比"""
+        folder = filedialog.askdirectory(title="选择预测文件夹（YOLO 格式，行末为置信度）")
+        if folder:
+            self.pred_folder = folder
+            self.compare_var.set(True)
+            if self.image_list and hasattr(self, 'label_folder'):
+                self.refresh_annotations()
+                
+    def reload_images(self):
+        """切换递归模式后重新加载图像列表和标注索引"""
+        if not hasattr(self, 'image_folder'):
+            return
+        self.build_annotation_index()
+        self.load_image_list()
+
+    def label_path_for(self, image_path):
+        """图像对应的标签文件路径"""
+        return label_path_for(self.label_folder, label_key(image_path, self.image_root))
+
     def load_image_list(self):
-        """加载图像列表（自然数字顺序）"""
+        """流式加载图像列表（自然数字顺序）
+
+        后台线程单次 os.scandir 扫描，首批结果排序后立即显示，其余边扫描边追加；
+        扫描完成后整体按预先计算的排序键排序一次，并保持当前图像不变。
+        """
         if not hasattr(self, 'image_folder'):
             return
-        extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
+        self.stop_watching()
+        self.load_generation += 1
+        generation = self.load_generation
+        folder = self.image_folder
+        recursive = self.recursive_var.get()
+        self.image_root = folder if recursive else None
         self.image_list = []
-        for ext in extensions:
-            self.image_list.extend(Path(self.image_folder).glob(f'*{ext}'))
-            self.image_list.extend(Path(self.image_folder).glob(f'*{ext.upper()}'))
-        # 自然排序：按文件名中的数字顺序
-        def natural_key(p: Path):
-            return [int(t) if t.isdigit() else t.lower() for t in re.split(r'(\d+)', p.stem)]
-        self.image_list = sorted(set(self.image_list), key=natural_key)
         self.current_index = 0
-        if self.image_list:
-            if hasattr(self, 'index_scale'):
-                self.index_scale.config(from_=0, to=len(self.image_list) - 1)
-                self.index_var.set(0)
-                self.scale_value_label.config(text=f"1/{len(self.image_list)}")
-            print(f"已加载 {len(self.image_list)} 张图像 (自然排序)")
-            if hasattr(self, 'label_folder'):
-                self.check_label_coverage()
+        self.view_indices = None
+        self.name_index = None
+        self.image_sizes = {}
+        results = queue.SimpleQueue()
+        start = time.time()
+
+        def worker():
+            entries = []
+            try:
+                for batch in iter_image_entries(folder, recursive):
+                    if generation != self.load_generation:
+                        return
+                    if not entries:
+                        batch.sort(key=lambda e: e[0])
+                    entries.extend(batch)
+                    results.put(('batch', [path for _, path in batch]))
+                entries.sort(key=lambda e: e[0])
+                results.put(('done', [path for _, path in entries]))
+            except Exception as e:
+                results.put(('error', e))
+
+        def poll():
+            if generation != self.load_generation:
+                return
+            while True:
+                try:
+                    kind, payload = results.get_nowait()
+                except queue.Empty:
+                    break
+                if kind == 'batch':
+                    first = not self.image_list
+                    self.image_list.extend(payload)
+                    if first:
+                        self.update_nav_widgets()
+                        self.update_display()
+                elif kind == 'error':
+                    messagebox.showerror("错误", f"加载图像列表失败: {str(payload)}")
+                    return
+                else:
+                    self.finish_image_list(payload, time.time() - start)
+                    return
+            if self.image_list:
+                self.update_nav_widgets()
+            self.root.after(50, poll)
+
+        threading.Thread(target=worker, daemon=True).start()
+        self.root.after(20, poll)
+
+    def finish_image_list(self, image_list, elapsed):
+        """扫描完成：换入排序后的完整列表，保持当前图像"""
+        current = self.image_list[self.current_index] if self.image_list else None
+        self.image_list = image_list
+        self.view_indices = None
+        self.build_name_index()
+        self.start_watching()
+        if not image_list:
+            self.update_nav_widgets()
+            messagebox.showwarning("警告", "在选择的文件夹中没有找到图像文件")
+            return
+        try:
+            self.current_index = image_list.index(current) if current is not None else 0
+        except ValueError:
+            self.current_index = 0
+        self.update_nav_widgets()
+        print(f"已加载 {len(image_list)} 张图像 (自然排序), 耗时 {elapsed:.2f}s")
+        if hasattr(self, 'label_folder'):
+            self.check_label_coverage()
+        self.update_display()
+
+    def start_watching(self):
+        """监视图像与标签文件夹，文件变化增量应用（见 apply_fs_changes）"""
+        self.stop_watching()
+        if not hasattr(self, 'image_folder'):
+            return
+        generation = self.load_generation
+        folders = [self.image_folder, getattr(self, 'label_folder', None)]
+        watcher = create_folder_watcher(folders, self.image_root is not None,
+                                        lambda paths, rescan: self.fs_changes.put((generation, paths, rescan)))
+        self.folder_watcher = watcher
+        if watcher is not None:
+            self.root.after(500, lambda: self.poll_fs_changes(watcher))
+
+    def stop_watching(self):
+        if self.folder_watcher is not None:
+            self.folder_watcher.stop()
+            self.folder_watcher = None
+
+    def poll_fs_changes(self, watcher):
+        """界面线程合并监视线程报告的变化"""
+        if watcher is not self.folder_watcher:
+            return
+        paths, rescan = set(), False
+        while True:
+            try:
+                generation, changed, full = self.fs_changes.get_nowait()
+            except queue.Empty:
+                break
+            if generation == self.load_generation:
+                paths |= changed
+                rescan = rescan or full
+        if rescan:
+            print("文件夹监视事件丢失，重新加载图像列表")
+            self.build_annotation_index()
+            self.load_image_list()
+            return
+        if paths:
+            self.apply_fs_changes(paths)
+        self.root.after(500, lambda: self.poll_fs_changes(watcher))
+
+    def apply_fs_changes(self, paths):
+        """把文件的新增 / 修改 / 删除应用到图像列表、图像缓存、标注缓存与索引
+
+        只处理变化的文件，不重新扫描文件夹；当前图像或其标签变化时重绘。
+        """
+        extensions = {ext.lower() for ext in IMAGE_EXTENSIONS}
+        recursive = self.image_root is not None
+        label_folder = getattr(self, 'label_folder', None)
+        current = self.image_list[self.current_index] if self.image_list else None
+        current_label = Path(self.label_path_for(current)) if current is not None and label_folder else None
+        image_paths, label_count, redraw = [], 0, False
+        for path in map(Path, paths):
+            suffix = path.suffix.lower()
+            if label_folder and suffix == '.txt' and path_in_folder(path, label_folder, recursive):
+                label_count += 1
+                self.annotation_cache.pop(str(path), None)
+                redraw = redraw or path == current_label
+            elif suffix in extensions and path_in_folder(path, self.image_folder, recursive):
+                image_paths.append(path)
+
+        positions = {p: i for i, p in enumerate(self.image_list)} if image_paths else {}
+        removed, added, modified = set(), [], 0
+        for path in image_paths:
+            i = positions.get(path)
+            exists = path.is_file()
+            if i is None:
+                if exists:
+                    added.append(path)
+                continue
+            self.image_cache.discard(str(path))
+            self.pyramids.pop(str(path), None)
+            self.pyramid_requests.discard(str(path))
+            self.image_sizes.pop(path, None)
+            if exists:
+                modified += 1
+                redraw = redraw or path == current
+            else:
+                removed.add(i)
+        if removed or added:
+            self.update_image_list(removed, added)
+            redraw = redraw or not self.image_list or self.image_list[self.current_index] != current
+        if label_count:
+            self.query_cache = None
+            self.schedule_index_refresh()
+        if image_paths or label_count:
+            print(f"文件变化: 图像新增 {len(added)}、删除 {len(removed)}、修改 {modified}，标签 {label_count} 个")
+        if not self.image_list and current is not None:
+            self.current_entry = None
+            self.renderer.hide_image()
+            self.renderer.clear_annotations()
+            self.ax.set_title("文件夹中没有图像")
+            self.canvas.draw()
+        elif redraw:
             self.update_display()
+
+    def update_image_list(self, removed, added):
+        """从图像列表删除下标 removed、按自然顺序插入 added，保持当前图像与浏览子集"""
+        old_list = self.image_list
+        old_index = self.current_index
+        current = old_list[old_index] if old_list else None
+        new_list = [p for i, p in enumerate(old_list) if i not in removed]
+        for path in added:
+            # 列表有序，二分查找插入位置（只对 O(log n) 个图像计算排序键）
+            key = image_sort_key(path, self.image_folder)
+            lo, hi = 0, len(new_list)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if image_sort_key(new_list[mid], self.image_folder) < key:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            new_list.insert(lo, path)
+        new_positions = {p: i for i, p in enumerate(new_list)}
+        if self.view_indices is not None:
+            # 新增图像是否符合筛选条件未知，不加入子集
+            view = [new_positions[old_list[i]] for i in self.view_indices if i not in removed]
+            self.view_indices = np.asarray(view, dtype=np.int64) if view else None
+            if self.view_sorted is not None:
+                self.view_sorted = self.sorted_view(self.view_indices)
+        if current in new_positions:
+            self.current_index = new_positions[current]
         else:
-            messagebox.showwarning("警告", "在选择的文件夹中没有找到图像文件")
+            # 当前图像被删除：停在原位置的下一张
+            shift = sum(1 for i in removed if i < old_index)
+            self.current_index = max(0, min(old_index - shift, len(new_list) - 1))
+        self.image_list = new_list
+        self.query_cache = None
+        self.build_name_index()
+        if self.image_list and not self.in_view(self.current_index):
+            self.current_index = self.nav_index(self.nav_position())
+        self.update_nav_widgets()
+
+    def schedule_index_refresh(self):
+        """标签变化后防抖（2 秒）增量更新标注索引，只重新解析变化的文件"""
+        if self.index_refresh_id is not None:
+            self.root.after_cancel(self.index_refresh_id)
+
+        def refresh():
+            self.index_refresh_id = None
+            self.build_annotation_index()
+
+        self.index_refresh_id = self.root.after(2000, refresh)
     
     def check_label_coverage(self):
-        """检查标签覆盖率"""
+        """检查标签覆盖率（后台单次扫描），有问题时显示报告"""
         if not hasattr(self, 'label_folder') or not self.image_list:
             return
-            
-        total_images = len(self.image_list)
-        labeled_images = 0
-        
-        for image_path in self.image_list:
-            label_name = image_path.stem + '.txt'
-            label_path = Path(self.label_folder) / label_name
-            if label_path.exists():
-                labeled_images += 1
-        
-        coverage_rate = (labeled_images / total_images) * 100 if total_images > 0 else 0
-        print(f"标签覆盖率: {labeled_images}/{total_images} ({coverage_rate:.1f}%)")
-        
-        if coverage_rate < 100:
-            messagebox.showwarning("标签覆盖率", 
-                                 f"标签覆盖率: {coverage_rate:.1f}%\n"
-                                 f"已标注: {labeled_images} 张\n"
-                                 f"总图像: {total_images} 张\n"
-                                 f"缺失标签: {total_images - labeled_images} 张")
-        else:
-            messagebox.showinfo("标签覆盖率", "所有图像都有对应的标签文件！")
+        image_list = self.image_list
+        label_folder = self.label_folder
+        image_root = self.image_root
+        
+        def on_done(report, error):
+            if error is not None:
+                messagebox.showerror("错误", f"检查标签覆盖率失败: {str(error)}")
+                return
+            if self.image_list is not image_list:
+                return  # 期间已切换文件夹
+            total, labeled = report['total'], report['labeled']
+            coverage_rate = (labeled / total) * 100 if total > 0 else 0
+            print(f"标签覆盖率: {labeled}/{total} ({coverage_rate:.1f}%), "
+                  f"空标签: {len(report['empty'])}, 孤立标签: {len(report['orphans'])}")
+            if report['missing'] or report['empty'] or report['orphans']:
+                self.show_coverage_report(report)
+            else:
+                messagebox.showinfo("标签覆盖率", "所有图像都有对应的标签文件！")
+                
+        self.run_in_background(lambda: compute_label_coverage(
+            image_list, label_folder, image_root, image_root is not None), on_done)
+        
+    def show_coverage_report(self, report):
+        """标签覆盖率报告：缺失标签 / 空标签 / 孤立标签，可滚动浏览"""
+        total, labeled = report['total'], report['labeled']
+        coverage_rate = (labeled / total) * 100 if total > 0 else 0
+        window = tk.Toplevel(self.root)
+        window.title("标签覆盖率")
+        window.geometry("520x560")
+        ttk.Label(window, justify=tk.LEFT, text=(
+            f"标签覆盖率: {coverage_rate:.1f}%\n"
+            f"已标注: {labeled} 张    总图像: {total} 张\n"
+            f"缺失标签: {len(report['missing'])} 张    空标签: {len(report['empty'])} 个    "
+            f"孤立标签: {len(report['orphans'])} 个")).pack(anchor=tk.W, padx=10, pady=8)
+        notebook = ttk.Notebook(window)
+        notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+        image_list = self.image_list
+        
+        def add_tab(title, names, indices=None):
+            frame = ttk.Frame(notebook)
+            notebook.add(frame, text=f"{title} ({len(names)})")
+            if indices:
+                ttk.Button(frame, text=f"仅浏览{title}图像",
+                           command=lambda: self.set_view(indices, title)).pack(fill=tk.X, pady=(5, 0))
+            list_frame = ttk.Frame(frame)
+            list_frame.pack(fill=tk.BOTH, expand=True, pady=5)
+            scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL)
+            listbox = tk.Listbox(list_frame, yscrollcommand=scrollbar.set)
+            scrollbar.config(command=listbox.yview)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            if names:
+                listbox.insert(tk.END, *names)
+            if indices:
+                # 双击跳转到对应图像
+                def on_open(event):
+                    selection = listbox.curselection()
+                    if selection and self.image_list is image_list:
+                        self.go_to_index(indices[selection[0]])
+                listbox.bind('<Double-Button-1>', on_open)
+                
+        add_tab("缺失标签", [image_list[i].name for i in report['missing']], report['missing'])
+        add_tab("空标签", [image_list[i].name for i in report['empty']], report['empty'])
+        add_tab("孤立标签", report['orphans'])
             
     def load_label_map(self):
         """加载标签映射文件"""
@@ -357,22 +4646,10 @@ class AnnotationVisualizer:
         )
         if file_path:
             try:
-                if file_path.endswith('.json'):
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        self.label_map = json.load(f)
-                        # 确保键是整数
-                        self.label_map = {int(k): v for k, v in self.label_map.items()}
-                else:
-                    # 文本格式: id:name
-                    self.label_map = {}
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        for line in f:
-                            if ':' in line:
-                                id_str, name = line.strip().split(':', 1)
-                                self.label_map[int(id_str)] = name
-                                
+                self.label_map = read_label_map_file(file_path)
+                self.label_map_custom = True
                 self.update_label_listbox()
-                self.update_display()
+                self.refresh_annotations()
                 messagebox.showinfo("成功", f"已加载 {len(self.label_map)} 个标签映射")
             except Exception as e:
                 messagebox.showerror("错误", f"加载标签映射失败: {str(e)}")
@@ -385,6 +4662,7 @@ class AnnotationVisualizer:
             2: "2",
             3: "3"
         }
+        self.label_map_custom = False
         self.update_label_listbox()
         
     def update_label_listbox(self):
@@ -401,10 +4679,11 @@ class AnnotationVisualizer:
             
             if class_name:
                 self.label_map[class_id] = class_name
+                self.label_map_custom = True
                 self.update_label_listbox()
                 self.class_id_entry.delete(0, tk.END)
                 self.class_name_entry.delete(0, tk.END)
-                self.update_display()
+                self.refresh_annotations()
         except ValueError:
             messagebox.showerror("错误", "请输入有效的类别ID")
             
@@ -416,8 +4695,9 @@ class AnnotationVisualizer:
             item = self.label_listbox.get(index)
             class_id = int(item.split(':')[0])
             del self.label_map[class_id]
+            self.label_map_custom = True
             self.update_label_listbox()
-            self.update_display()
+            self.refresh_annotations()
             
     def prev_image(self):
         """上一张图像"""
@@ -427,30 +4707,231 @@ class AnnotationVisualizer:
         """下一张图像"""
         self.step_index(1)
 
-    # 新增：获取缓存图像
+    # 新增：获取缓存图像（原图）
     def get_cached_image(self, path):
+        """获取原图（瓦片显示的超大图像返回 None）"""
         key = str(path)
-        if key in self.image_cache:
-            img = self.image_cache[key]
-            # LRU 访问更新顺序
-            self.image_cache.move_to_end(key)
-            return img
-        img = cv2_imread_unicode(key)
-        if img is not None:
-            self.image_cache[key] = img
-            if len(self.image_cache) > self.cache_size:
-                self.image_cache.popitem(last=False)
+        img = self.image_cache.get_full(key)
+        if img is None and self.load_into_cache(key) is not None:
+            img = self.image_cache.get_full(key)
         return img
 
-    # 新增：预加载附近图像
-    def preload_images(self, center, radius=3):
+    def get_display_image(self, path):
+        """获取显示分辨率图像，返回 (图像, 原图尺寸 (h, w))，读取失败返回 None"""
+        key = str(path)
+        entry = self.image_cache.get_display(key)
+        if entry is None:
+            entry = self.load_into_cache(key)
+        return entry
+
+    def load_into_cache(self, key):
+        """同步解码并写入缓存，返回显示条目"""
+        fut = self.prefetch_futures.pop((key, 'full'), None)
+        if fut is not None and not fut.cancel():
+            # 已在后台解码中，直接等待该结果，避免重复读取
+            img, display, shape = fut.result()
+        else:
+            img, display, shape = decode_for_view(key, self.image_cache.display_max_side)
+        if display is None:
+            return None
+        self.last_full_side = max(shape)
+        return self.image_cache.put(key, img, display, shape)
+
+    def preview_reduction(self):
+        """根据画布尺寸与最近一张原图尺寸选择预览缩小解码倍数"""
+        widget = self.canvas.get_tk_widget()
+        target_side = max(widget.winfo_width(), widget.winfo_height())
+        return choose_reduction(self.last_full_side, target_side)
+
+    # 新增：后台预取相邻图像
+    def schedule_prefetch(self, center, include_center=False, ahead=None, behind=None, preview=False):
+        """按浏览方向预取相邻图像，并取消不再需要的旧请求
+        preview=True 时使用缩小解码，仅供拖动预览"""
+        if not self.image_list:
+            return
+        ahead = self.prefetch_ahead if ahead is None else ahead
+        behind = self.prefetch_behind if behind is None else behind
+        kind = 'preview' if preview else 'full'
+        # 按浏览顺序（可能是子集）取相邻图像
+        d = self.nav_direction
+        pos = self.nav_position(center)
+        order = [pos] if include_center else []
+        order += [pos + d * k for k in range(1, ahead + 1)]
+        order += [pos - d * k for k in range(1, behind + 1)]
+        count = self.nav_count()
+        wanted = [(str(self.image_list[self.nav_index(p)]), kind) for p in order if 0 <= p < count]
+        wanted_set = set(wanted)
+        # 取消过期请求（尚未开始的请求会被真正取消）
+        for task, fut in list(self.prefetch_futures.items()):
+            if task not in wanted_set and task[1] != 'pyramid' and fut.cancel():
+                del self.prefetch_futures[task]
+        factor = self.preview_reduction() if preview else 1
+        # 按优先级顺序提交（线程池先进先出）
+        for task in wanted:
+            key = task[0]
+            if task in self.prefetch_futures or key in self.image_cache:
+                continue
+            if preview:
+                if key in self.image_cache.preview:
+                    continue
+                fut = self.prefetch_executor.submit(decode_preview, key, factor, True)
+            else:
+                # 相邻的超大图像只读取已生成的金字塔，不在预取中生成
+                fut = self.prefetch_executor.submit(decode_for_view, key, self.image_cache.display_max_side,
+                                                    False)
+            fut.add_done_callback(lambda f, t=task: self.prefetch_results.put((t, f)))
+            self.prefetch_futures[task] = fut
+        if self.prefetch_futures and self.prefetch_poll_id is None:
+            self.prefetch_poll_id = self.root.after(10, self.drain_prefetch_results)
+
+    def request_pyramid(self, key):
+        """在单线程的金字塔线程池中为当前图像生成瓦片金字塔，结果与预取结果一起收取"""
+        task = (key, 'pyramid')
+        if task in self.prefetch_futures:
+            return
+        fut = self.pyramid_executor.submit(decode_for_view, key, self.image_cache.display_max_side)
+        fut.add_done_callback(lambda f: self.prefetch_results.put((task, f)))
+        self.prefetch_futures[task] = fut
+        if self.prefetch_poll_id is None:
+            self.prefetch_poll_id = self.root.after(10, self.drain_prefetch_results)
+
+    def drain_prefetch_results(self):
+        """在界面线程中收取后台解码结果并写入缓存"""
+        self.prefetch_poll_id = None
+        current_key = str(self.image_list[self.current_index]) if self.image_list else None
+        show_current = False
+        while True:
+            try:
+                task, fut = self.prefetch_results.get_nowait()
+            except queue.Empty:
+                break
+            if self.prefetch_futures.get(task) is fut:
+                del self.prefetch_futures[task]
+            if fut.cancelled() or fut.exception() is not None:
+                continue
+            key, kind = task
+            if kind == 'preview':
+                img, shape = fut.result()
+                if img is None:
+                    continue
+                self.image_cache.put_preview(key, img, shape)
+            else:
+                img, display, shape = fut.result()
+                if display is None:
+                    # 读取失败也要结束等待（当前帧将显示为无法读取）
+                    show_current = show_current or (key == current_key and self.waiting_for_current)
+                    continue
+                if key not in self.image_cache:
+                    self.image_cache.put(key, img, display, shape)
+                    self.last_full_side = max(shape)
+            if key == current_key and self.waiting_for_current:
+                show_current = True
+        if show_current:
+            self.waiting_for_current = False
+            self.update_display(fast=self.scale_dragging)
+        if self.prefetch_futures:
+            self.prefetch_poll_id = self.root.after(10, self.drain_prefetch_results)
+
+    def on_close(self):
+        """关闭窗口时停止后台任务"""
+        self.prefetch_executor.shutdown(wait=False, cancel_futures=True)
+        self.pyramid_executor.shutdown(wait=False, cancel_futures=True)
+        self.tile_executor.shutdown(wait=False, cancel_futures=True)
+        self.stop_watching()
+        if self.thumbnail_grid is not None:
+            self.thumbnail_grid.close()
+        self.root.destroy()
+
+    # 新增：浏览子集导航
+    def nav_count(self):
+        """当前可浏览的图像数量"""
+        return len(self.view_indices) if self.view_indices is not None else len(self.image_list)
+
+    def nav_index(self, pos):
+        """浏览位置 -> image_list 下标"""
+        return int(self.view_indices[pos]) if self.view_indices is not None else pos
+
+    def nav_position(self, index=None):
+        """image_list 下标 -> 浏览位置（不在子集中时取最近的位置）"""
+        index = self.current_index if index is None else index
+        if self.view_indices is None:
+            return index
+        if self.view_sorted is not None:
+            # 按给定顺序浏览：在升序副本中查找，再映射回浏览位置
+            order, ascending = self.view_sorted
+            pos = int(np.searchsorted(ascending, index))
+            return int(order[max(0, min(len(order) - 1, pos))])
+        pos = int(np.searchsorted(self.view_indices, index))
+        return max(0, min(len(self.view_indices) - 1, pos))
+
+    def update_nav_widgets(self):
+        """同步滑块范围、位置和计数显示"""
+        count = self.nav_count()
+        self.index_scale.config(from_=0, to=max(0, count - 1))
+        pos = self.nav_position()
+        self.index_var.set(pos)
+        self.scale_value_label.config(text=f"{pos + 1 if count else 0}/{count}")
+        if self.view_indices is None:
+            self.view_label.config(text="浏览: 全部图像")
+        else:
+            self.view_label.config(text=f"浏览: {self.view_description} ({count} 张)")
+
+    def set_view(self, indices, description=None, ordered=False):
+        """只浏览 image_list 的一个子集（indices 为下标），None 恢复全部
+
+        ordered 为 True 时按 indices 给定的顺序浏览（如按错误数排序），并从第一张开始。
+        """
+        if indices is not None:
+            indices = np.asarray(indices, dtype=np.int64)
+            if ordered:
+                _, first = np.unique(indices, return_index=True)
+                indices = indices[np.sort(first)]
+            else:
+                indices = np.unique(indices)
+            if len(indices) == 0:
+                messagebox.showinfo("提示", "没有符合条件的图像")
+                return
+        self.view_indices = indices
+        self.view_sorted = self.sorted_view(indices) if ordered else None
+        self.view_description = description or "子集"
+        if not self.image_list:
+            return
+        if ordered:
+            self.current_index = self.nav_index(0)
+        else:
+            # 当前图像不在子集中时移到最近的子集图像
+            self.current_index = self.nav_index(self.nav_position())
+        self.update_nav_widgets()
+        self.update_display(fast=False)
+
+    @staticmethod
+    def sorted_view(indices):
+        """按给定顺序浏览时的反查表 (argsort, 升序下标)"""
+        if indices is None:
+            return None
+        order = np.argsort(indices, kind='stable')
+        return order, indices[order]
+
+    def show_thumbnail_grid(self):
+        """以缩略图网格浏览当前子集，单击缩略图回到主视图"""
         if not self.image_list:
+            messagebox.showwarning("警告", "请先选择图像文件夹")
             return
-        for i in range(center - radius, center + radius + 1):
-            if 0 <= i < len(self.image_list):
-                p = self.image_list[i]
-                if str(p) not in self.image_cache:
-                    self.get_cached_image(p)
+        if self.thumbnail_grid is not None:
+            self.thumbnail_grid.close()
+        self.thumbnail_grid = ThumbnailGrid(self)
+
+    def in_view(self, index):
+        """image_list 下标是否在当前浏览子集中"""
+        return self.view_indices is None or self.nav_index(self.nav_position(index)) == index
+
+    def go_to_index(self, index):
+        """跳转到 image_list 的指定下标（不在当前子集中时恢复全部）"""
+        if not self.in_view(index):
+            self.view_indices = None
+        self.current_index = index
+        self.update_nav_widgets()
+        self.update_display(fast=False)
 
     # 新增：开始拖动
     def on_scale_press(self):
@@ -470,16 +4951,18 @@ class AnnotationVisualizer:
     def on_scale_move(self, val):
         if not self.image_list:
             return
-        idx = int(float(val) + 0.5)
-        idx = max(0, min(len(self.image_list) - 1, idx))
+        pos = int(float(val) + 0.5)
+        pos = max(0, min(self.nav_count() - 1, pos))
+        idx = self.nav_index(pos)
         if idx == self.current_index:
             return
+        self.nav_direction = 1 if idx > self.current_index else -1
         self.current_index = idx
-        self.scale_value_label.config(text=f"{self.current_index+1}/{len(self.image_list)}")
+        self.scale_value_label.config(text=f"{pos+1}/{self.nav_count()}")
         # 拖动中：快速预览（限制频率）
         if self.scale_dragging:
             now = time.time()
-            if now - self.last_preview_time >= 0.05:  # 20 FPS 左右
+            if now - self.last_preview_time >= 0.03:  # 30 FPS 左右（预览为缩小解码）
                 self.last_preview_time = now
                 self.update_display(fast=True)
         else:
@@ -492,118 +4975,1014 @@ class AnnotationVisualizer:
     def step_index(self, delta):
         if not self.image_list:
             return
-        new_idx = max(0, min(len(self.image_list) - 1, self.current_index + delta))
+        new_pos = max(0, min(self.nav_count() - 1, self.nav_position() + delta))
+        new_idx = self.nav_index(new_pos)
         if new_idx != self.current_index:
+            self.nav_direction = 1 if delta > 0 else -1
             self.current_index = new_idx
-            self.index_var.set(self.current_index)
+            self.index_var.set(new_pos)
             self.update_display(fast=False)
 
     # 修改：update_display 支持 fast 模式
     def update_display(self, fast=False):
         """更新显示
         fast=True 时仅显示图像（不绘制标注）以提高拖动流畅度"""
+        PROFILER.begin_frame()
+        try:
+            with PROFILER.stage('frame_preview' if fast else 'frame'):
+                drawn = self.render_frame(fast)
+        finally:
+            PROFILER.end_frame()
+        if drawn and self.show_hud_var.get():
+            # 绘制耗时在帧结束后才知道：用本帧的完整分解刷新浮层
+            self.update_hud()
+            if not fast:
+                self.renderer.blit()
+
+    def render_frame(self, fast):
+        """update_display 的实际绘制（整帧计时在外层）"""
         if not self.image_list or not hasattr(self, 'label_folder'):
             return
         current_image = self.image_list[self.current_index]
-        image = self.get_cached_image(current_image)
-        if image is None:
-            self.ax.clear()
+        if fast:
+            # 拖动中：使用缩小解码的预览图，当前帧未就绪时交给后台解码，完成后再绘制
+            entry = self.image_cache.get_preview(str(current_image))
+            self.schedule_prefetch(self.current_index, include_center=entry is None,
+                                   ahead=2, behind=0, preview=True)
+            if entry is None:
+                self.waiting_for_current = True
+                self.scale_value_label.config(text=f"{self.nav_position()+1}/{self.nav_count()}")
+                return
+        else:
+            key = str(current_image)
+            building = (key, 'pyramid') in self.prefetch_futures
+            if (key not in self.image_cache and (building or key not in self.pyramid_requests)
+                    and wants_tile_pyramid(key) and self.get_pyramid(key) is None):
+                # 超大图像首次打开：在后台生成瓦片金字塔，完成后再显示（失败时不再重复请求）
+                self.pyramid_requests.add(key)
+                self.request_pyramid(key)
+                self.schedule_prefetch(self.current_index)
+                self.waiting_for_current = True
+                self.ax.set_title(f"{current_image.name}: 正在生成瓦片金字塔...")
+                self.canvas.draw_idle()
+                self.pending_update = None
+                return
+            entry = self.get_display_image(current_image)
+        self.waiting_for_current = False
+        if entry is None:
+            self.current_entry = None
+            self.current_annotations = YoloAnnotations.empty()
+            self.tile_view = None
+            self.renderer.hide_image()
+            self.renderer.clear_annotations()
             self.ax.set_title("无法读取图像")
-            self.ax.axis('off')
             self.canvas.draw()
             self.pending_update = None
-            return        # 预加载相邻
-        self.preload_images(self.current_index)
-        h, w = image.shape[:2]
-        self.ax.clear()
-        # 将BGR转换为RGB用于matplotlib显示
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        self.ax.imshow(image_rgb)
-        self.ax.set_title(f"{current_image.name} ({self.current_index + 1}/{len(self.image_list)})" + (" [预览]" if fast else ""))
-        self.ax.axis('off')
-        annotations = []
+            return
+        # 后台预取相邻
+        if not fast:
+            self.schedule_prefetch(self.current_index)
+        # 显示分辨率副本按原图尺寸铺放，标注仍使用原图像素坐标
+        image, (h, w) = entry
+        annotations = YoloAnnotations.empty()
         if not fast:
-            label_path = Path(self.label_folder) / f"{current_image.stem}.txt"  # 修复未定义
-            annotations = self.read_yolo_annotations(label_path)
-            for ann in annotations:
-                class_id = ann['class_id']
-                color = np.array(self.colors[class_id % len(self.colors)]) / 255.0
-                label = self.label_map.get(class_id, f"class_{class_id}")
-                if ann['type'] == 'bbox' and self.show_boxes_var.get():
-                    x_center, y_center = ann['x_center'] * w, ann['y_center'] * h
-                    width, height = ann['width'] * w, ann['height'] * h
-                    x1 = x_center - width / 2
-                    y1 = y_center - height / 2
-                    rect = plt.Rectangle((x1, y1), width, height, linewidth=2, edgecolor=color, facecolor='none')
-                    self.ax.add_patch(rect)
-                    if self.show_labels_var.get():
-                        self.ax.text(x1, y1 - 5, label, color=color, fontsize=10,
-                                     bbox=dict(boxstyle="round,pad=0.3", facecolor='white', alpha=0.7))
-                elif ann['type'] == 'segment' and self.show_segments_var.get():
-                    points = ann['points']
-                    pixel_points = [(x * w, y * h) for x, y in points]
-                    if len(pixel_points) >= 3:
-                        polygon = plt.Polygon(pixel_points, closed=True,
-                                              facecolor=color, alpha=self.alpha,
-                                              edgecolor=color, linewidth=2)
-                        self.ax.add_patch(polygon)
-                        if self.show_labels_var.get() and pixel_points:
-                            x, y = pixel_points[0]
-                            self.ax.text(x, y - 5, label, color=color, fontsize=10,
-                                         bbox=dict(boxstyle="round,pad=0.3", facecolor='white', alpha=0.7))
+            annotations = self.get_annotations(current_image)
+        self.current_entry = entry
+        self.current_annotations = annotations
+        self.visible_annotations = annotations
+        self.visible_selection = None
+        self.detail_state = None
+        self.tile_view = self.get_pyramid(str(current_image)) if not fast and max(h, w) >= TILE_MIN_SIDE else None
+        use_opencv = not fast and self.opencv_backend_active()
+        # 缓存中已是 RGB，matplotlib 直接显示
+        image_rgb = self.compose_opencv_frame() if use_opencv else image
+        with PROFILER.stage('artists'):
+            if self.renderer.set_image(image_rgb, (h, w)):
+                self.toolbar.update()  # 尺寸变化时清空缩放历史
+            self.ax.set_title(f"{current_image.name} ({self.current_index + 1}/{len(self.image_list)})" + (" [预览]" if fast else ""))
+            if not fast:
+                comparing = self.compare_active()
+                self.renderer.set_annotations(YoloAnnotations.empty() if use_opencv or comparing else annotations,
+                                              w, h, self.label_map, self.colors)
+                self.update_comparison(current_image, w, h)
+        # 拖动预览时隐藏标注；OpenCV 后端的标注已合成进图像
+        self.renderer.show_annotations = not fast and not use_opencv
+        self.apply_display_options()
         # 信息标签
         if fast:
             info_text = f"图像: {current_image.name}\n快速预览中..."
         else:
-            num_annotations = len(annotations)
-            bbox_count = sum(1 for ann in annotations if ann['type'] == 'bbox')
-            segment_count = sum(1 for ann in annotations if ann['type'] == 'segment')
-            info_text = (f"图像: {current_image.name}\n总标注: {num_annotations}\n"
-                         f"检测框: {bbox_count}, 分割: {segment_count}")
+            info_text = self.image_info_text()
         self.image_info_label.config(text=info_text)
-        self.canvas.draw()
+        self.update_hud()
+        if fast:
+            self.canvas.draw_idle()  # 拖动中合并重绘请求
+        else:
+            with PROFILER.stage('draw'):
+                self.canvas.draw()
         if hasattr(self, 'scale_value_label'):
-            self.scale_value_label.config(text=f"{self.current_index+1}/{len(self.image_list)}")
+            self.scale_value_label.config(text=f"{self.nav_position()+1}/{self.nav_count()}")
         if not fast:
             self.pending_update = None
+        return True
+
+    HUD_STAGES = (('read', '读取'), ('imdecode', '解码'), ('resize', '缩放'), ('labels', '标注'),
+                  ('cvtColor', '转换'), ('compose', '合成'), ('artists', '对象'), ('draw', '绘制'),
+                  ('tile_decode', '瓦片'))
+
+    def update_hud(self):
+        """刷新性能浮层：上一帧总耗时与该帧在界面线程上的各阶段耗时、滚动平均、缓存命中率"""
+        if not self.show_hud_var.get():
+            self.renderer.set_hud(None)
+            return
+        frames = PROFILER.samples.get('frame')
+        if frames:
+            recent = np.array(frames) * 1000
+            lines = [f"上一帧 {recent[-1]:6.1f} ms  平均 {recent.mean():6.1f}  p90 {np.percentile(recent, 90):6.1f}"]
+        else:
+            lines = ["上一帧     -"]
+        # 只显示本帧记录的阶段：缓存命中时没有读取/解码，后台预取的耗时也不计入
+        frame_ms = PROFILER.frame_ms
+        stages = [f"{label} {frame_ms[name]:.1f}" for name, label in self.HUD_STAGES if name in frame_ms]
+        if stages:
+            lines.append("  ".join(stages))
+        cache = self.image_cache
+        total = cache.hits + cache.misses
+        lines.append(f"缓存命中 {cache.hits / total * 100 if total else 0:.0f}% ({cache.hits}/{total})")
+        self.renderer.set_hud("\n".join(lines))
+
+    def toggle_hud(self):
+        self.update_hud()
+        self.renderer.blit()
+
+    def export_profile(self):
+        """导出计时数据：统计 JSON（分位数与直方图），文件名以 .trace.json 结尾时导出 Chrome trace"""
+        file_path = filedialog.asksaveasfilename(
+            title="导出计时（文件名以 .trace.json 结尾时导出 Chrome trace）",
+            defaultextension=".json",
+            filetypes=[("统计 JSON", "*.json"), ("Chrome trace", "*.trace.json")])
+        if not file_path:
+            return
+        try:
+            if file_path.endswith('.trace.json'):
+                PROFILER.export_chrome_trace(file_path)
+            else:
+                PROFILER.export_json(file_path, extra={
+                    'dataset': {'image_folder': getattr(self, 'image_folder', None),
+                                'images': len(self.image_list),
+                                'render_backend': self.render_backend_var.get()},
+                    'cache': {'hits': self.image_cache.hits, 'misses': self.image_cache.misses,
+                              'evictions': self.image_cache.evictions},
+                })
+            messagebox.showinfo("成功", f"计时数据已导出到:\n{file_path}")
+        except OSError as e:
+            messagebox.showerror("错误", f"导出失败: {str(e)}")
+
+    # 新增：超大图像瓦片显示与视野裁剪
+    def get_pyramid(self, key):
+        """取回已打开的瓦片金字塔，未打开时从磁盘缓存打开，尚未生成返回 None"""
+        pyramid = self.pyramids.get(key)
+        if pyramid is not None:
+            self.pyramids.move_to_end(key)
+            return pyramid
+        pyramid = TilePyramid.open(key)
+        if pyramid is not None:
+            self.pyramids[key] = pyramid
+            while len(self.pyramids) > 8:
+                self.pyramids.popitem(last=False)
+        return pyramid
+
+    def image_info_text(self):
+        """当前图像的信息标签文字"""
+        annotations = self.current_annotations
+        _, (h, w) = self.current_entry
+        info_text = (f"图像: {self.image_list[self.current_index].name}\n总标注: {len(annotations)}\n"
+                     f"检测框: {annotations.num_boxes}, 分割: {annotations.num_segments}\n"
+                     f"{self.image_cache.stats_text()}")
+        if self.tile_view is not None:
+            info_text += f"\n瓦片显示: {w}x{h}, {len(self.tile_view.levels)} 层"
+        if self.current_comparison is not None:
+            info_text += "\n预测: TP {} / FP {} / FN {}".format(*self.current_comparison)
+        return info_text
+
+    def opencv_backend_active(self):
+        """是否使用 OpenCV 合成标注（瓦片显示的图像和预测对比始终用 Matplotlib 标注）"""
+        return (self.render_backend_var.get() == 'opencv' and self.tile_view is None
+                and not self.compare_active())
+
+    # 新增：预测对比
+    def compare_active(self):
+        """是否显示预测与真值的对比（已选择预测文件夹且勾选了对比）"""
+        return self.pred_folder is not None and self.compare_var.get()
+
+    def compare_settings(self):
+        """对比参数 (IoU 阈值, 置信度阈值, 匹配方式)，输入无效时使用默认值"""
+        try:
+            iou = min(1.0, max(0.0, float(self.pred_iou_var.get())))
+        except ValueError:
+            iou = 0.5
+        try:
+            conf = min(1.0, max(0.0, float(self.pred_conf_var.get())))
+        except ValueError:
+            conf = 0.25
+        return iou, conf, self.match_method_var.get()
+
+    def update_comparison(self, image_path, w, h):
+        """按当前参数匹配预测与真值，TP / FP / FN 以不同线型交给渲染器，返回是否处于对比模式"""
+        if not self.compare_active():
+            self.current_comparison = None
+            self.renderer.set_comparison(None)
+            return False
+        gt = self.current_annotations
+        pred, scores = self.get_predictions(image_path)
+        iou, conf, method = self.compare_settings()
+        with PROFILER.stage('compare'):
+            keep, match, missed = compare_predictions(gt, pred, scores, iou, conf, method)
+
+        def outlines(annotations):
+            # 顺序同 annotation_boxes：先检测框，后多边形
+            return list(annotations.box_corners(w, h)) + [pts * (w, h) for pts in annotations.segments()]
+
+        pred_verts, gt_verts = outlines(pred), outlines(gt)
+        pred_classes, gt_classes = annotation_boxes(pred)[0], annotation_boxes(gt)[0]
+        groups = {'tp': [], 'fp': [], 'fn': []}
+        labels = []
+        for p, matched in zip(keep, match):
+            kind = 'tp' if matched >= 0 else 'fp'
+            verts = pred_verts[p]
+            groups[kind].append(verts)
+            name = self.label_map.get(int(pred_classes[p]), f"class_{pred_classes[p]}")
+            labels.append(('compare', f"{name} {scores[p]:.2f}", verts[0][0], verts[0][1] - 5,
+                           np.array(COMPARE_STYLES[kind][1]) / 255.0))
+        for g in np.flatnonzero(missed):
+            verts = gt_verts[g]
+            groups['fn'].append(verts)
+            name = self.label_map.get(int(gt_classes[g]), f"class_{gt_classes[g]}")
+            labels.append(('compare', f"{name} 漏检", verts[0][0], verts[0][1] - 5,
+                           np.array(COMPARE_STYLES['fn'][1]) / 255.0))
+        self.renderer.set_comparison(groups, labels)
+        self.current_comparison = tuple(len(groups[k]) for k in ('tp', 'fp', 'fn'))
+        return True
+
+    def on_viewport_changed(self, ax):
+        """视野变化（平移、缩放、切换图像）：节流后更新细节层与可见标注"""
+        if self.viewport_update_id is None:
+            self.viewport_update_id = self.root.after(30, self.update_viewport)
+
+    def update_viewport(self):
+        """按当前视野加载瓦片、裁剪标注，有变化时重绘"""
+        self.viewport_update_id = None
+        if self.current_entry is None or self.scale_dragging:
+            return
+        x0, x1 = sorted(self.ax.get_xlim())
+        y0, y1 = sorted(self.ax.get_ylim())
+        changed = self.update_detail_layer(x0, y0, x1, y1)
+        changed = self.cull_annotations(x0, y0, x1, y1) or changed
+        if changed:
+            self.canvas.draw_idle()
+
+    def update_detail_layer(self, x0, y0, x1, y1):
+        """放大超大图像时用视野内的瓦片拼图覆盖显示副本，返回是否需要重绘"""
+        pyramid = self.tile_view
+        if pyramid is None:
+            return False
+        bbox = self.ax.bbox
+        scale = max((x1 - x0) / max(bbox.width, 1), (y1 - y0) / max(bbox.height, 1))
+        top = pyramid.overview_level(self.image_cache.display_max_side)
+        level = pyramid.level_for(scale, top)
+        if level >= top:
+            # 显示副本的分辨率已足够
+            self.request_tiles(pyramid, [])
+            if self.detail_state is None:
+                return False
+            self.detail_state = None
+            self.renderer.hide_detail()
+            return True
+        c0, r0, c1, r1 = pyramid.tile_range(level, x0, y0, x1, y1)
+        tiles, missing = {}, []
+        for row in range(r0, r1):
+            for col in range(c0, c1):
+                tile = self.tile_cache.get((pyramid.key, level, row, col))
+                if tile is None:
+                    missing.append((pyramid.key, level, row, col))
+                else:
+                    tiles[(row, col)] = tile
+        # 从视野中心向外加载
+        cc, cr = (c0 + c1 - 1) / 2, (r0 + r1 - 1) / 2
+        missing.sort(key=lambda k: (k[3] - cc) ** 2 + (k[2] - cr) ** 2)
+        self.request_tiles(pyramid, missing)
+        state = (pyramid.key, level, (c0, r0, c1, r1), len(tiles))
+        if state == self.detail_state:
+            return False
+        self.detail_state = state
+        with PROFILER.stage('tile_upload'):
+            self.renderer.set_detail(pyramid.assemble(level, c0, r0, c1, r1, tiles),
+                                     pyramid.region_extent(level, c0, r0, c1, r1))
+        return True
+
+    def request_tiles(self, pyramid, keys):
+        """在后台解码瓦片，并取消视野外尚未开始的请求"""
+        wanted = set(keys)
+        for key, fut in list(self.tile_futures.items()):
+            if key not in wanted and fut.cancel():
+                del self.tile_futures[key]
+        for key in keys:
+            if key in self.tile_futures:
+                continue
+            _, level, row, col = key
+            fut = self.tile_executor.submit(pyramid.read_tile, level, row, col)
+            fut.add_done_callback(lambda f, k=key: self.tile_results.put((k, f)))
+            self.tile_futures[key] = fut
+        if self.tile_futures and self.tile_poll_id is None:
+            self.tile_poll_id = self.root.after(15, self.drain_tile_results)
+
+    def drain_tile_results(self):
+        """在界面线程中收取解码完成的瓦片，有新瓦片时刷新细节层"""
+        self.tile_poll_id = None
+        arrived = False
+        while True:
+            try:
+                key, fut = self.tile_results.get_nowait()
+            except queue.Empty:
+                break
+            if self.tile_futures.get(key) is fut:
+                del self.tile_futures[key]
+            if fut.cancelled() or fut.exception() is not None or fut.result() is None:
+                continue
+            self.tile_cache.put(key, fut.result())
+            arrived = True
+        if arrived:
+            self.on_viewport_changed(self.ax)
+        if self.tile_futures:
+            self.tile_poll_id = self.root.after(15, self.drain_tile_results)
+
+    def cull_annotations(self, x0, y0, x1, y1):
+        """超大图像或标注很多时只把视野附近的标注交给渲染器，返回是否需要重绘"""
+        annotations = self.current_annotations
+        if not self.renderer.show_annotations or self.compare_active() or (
+                self.tile_view is None and len(annotations) < CULL_MIN_ANNOTATIONS):
+            return False
+        _, (h, w) = self.current_entry
+        if self.annotation_grid is None or self.annotation_grid[:3] != (annotations, w, h):
+            with PROFILER.stage('cull_index'):
+                self.annotation_grid = (annotations, w, h, AnnotationGrid(annotations, w, h))
+        # 四周各留半个视野的边距，平移时标注不会突然出现
+        mx, my = (x1 - x0) / 2, (y1 - y0) / 2
+        x0, y0, x1, y1 = x0 - mx, y0 - my, x1 + mx, y1 + my
+        selection = None
+        if x0 > 0 or y0 > 0 or x1 < w or y1 < h:
+            selection = self.annotation_grid[3].query(x0, y0, x1, y1)
+        old = self.visible_selection
+        if (selection is None and old is None) or (
+                selection is not None and old is not None
+                and all(np.array_equal(a, b) for a, b in zip(selection, old))):
+            return False
+        self.visible_selection = selection
+        self.visible_annotations = annotations if selection is None else annotations.take(*selection)
+        self.renderer.set_annotations(self.visible_annotations, w, h, self.label_map, self.colors)
+        self.apply_display_options()
+        return True
+
+    def apply_display_options(self):
+        """将显示选项同步到渲染器"""
+        self.renderer.apply_options(self.show_boxes_var.get(), self.show_segments_var.get(),
+                                    self.show_labels_var.get(), self.alpha)
+
+    def compose_opencv_frame(self):
+        """OpenCV 后端：在显示副本上一次性合成全部标注，返回 RGB 图像"""
+        image, _ = self.current_entry
+        # 缓存图像为 RGB：颜色按通道互换后传入（函数内部按 BGR 解释），结果直接是 RGB
+        colors = [(b, g, r) for r, g, b in self.colors]
+        with PROFILER.stage('compose'):
+            return draw_annotations_cv2(image, self.current_annotations, self.label_map, colors,
+                                        self.show_boxes_var.get(), self.show_segments_var.get(),
+                                        self.show_labels_var.get(), self.alpha, thin_labels=True)
+
+    def refresh_overlay(self):
+        """仅显示选项变化：修改标注属性后 blit 重绘，不重新读取图像与标注"""
+        if not self.image_list or not hasattr(self, 'label_folder'):
+            return
+        if self.opencv_backend_active() and self.current_entry is not None:
+            # 重新合成覆盖层（仅内存中的图像与标注）
+            self.renderer.image_artist.set_data(self.compose_opencv_frame())
+            self.canvas.draw_idle()
+            return
+        self.apply_display_options()
+        self.renderer.blit()
+
+    def refresh_annotations(self):
+        """标签映射或渲染后端变化：用内存中的当前帧重建标注，不重新读取图像与标签文件"""
+        if self.pending_update is not None or self.scale_dragging or self.waiting_for_current:
+            return   # 即将整帧重绘，届时使用新的设置
+        if self.current_entry is None:
+            self.update_display()
+            return
+        image, (h, w) = self.current_entry
+        use_opencv = self.opencv_backend_active()
+        comparing = self.compare_active()
+        if not use_opencv and self.renderer.show_annotations:
+            # Matplotlib 后端下只有标注对象变化，blit 即可
+            if comparing:
+                self.visible_annotations = self.current_annotations
+                self.visible_selection = None
+            self.renderer.set_annotations(YoloAnnotations.empty() if comparing else self.visible_annotations,
+                                          w, h, self.label_map, self.colors)
+            self.update_comparison(self.image_list[self.current_index], w, h)
+            self.image_info_label.config(text=self.image_info_text())
+            self.refresh_overlay()
+            self.on_viewport_changed(self.ax)
+            return
+        # 切换后端或 OpenCV 合成：只替换图像数据，保留当前缩放视野
+        self.renderer.image_artist.set_data(self.compose_opencv_frame() if use_opencv else image)
+        self.visible_annotations = self.current_annotations
+        self.visible_selection = None
+        self.renderer.set_annotations(YoloAnnotations.empty() if use_opencv or comparing else self.current_annotations,
+                                      w, h, self.label_map, self.colors)
+        self.update_comparison(self.image_list[self.current_index], w, h)
+        self.image_info_label.config(text=self.image_info_text())
+        self.renderer.show_annotations = not use_opencv
+        self.apply_display_options()
+        with PROFILER.stage('draw'):
+            self.canvas.draw()
+        self.on_viewport_changed(self.ax)
 
     # 新增：更新透明度回调
     def update_alpha(self, val=None):
         self.alpha = self.alpha_var.get()
-        # 非快速模式更新
-        self.update_display(fast=False)
+        self.refresh_overlay()
+
+    def get_annotations(self, image_path):
+        """图像对应的标注：解析结果按标签文件 size/mtime 缓存，文件未变化时只 stat 不重新读取"""
+        return self.cached_label_file(self.label_path_for(image_path), self.read_yolo_annotations)
+
+    def get_predictions(self, image_path):
+        """图像对应的预测 (标注, 置信度)，缓存方式同 get_annotations"""
+        pred_path = label_path_for(self.pred_folder, label_key(image_path, self.image_root))
+        return self.cached_label_file(pred_path, parse_predictions)
+
+    def cached_label_file(self, label_path, parse):
+        """按文件 size/mtime 缓存 parse(label_path) 的结果（LRU）"""
+        key = str(label_path)
+        try:
+            st = dataset_stat(label_path)
+            stamp = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            stamp = None
+        cached = self.annotation_cache.get(key)
+        if cached is not None and cached[0] == stamp:
+            self.annotation_cache.move_to_end(key)
+            return cached[1]
+        with PROFILER.stage('labels'):
+            result = parse(label_path)
+        self.annotation_cache[key] = (stamp, result)
+        while len(self.annotation_cache) > self.annotation_cache_size:
+            self.annotation_cache.popitem(last=False)
+        return result
 
     def read_yolo_annotations(self, label_path):
-        """读取YOLO格式的标注"""
-        annotations = []
-        if not Path(label_path).exists():
-            return annotations
+        """读取YOLO格式的标注（索引有效时直接从索引读取）"""
+        index = self.annotation_index
+        if (index is not None and Path(index.label_folder) == Path(self.label_folder)
+                and index.recursive == (self.image_root is not None)):
+            annotations = index.lookup(label_path)
+            if annotations is not None:
+                return annotations
+        return parse_yolo_annotations(label_path)
+
+    def build_annotation_index(self):
+        """后台构建/更新当前标签文件夹的标注索引"""
+        if not hasattr(self, 'label_folder') or not dataset_is_dir(self.label_folder):
+            return
+        label_folder = self.label_folder
+        recursive = self.recursive_var.get()
+
+        def on_done(index, error):
+            if error is not None:
+                print(f"构建标注索引失败: {str(error)}")
+            elif getattr(self, 'label_folder', None) == label_folder and self.recursive_var.get() == recursive:
+                self.annotation_index = index
+
+        # 已有索引立即可用（逐文件读取时仍会校验 size/mtime），后台再增量更新
+        try:
+            self.annotation_index = AnnotationIndex.load(label_folder, recursive)
+        except Exception as e:
+            print(f"读取标注索引失败: {str(e)}")
+            self.annotation_index = None
+        self.run_in_background(lambda: AnnotationIndex.build(label_folder, recursive=recursive), on_done)
+
+    def apply_filter(self):
+        """按筛选表达式浏览子集：后台在标注索引上向量化求值，空表达式恢复全部"""
+        expression = self.filter_entry.get().strip()
+        if not expression:
+            self.filter_status.config(text="")
+            self.set_view(None)
+            return
+        if not self.image_list:
+            return
+        if not hasattr(self, 'label_folder') or not dataset_is_dir(self.label_folder):
+            messagebox.showwarning("警告", "请先选择标签文件夹")
+            return
+        try:
+            tree = AnnotationQuery.parse(expression)
+        except ValueError as e:
+            messagebox.showerror("筛选", str(e))
+            return
+        image_list, image_root, label_folder = self.image_list, self.image_root, self.label_folder
+        recursive = image_root is not None
+        index = self.annotation_index
+        if index is not None and (Path(index.label_folder) != Path(label_folder) or index.recursive != recursive):
+            index = None
+        need_sizes = AnnotationQuery.needs_sizes(tree)
+        self.filter_status.config(text="正在读取图像尺寸..." if need_sizes else "正在筛选...")
+        start = time.time()
+
+        def job():
+            idx = index or AnnotationIndex.build(label_folder, recursive=recursive)
+            cache = self.query_cache
+            if cache is not None and cache[0] is idx and cache[2] is image_list:
+                query, rows = cache[1], cache[3]
+            else:
+                query = AnnotationQuery(idx)
+                rows = query.rows_for(image_list, image_root)
+                self.query_cache = (idx, query, image_list, rows)
+            sizes = self.read_image_sizes(image_list) if need_sizes else None
+            return idx, query.evaluate(tree, rows, sizes)
+
+        def on_done(result, error):
+            if error is not None:
+                self.filter_status.config(text="")
+                messagebox.showerror("筛选", f"筛选失败: {str(error)}")
+                return
+            if self.image_list is not image_list:
+                return
+            idx, indices = result
+            if self.annotation_index is None and getattr(self, 'label_folder', None) == label_folder:
+                self.annotation_index = idx
+            self.filter_status.config(
+                text=f"{len(indices)}/{len(image_list)} 张符合, 耗时 {time.time() - start:.2f}s")
+            self.set_view(indices, f"筛选 {expression}")
+
+        self.run_in_background(job, on_done, poll_ms=30)
+
+    def read_image_sizes(self, image_list):
+        """读取全部图像尺寸（只读文件头，多线程，结果缓存），返回 (N, 2) 数组"""
+        sizes = self.image_sizes
+        todo = [p for p in image_list if p not in sizes]
+        if todo:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                for path, size in zip(todo, pool.map(read_image_size, todo)):
+                    sizes[path] = size
+        return np.array([sizes[p] for p in image_list], dtype=np.float64).reshape(-1, 2)
+
+    def show_dataset_stats(self):
+        """数据集统计窗口：后台增量解析（进程池），部分结果实时刷新图表"""
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        if not hasattr(self, 'label_folder') or not dataset_is_dir(self.label_folder):
+            messagebox.showwarning("警告", "请先选择标签文件夹")
+            return
+        label_folder = self.label_folder
+        recursive = self.recursive_var.get()
+        
+        window = tk.Toplevel(self.root)
+        window.title("数据集统计")
+        window.geometry("1200x800")
+        status_label = ttk.Label(window, text="正在扫描标签文件...")
+        status_label.pack(fill=tk.X, padx=10, pady=5)
+        fig = Figure(figsize=(12, 7), dpi=100)
+        canvas = FigureCanvasTkAgg(fig, window)
+        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        
+        # 后台线程只累加统计并放入队列，界面线程定时取最新快照绘图
+        updates = queue.SimpleQueue()
+        stats = DatasetStats()
+        cancel_event = threading.Event()
+        
+        def on_close():
+            cancel_event.set()
+            window.destroy()
+        window.protocol("WM_DELETE_WINDOW", on_close)
+        
+        def on_chunk(annotations, box_counts, seg_counts):
+            stats.add(annotations, box_counts, seg_counts)
+            updates.put(('partial', stats.copy()))
+            
+        def on_progress(done, total):
+            updates.put(('progress', (done, total)))
+            
+        def job():
+            return AnnotationIndex.build(label_folder, progress=on_progress, on_chunk=on_chunk,
+                                         recursive=recursive, cancel_event=cancel_event)
+            
+        state = {'finished': False, 'progress': None}
+        
+        def on_done(index, error):
+            state['finished'] = True
+            state['failed'] = error is not None
+            if error is not None:
+                if window.winfo_exists():
+                    status_label.config(text=f"统计失败: {str(error)}")
+            elif index is not None and getattr(self, 'label_folder', None) == label_folder and self.recursive_var.get() == recursive:
+                self.annotation_index = index
+                
+        def poll():
+            if not window.winfo_exists():
+                return
+            latest = None
+            while True:
+                try:
+                    kind, payload = updates.get_nowait()
+                except queue.Empty:
+                    break
+                if kind == 'partial':
+                    latest = payload
+                else:
+                    state['progress'] = payload
+            if latest is not None:
+                latest.plot(fig, self.label_map)
+                canvas.draw_idle()
+                state['latest'] = latest
+            if state['finished']:
+                if 'latest' in state:
+                    status_label.config(text=f"统计完成：共 {state['latest'].num_files} 个标签文件")
+                elif not state['failed']:
+                    # 没有任何标签文件时不会收到部分结果
+                    status_label.config(text=f"没有找到标签文件: {label_folder}")
+                return
+            if state['progress']:
+                done, total = state['progress']
+                status_label.config(text=f"正在解析变化的标签文件: {done}/{total}")
+            window.after(200, poll)
             
-        with open(label_path, 'r') as f:
-            for line in f:
-                parts = line.strip().split()
-                if len(parts) >= 5:
-                    class_id = int(parts[0])
-                    coords = [float(x) for x in parts[1:]]
-                    
-                    if len(coords) == 4:  # 检测框格式
-                        x_center, y_center, width, height = coords
-                        annotations.append({
-                            'type': 'bbox',
-                            'class_id': class_id,
-                            'x_center': x_center,
-                            'y_center': y_center,
-                            'width': width,
-                            'height': height
-                        })
-                    else:  # 分割格式
-                        points = [(coords[i], coords[i+1]) for i in range(0, len(coords), 2)]
-                        annotations.append({
-                            'type': 'segment',
-                            'class_id': class_id,
-                            'points': points
-                        })
-        return annotations
+        self.run_in_background(job, on_done)
+        window.after(200, poll)
+
+    def validate_labels(self):
+        """标签质量检查：后台多进程检查全部标签文件，结果表格可排序，单击打开对应图像"""
+        if not hasattr(self, 'label_folder') or not dataset_is_dir(self.label_folder):
+            messagebox.showwarning("警告", "请先选择标签文件夹")
+            return
+        label_folder = self.label_folder
+        recursive = self.image_root is not None
+        image_list, image_root = self.image_list, self.image_root
+        # 默认映射只是占位的 0~3，只有用户加载或编辑过标签映射时才检查未知类别
+        known_classes = set(self.label_map) if self.label_map_custom else None
+
+        window = tk.Toplevel(self.root)
+        window.title("标签检查")
+        window.geometry("900x600")
+        status_label = ttk.Label(window, text="正在扫描标签文件...")
+        status_label.pack(fill=tk.X, padx=10, pady=5)
+        table_frame = ttk.Frame(window)
+        table_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+        columns = ('file', 'line', 'kind', 'detail')
+        headings = {'file': "标签文件", 'line': "行", 'kind': "问题", 'detail': "说明"}
+        tree = ttk.Treeview(table_frame, columns=columns, show='headings')
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        for column, width in zip(columns, (260, 50, 140, 380)):
+            tree.column(column, width=width, anchor=tk.W, stretch=column == 'detail')
+
+        rows = []                                   # (标签键, 行号, 问题类型, 说明)
+        updates = queue.SimpleQueue()
+        cancel_event = threading.Event()
+        state = {'finished': False, 'progress': None, 'sort': None}
+        image_of_key = {}
+
+        def refill():
+            tree.delete(*tree.get_children())
+            for i, (key, line, kind, detail) in enumerate(rows):
+                tree.insert('', tk.END, iid=str(i), values=(f"{key}.txt", line, LABEL_ISSUES[kind], detail))
+
+        def sort_by(column):
+            # 再次点击同一列时倒序
+            reverse = state['sort'] == column
+            state['sort'] = None if reverse else column
+            pos = columns.index(column)
+            if column == 'file':
+                rows.sort(key=lambda r: (natural_key(r[0]), r[1]), reverse=reverse)
+            else:
+                rows.sort(key=lambda r: (r[pos], natural_key(r[0]), r[1]), reverse=reverse)
+            refill()
+
+        for column in columns:
+            tree.heading(column, text=headings[column], command=lambda c=column: sort_by(c))
+
+        def on_select(event):
+            selection = tree.selection()
+            if not selection or self.image_list is not image_list:
+                return
+            index = image_of_key.get(rows[int(selection[0])][0])
+            if index is None:
+                status_label.config(text=f"没有找到对应的图像: {rows[int(selection[0])][0]}")
+                return
+            self.go_to_index(index)
+        tree.bind('<<TreeviewSelect>>', on_select)
+
+        def on_close():
+            cancel_event.set()
+            window.destroy()
+        window.protocol("WM_DELETE_WINDOW", on_close)
+
+        def job():
+            image_of_key.update((label_key(p, image_root), i) for i, p in enumerate(image_list))
+            return run_label_validation(label_folder, recursive, known_classes,
+                                        progress=lambda done, total: updates.put(('progress', (done, total))),
+                                        on_issues=lambda issues: updates.put(('issues', issues)),
+                                        cancel_event=cancel_event)
+
+        def on_done(result, error):
+            state['finished'] = True
+            if error is not None and window.winfo_exists():
+                status_label.config(text=f"检查失败: {str(error)}")
+
+        def poll():
+            if not window.winfo_exists():
+                return
+            while True:
+                try:
+                    kind, payload = updates.get_nowait()
+                except queue.Empty:
+                    break
+                if kind == 'progress':
+                    state['progress'] = payload
+                else:
+                    start = len(rows)
+                    rows.extend(payload)
+                    for i, (key, line, issue, detail) in enumerate(payload, start):
+                        tree.insert('', tk.END, iid=str(i),
+                                    values=(f"{key}.txt", line, LABEL_ISSUES[issue], detail))
+            done, total = state['progress'] or (0, 0)
+            if state['finished']:
+                counts = {}
+                for row in rows:
+                    counts[row[2]] = counts.get(row[2], 0) + 1
+                summary = ", ".join(f"{LABEL_ISSUES[k]} {v}" for k, v in sorted(counts.items(), key=lambda kv: -kv[1]))
+                status_label.config(text=f"检查完成：{total} 个标签文件，{len(rows)} 个问题"
+                                         + (f"（{summary}）" if summary else ""))
+                return
+            status_label.config(text=f"正在检查: {done}/{total}，已发现 {len(rows)} 个问题")
+            window.after(200, poll)
+
+        self.run_in_background(job, on_done)
+        window.after(200, poll)
+
+    def find_duplicates(self, compare=False):
+        """感知哈希查找重复图像：当前列表内部，或与另一个文件夹之间（如 train 与 val）
+
+        哈希由进程池计算并缓存，多索引哈希查找近似重复；选择一组即只浏览该组图像。
+        """
+        if not self.image_list:
+            messagebox.showwarning("警告", "请先选择图像文件夹")
+            return
+        other_folder = None
+        if compare:
+            other_folder = filedialog.askdirectory(title="选择要比较的图像文件夹")
+            if not other_folder:
+                return
+        image_list, image_folder = self.image_list, self.image_folder
+        recursive = self.image_root is not None
+
+        window = tk.Toplevel(self.root)
+        window.title("重复图像" if other_folder is None else f"重复图像 - 与 {other_folder} 比较")
+        window.geometry("900x600")
+        top_frame = ttk.Frame(window)
+        top_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Label(top_frame, text="最大汉明距离:").pack(side=tk.LEFT)
+        distance_var = tk.IntVar(value=4)
+        ttk.Spinbox(top_frame, from_=0, to=12, width=4, textvariable=distance_var).pack(side=tk.LEFT, padx=4)
+        search_button = ttk.Button(top_frame, text="重新查找", state=tk.DISABLED)
+        search_button.pack(side=tk.LEFT)
+        view_all_button = ttk.Button(top_frame, text="浏览全部重复图像", state=tk.DISABLED)
+        view_all_button.pack(side=tk.LEFT, padx=4)
+        status_label = ttk.Label(window, text="正在计算感知哈希...")
+        status_label.pack(fill=tk.X, padx=10)
+        table_frame = ttk.Frame(window)
+        table_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(5, 10))
+        tree = ttk.Treeview(table_frame, columns=('group', 'count', 'names'), show='headings')
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        for column, text, width in (('group', "组", 60), ('count', "数量", 60), ('names', "图像", 700)):
+            tree.heading(column, text=text)
+            tree.column(column, width=width, anchor=tk.W, stretch=column == 'names')
+
+        progress = queue.SimpleQueue()
+        cancel_event = threading.Event()
+        state = {'finished': False, 'progress': None, 'clusters': []}
+
+        def job():
+            report = lambda done, total: progress.put((done, total))
+            hashes, valid = compute_image_hashes(image_list, image_folder, progress=report,
+                                                 cancel_event=cancel_event)
+            paths, groups = list(image_list), np.zeros(len(image_list), dtype=np.int64)
+            if other_folder is not None:
+                other = list_images(other_folder, recursive)
+                other_hashes, other_valid = compute_image_hashes(other, other_folder, progress=report,
+                                                                 cancel_event=cancel_event)
+                paths += other
+                hashes = np.concatenate([hashes, other_hashes])
+                valid = np.concatenate([valid, other_valid])
+                groups = np.concatenate([groups, np.ones(len(other), dtype=np.int64)])
+            return paths, hashes, valid, groups
+
+        def search(data):
+            paths, hashes, valid, groups = data
+            start = time.time()
+            rows = np.flatnonzero(valid)
+            try:
+                max_distance = max(0, min(12, distance_var.get()))
+            except tk.TclError:
+                max_distance = 4
+            clusters = [rows[c] for c in find_duplicate_clusters(
+                hashes[rows], max_distance, groups[rows] if other_folder is not None else None)]
+            state['clusters'] = clusters
+            tree.delete(*tree.get_children())
+            for k, members in enumerate(clusters):
+                names = [paths[m].name if groups[m] == 0 else f"[比较] {paths[m].name}" for m in members[:20]]
+                tree.insert('', tk.END, iid=str(k), values=(k + 1, len(members), ", ".join(names)))
+            duplicates = sum(len(c) for c in clusters)
+            status_label.config(text=f"{len(clusters)} 组重复，共 {duplicates} 张图像"
+                                     f"（{int(valid.sum())} 张有效，查找耗时 {time.time() - start:.2f}s）")
+
+        def in_list(members):
+            return [int(m) for m in members if m < len(image_list)]
+
+        def on_select(event):
+            selection = tree.selection()
+            if not selection or self.image_list is not image_list:
+                return
+            k = int(selection[0])
+            members = in_list(state['clusters'][k])
+            if members:
+                self.set_view(members, f"重复组 {k + 1}")
+
+        def view_all():
+            if self.image_list is image_list:
+                members = in_list(np.concatenate(state['clusters'])) if state['clusters'] else []
+                self.set_view(members, "重复图像")
+
+        tree.bind('<<TreeviewSelect>>', on_select)
+        view_all_button.config(command=view_all)
+
+        def on_close():
+            cancel_event.set()
+            window.destroy()
+        window.protocol("WM_DELETE_WINDOW", on_close)
+
+        def on_done(data, error):
+            state['finished'] = True
+            if not window.winfo_exists():
+                return
+            if error is not None:
+                status_label.config(text=f"计算哈希失败: {str(error)}")
+                return
+            search_button.config(state=tk.NORMAL, command=lambda: search(data))
+            view_all_button.config(state=tk.NORMAL)
+            search(data)
+
+        def poll():
+            if not window.winfo_exists() or state['finished']:
+                return
+            latest = None
+            while True:
+                try:
+                    latest = progress.get_nowait()
+                except queue.Empty:
+                    break
+            if latest is not None:
+                status_label.config(text=f"正在计算感知哈希: {latest[0]}/{latest[1]}")
+            window.after(200, poll)
+
+        self.run_in_background(job, on_done)
+        window.after(200, poll)
+
+    def evaluate_predictions(self):
+        """预测评估：后台多进程匹配全部图像的预测与真值，显示 mAP、按类别 AP 和错误最多的图像"""
+        if not self.image_list or not hasattr(self, 'label_folder'):
+            messagebox.showwarning("警告", "请先选择图像和标签文件夹")
+            return
+        if self.pred_folder is None:
+            self.select_pred_folder()
+            if self.pred_folder is None:
+                return
+        image_list, image_root = self.image_list, self.image_root
+        label_folder, pred_folder = self.label_folder, self.pred_folder
+        iou, conf, method = self.compare_settings()
+
+        window = tk.Toplevel(self.root)
+        window.title(f"预测评估 - {pred_folder}")
+        window.geometry("900x700")
+        top_frame = ttk.Frame(window)
+        top_frame.pack(fill=tk.X, padx=10, pady=5)
+        status_label = ttk.Label(top_frame, text="正在评估预测...", justify=tk.LEFT)
+        status_label.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        worst_button = ttk.Button(top_frame, text="按错误从多到少浏览", state=tk.DISABLED)
+        worst_button.pack(side=tk.RIGHT)
+
+        def make_table(parent, columns, widths, height):
+            frame = ttk.Frame(parent)
+            frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+            tree = ttk.Treeview(frame, columns=[c for c, _ in columns], show='headings', height=height)
+            scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
+            tree.configure(yscrollcommand=scrollbar.set)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            for (column, text), width in zip(columns, widths):
+                tree.heading(column, text=text)
+                tree.column(column, width=width, anchor=tk.W, stretch=column == columns[0][0])
+            return tree
+
+        class_tree = make_table(window, (('cls', "类别"), ('gt', "真值数"), ('ap50', "AP50"), ('ap', "AP50:95")),
+                                (300, 100, 100, 100), 8)
+        image_tree = make_table(window, (('name', "图像"), ('gt', "真值"), ('pred', "预测"), ('tp', "TP"),
+                                         ('fp', "FP"), ('fn', "FN"), ('errors', "错误")),
+                                (360, 60, 60, 60, 60, 60, 60), 16)
+
+        progress = queue.SimpleQueue()
+        cancel_event = threading.Event()
+        state = {'finished': False}
+
+        def on_select(event):
+            selection = image_tree.selection()
+            if selection and self.image_list is image_list:
+                self.go_to_index(int(selection[0]))
+        image_tree.bind('<<TreeviewSelect>>', on_select)
+
+        def on_close():
+            cancel_event.set()
+            window.destroy()
+        window.protocol("WM_DELETE_WINDOW", on_close)
+
+        def job():
+            return run_prediction_evaluation(image_list, label_folder, pred_folder, image_root, iou, conf, method,
+                                             progress=lambda done, total: progress.put((done, total)),
+                                             cancel_event=cancel_event)
+
+        def on_done(report, error):
+            state['finished'] = True
+            if not window.winfo_exists():
+                return
+            if error is not None:
+                status_label.config(text=f"评估失败: {str(error)}")
+                return
+            self.prediction_report = report
+            status_label.config(text=report.summary_text(self.label_map))
+            for c, (n_gt, ap) in report.class_ap.items():
+                name = self.label_map.get(c, f"class_{c}")
+                values = ("-", "-") if n_gt == 0 else (f"{ap[0]:.3f}", f"{ap.mean():.3f}")
+                class_tree.insert('', tk.END, values=(f"{c}: {name}", n_gt) + values)
+            worst = report.worst_first()
+            for i in worst[:1000]:   # 只列出错误最多的 1000 张，完整顺序用浏览按钮
+                image_tree.insert('', tk.END, iid=str(i), values=(
+                    image_list[i].name, report.n_gt[i], report.n_pred[i], report.tp[i],
+                    report.fp[i], report.fn[i], report.errors[i]))
+            if len(worst):
+                worst_button.config(state=tk.NORMAL, command=lambda: browse_worst(worst))
+
+        def browse_worst(worst):
+            if self.image_list is image_list:
+                self.set_view(worst, "预测错误（从多到少）", ordered=True)
+
+        def poll():
+            if not window.winfo_exists() or state['finished']:
+                return
+            latest = None
+            while True:
+                try:
+                    latest = progress.get_nowait()
+                except queue.Empty:
+                    break
+            if latest is not None:
+                status_label.config(text=f"正在评估预测: {latest[0]}/{latest[1]}")
+            window.after(200, poll)
+
+        self.run_in_background(job, on_done)
+        window.after(200, poll)
+
+    def run_in_background(self, func, on_done, poll_ms=100):
+        """在后台线程执行 func，完成后在界面线程调用 on_done(结果, 异常)"""
+        holder = {}
+
+        def worker():
+            try:
+                holder['result'] = func()
+            except Exception as e:
+                holder['error'] = e
+            finally:
+                holder['done'] = True
+
+        def poll():
+            if 'done' not in holder:
+                self.root.after(poll_ms, poll)
+                return
+            on_done(holder.get('result'), holder.get('error'))
+
+        threading.Thread(target=worker, daemon=True).start()
+        self.root.after(poll_ms, poll)
         
     def save_current_image(self):
         """保存当前可视化图像"""
@@ -618,11 +5997,11 @@ class AnnotationVisualizer:
         )
         
         if file_path:
-            self.fig.savefig(file_path, bbox_inches='tight', dpi=300)
+            self.renderer.savefig(file_path, bbox_inches='tight', dpi=300)
             messagebox.showinfo("成功", f"图像已保存到: {file_path}")
             
     def batch_export(self):
-        """批量导出可视化图像"""
+        """批量导出可视化图像（多进程 OpenCV 渲染，后台执行不阻塞界面）"""
         if not self.image_list:
             messagebox.showwarning("警告", "没有可导出的图像")
             return
@@ -634,37 +6013,169 @@ class AnnotationVisualizer:
         # 创建进度窗口
         progress_window = tk.Toplevel(self.root)
         progress_window.title("批量导出进度")
-        progress_window.geometry("400x100")
+        progress_window.geometry("400x130")
         
+        total = len(self.image_list)
         progress_var = tk.DoubleVar()
-        progress_bar = ttk.Progressbar(progress_window, variable=progress_var, maximum=len(self.image_list))
-        progress_bar.pack(pady=20, padx=20, fill=tk.X)
+        progress_bar = ttk.Progressbar(progress_window, variable=progress_var, maximum=total)
+        progress_bar.pack(pady=(20, 10), padx=20, fill=tk.X)
         
         status_label = ttk.Label(progress_window, text="准备开始...")
         status_label.pack()
         
-        def export_images():
-            original_index = self.current_index
+        cancel_event = threading.Event()
+        ttk.Button(progress_window, text="取消", command=cancel_event.set).pack(pady=5)
+        progress_window.protocol("WM_DELETE_WINDOW", cancel_event.set)
+        
+        # 后台线程与界面线程共享的进度状态
+        state = {'done': 0, 'rate': 0.0, 'ok': 0, 'failed': 0, 'error': None, 'finished': False}
+        
+        def on_progress(done, total, rate):
+            state['done'] = done
+            state['rate'] = rate
             
-            for i, image_path in enumerate(self.image_list):
-                self.current_index = i
-                self.update_display()
-                
-                output_path = Path(output_dir) / f"{image_path.stem}_visualized.png"
-                self.fig.savefig(output_path, bbox_inches='tight', dpi=300)
+        # 在界面线程中取好全部参数：Tk 变量不能在后台线程读取，导出期间列表也可能被重新加载
+        image_list = list(self.image_list)
+        label_folder = getattr(self, 'label_folder', None)
+        label_map, colors = dict(self.label_map), list(self.colors)
+        options = {'show_boxes': self.show_boxes_var.get(), 'show_segments': self.show_segments_var.get(),
+                   'show_labels': self.show_labels_var.get(), 'alpha': self.alpha}
+        image_root = self.image_root
+            
+        def export_images():
+            try:
+                state['ok'], state['failed'] = run_batch_export(
+                    image_list, label_folder, output_dir, label_map, colors,
+                    progress=on_progress, cancel_event=cancel_event, image_root=image_root, **options)
+            except Exception as e:
+                state['error'] = str(e)
+            finally:
+                state['finished'] = True
                 
-                progress_var.set(i + 1)
-                status_label.config(text=f"正在处理: {image_path.name}")
-                progress_window.update()
+        def poll():
+            progress_var.set(state['done'])
+            status_label.config(text=f"已处理: {state['done']}/{total}  速度: {state['rate']:.1f} 张/秒")
+            if not state['finished']:
+                self.root.after(100, poll)
+                return
+            progress_window.destroy()
+            if state['error']:
+                messagebox.showerror("错误", f"批量导出失败: {state['error']}")
+            elif cancel_event.is_set():
+                messagebox.showinfo("已取消", f"已导出 {state['ok']} 张图像到 {output_dir}")
+            else:
+                messagebox.showinfo("完成", f"已导出 {state['ok']} 张图像到 {output_dir}"
+                                    + (f"\n失败: {state['failed']} 张" if state['failed'] else ""))
                 
-            self.current_index = original_index
-            self.update_display()
+        threading.Thread(target=export_images, daemon=True).start()
+        self.root.after(100, poll)
+        
+    def export_video(self):
+        """按当前浏览顺序（含排序/筛选）导出幻灯片视频，后台执行不阻塞界面"""
+        if not self.image_list or not self.nav_count():
+            messagebox.showwarning("警告", "没有可导出的图像")
+            return
+            
+        output_path = filedialog.asksaveasfilename(
+            title="导出视频",
+            defaultextension=".mp4",
+            filetypes=[("MP4 files", "*.mp4"), ("AVI files", "*.avi")]
+        )
+        if not output_path:
+            return
+            
+        # 导出设置
+        options_window = tk.Toplevel(self.root)
+        options_window.title("视频导出设置")
+        options_window.transient(self.root)
+        
+        form = ttk.Frame(options_window, padding=10)
+        form.pack(fill=tk.BOTH, expand=True)
+        ttk.Label(form, text="帧率 (fps):").grid(row=0, column=0, sticky=tk.W, pady=2)
+        fps_var = tk.StringVar(value="2")
+        ttk.Spinbox(form, from_=0.5, to=60, increment=0.5, textvariable=fps_var,
+                    width=10).grid(row=0, column=1, sticky=tk.W, pady=2)
+        ttk.Label(form, text="分辨率:").grid(row=1, column=0, sticky=tk.W, pady=2)
+        size_var = tk.StringVar(value="自动")
+        ttk.Combobox(form, textvariable=size_var, width=10,
+                     values=["自动", "1280x720", "1920x1080"]).grid(row=1, column=1, sticky=tk.W, pady=2)
+        caption_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(form, text="显示序号和文件名", variable=caption_var).grid(
+            row=2, column=0, columnspan=2, sticky=tk.W, pady=2)
+        
+        def start():
+            try:
+                fps = float(fps_var.get())
+                size = None if size_var.get() == "自动" else parse_size(size_var.get())
+                if fps <= 0:
+                    raise ValueError("帧率必须大于 0")
+            except ValueError as e:
+                messagebox.showerror("错误", f"导出设置无效: {e}", parent=options_window)
+                return
+            options_window.destroy()
+            self.run_video_export_job(output_path, fps, size, caption_var.get())
+            
+        ttk.Button(form, text="开始导出", command=start).grid(row=3, column=0, columnspan=2, pady=(10, 0))
+        
+    def run_video_export_job(self, output_path, fps, size, caption):
+        """在后台执行视频导出并显示进度"""
+        image_paths = [self.image_list[self.nav_index(p)] for p in range(self.nav_count())]
+        total = len(image_paths)
+        
+        progress_window = tk.Toplevel(self.root)
+        progress_window.title("视频导出进度")
+        progress_window.geometry("400x130")
+        
+        progress_var = tk.DoubleVar()
+        ttk.Progressbar(progress_window, variable=progress_var, maximum=total).pack(
+            pady=(20, 10), padx=20, fill=tk.X)
+        status_label = ttk.Label(progress_window, text="准备开始...")
+        status_label.pack()
+        
+        cancel_event = threading.Event()
+        ttk.Button(progress_window, text="取消", command=cancel_event.set).pack(pady=5)
+        progress_window.protocol("WM_DELETE_WINDOW", cancel_event.set)
+        
+        state = {'done': 0, 'rate': 0.0}
+        
+        def on_progress(done, total, rate):
+            state['done'] = done
+            state['rate'] = rate
             
+        # 绘制参数在界面线程中取好（Tk 变量不能在后台线程读取）
+        label_folder = getattr(self, 'label_folder', None)
+        label_map, colors = dict(self.label_map), list(self.colors)
+        options = {'show_boxes': self.show_boxes_var.get(), 'show_segments': self.show_segments_var.get(),
+                   'show_labels': self.show_labels_var.get(), 'alpha': self.alpha}
+        image_root = self.image_root
+            
+        def job():
+            return run_video_export(
+                image_paths, output_path, label_folder, label_map, colors,
+                fps=fps, size=size, caption=caption, progress=on_progress,
+                cancel_event=cancel_event, image_root=image_root, **options)
+                
+        def on_done(result, error):
             progress_window.destroy()
-            messagebox.showinfo("完成", f"已导出 {len(self.image_list)} 张图像到 {output_dir}")
+            if error is not None:
+                messagebox.showerror("错误", f"视频导出失败: {error}")
+                return
+            written, failed = result
+            if cancel_event.is_set():
+                messagebox.showinfo("已取消", f"已写入 {written} 帧到 {output_path}")
+            else:
+                messagebox.showinfo("完成", f"已写入 {written} 帧到 {output_path}"
+                                    + (f"\n失败: {failed} 张" if failed else ""))
+                
+        def poll():
+            if not progress_window.winfo_exists():
+                return
+            progress_var.set(state['done'])
+            status_label.config(text=f"已处理: {state['done']}/{total}  速度: {state['rate']:.1f} 帧/秒")
+            self.root.after(100, poll)
             
-        # 在主线程中执行导出
-        self.root.after(100, export_images)
+        self.run_in_background(job, on_done)
+        self.root.after(100, poll)
         
     def save_label_map(self):
         """保存标签映射"""
@@ -688,45 +6199,135 @@ class AnnotationVisualizer:
             except Exception as e:
                 messagebox.showerror("错误", f"保存失败: {str(e)}")
 
+    def build_name_index(self):
+        """后台构建图像名称索引"""
+        image_list, image_root = self.image_list, self.image_root
+
+        def on_done(index, error):
+            if error is not None:
+                print(f"构建名称索引失败: {str(error)}")
+            elif self.image_list is image_list:
+                self.name_index = index
+
+        self.run_in_background(lambda: ImageNameIndex(image_list, image_root), on_done)
+
+    def get_name_index(self):
+        """名称索引；后台尚未完成时同步构建"""
+        if self.name_index is None or len(self.name_index) != len(self.image_list):
+            self.name_index = ImageNameIndex(self.image_list, self.image_root)
+        return self.name_index
+
+    def on_jump_key(self, event):
+        """输入变化后防抖刷新联想列表"""
+        if event.keysym in ('Return', 'Down', 'Up', 'Escape'):
+            return
+        if self.suggest_after_id is not None:
+            self.root.after_cancel(self.suggest_after_id)
+        self.suggest_after_id = self.root.after(60, self.update_suggestions)
+
+    def update_suggestions(self):
+        """按当前输入刷新联想列表"""
+        self.suggest_after_id = None
+        text = self.jump_entry.get().strip()
+        if not text or not self.image_list:
+            self.hide_suggestions()
+            return
+        index = self.get_name_index()
+        self.suggest_rows = self.search_in_view(index, text, limit=50)
+        self.suggest_listbox.delete(0, tk.END)
+        if not self.suggest_rows:
+            self.hide_suggestions()
+            return
+        self.suggest_listbox.insert(tk.END, *(index.names[row] for row in self.suggest_rows))
+        if not self.suggest_frame.winfo_ismapped():
+            self.suggest_frame.pack(fill=tk.X, pady=(2, 0), after=self.jump_frame)
+
+    def search_in_view(self, index, text, limit):
+        """名称搜索，浏览子集时只保留子集中的结果"""
+        if self.view_indices is None:
+            return index.search(text, limit)
+        rows = index.search(text, limit * 20)
+        return [row for row in rows if self.in_view(row)][:limit]
+
+    def hide_suggestions(self):
+        self.suggest_rows = []
+        self.suggest_frame.pack_forget()
+
+    def focus_suggestions(self):
+        """方向键下移到联想列表"""
+        if self.suggest_rows:
+            self.suggest_listbox.focus_set()
+            self.suggest_listbox.selection_clear(0, tk.END)
+            self.suggest_listbox.selection_set(0)
+            self.suggest_listbox.activate(0)
+
+    def open_suggestion(self):
+        """跳转到选中的联想项"""
+        selection = self.suggest_listbox.curselection()
+        if selection and selection[0] < len(self.suggest_rows):
+            self.go_to_index(self.suggest_rows[selection[0]])
+            self.hide_suggestions()
+
     def jump_to_image(self):
-        """根据输入的文件名（可不含扩展名）跳转到对应图像"""
+        """根据输入的文件名（可不含扩展名）跳转到对应图像；无精确匹配时跳到第一个联想结果"""
         if not self.image_list:
             return
         name = self.jump_entry.get().strip()
         if not name:
             return
-        stem = Path(name).stem  # 去掉可能的扩展名
-        target_index = None
-        for i, p in enumerate(self.image_list):
-            if p.stem == stem:
-                target_index = i
-                break
-        if target_index is None:
-            # 尝试数字匹配（输入纯数字且存在）
-            if name.isdigit():
-                for i, p in enumerate(self.image_list):
-                    if p.stem.isdigit() and int(p.stem) == int(name):
-                        target_index = i
-                        break
+        index = self.get_name_index()
+        target_index = index.find(name)
+        if target_index is None or not self.in_view(target_index):
+            # 浏览子集时只在子集中跳转
+            matches = self.search_in_view(index, name, limit=1)
+            target_index = matches[0] if matches else None
         if target_index is not None:
-            self.current_index = target_index
-            if hasattr(self, 'index_var'):
-                self.index_var.set(target_index)
-            self.update_display(fast=False)
+            self.hide_suggestions()
+            self.go_to_index(target_index)
         else:
             messagebox.showwarning("未找到", f"未找到图像: {name}")
 
 def main():
-    """主函数"""
-    # 测试中文字体设置
-    print("正在检查中文字体支持...")
-    setup_chinese_font()
-    print(f"当前字体设置: {plt.rcParams['font.sans-serif']}")
-    
-    # 创建GUI
+    """主函数：先显示窗口，OpenCV / matplotlib 在后台导入完成后再创建界面"""
+    # 界面中启用分阶段计时（启动各阶段也记录在内，可通过“导出计时”查看）
+    PROFILER.enabled = True
+    PROFILER.record('startup_import', STARTUP_TIME, time.perf_counter() - STARTUP_TIME)
     root = tk.Tk()
-    app = AnnotationVisualizer(root)
+    root.title("YOLO数据集可视化工具")
+    root.geometry("1400x900")
+    splash = ttk.Label(root, text="正在加载...", anchor='center')
+    splash.pack(fill=tk.BOTH, expand=True)
+    root.update()
+    PROFILER.record('startup_window', STARTUP_TIME, time.perf_counter() - STARTUP_TIME)
+    loader = threading.Thread(target=preload_gui_modules, daemon=True)
+    loader.start()
+
+    def create_ui():
+        if loader.is_alive():
+            root.after(20, create_ui)
+            return
+        splash.destroy()
+        with PROFILER.stage('startup_ui'):
+            root.app = AnnotationVisualizer(root)
+            root.update_idletasks()
+        PROFILER.record('startup_total', STARTUP_TIME, time.perf_counter() - STARTUP_TIME)
+        import matplotlib
+        ms = {name: PROFILER.last_ms(name) for name in
+              ('startup_import', 'startup_window', 'startup_modules', 'startup_font', 'startup_ui', 'startup_total')}
+        print(f"当前字体设置: {matplotlib.rcParams['font.sans-serif']}")
+        print(f"启动耗时: 窗口显示 {ms['startup_window']:.0f}ms（导入 {ms['startup_import']:.0f}ms），"
+              f"后台导入 {ms['startup_modules']:.0f}ms，字体 {ms['startup_font']:.0f}ms，"
+              f"创建界面 {ms['startup_ui']:.0f}ms，合计 {ms['startup_total']:.0f}ms")
+
+    root.after(0, create_ui)
     root.mainloop()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 打包后子进程支持
+    if len(sys.argv) > 1 and sys.argv[1] == 'export':
+        sys.exit(export_cli(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == 'video':
+        sys.exit(video_cli(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == 'eval':
+        sys.exit(eval_cli(sys.argv[2:]))
     main()
\ No newline at end of file